@@ -1,27 +1,143 @@
-from flask import Flask, request, jsonify, render_template, send_file, session, redirect, url_for
-from flask_cors import CORS
+from flask import Flask, Request, request, jsonify, render_template, send_file, session, redirect, url_for
 import os
+import hashlib
 import json
+import mimetypes
+import tempfile
 import uuid
 from datetime import datetime
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
+from http_compression import compress_response, send_precompressed
+from submission_store import SubmissionStore, UserStore, DEFAULT_PAGE_SIZE
+
+
+class HashingUploadStream:
+    """上传文件的写入目标：分块直接写入上传目录下的临时文件，同时计算SHA-256和大小"""
+
+    def __init__(self, directory, max_size=None):
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.part')
+        self.file = os.fdopen(fd, 'w+b')
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.max_size = max_size
+        self.committed = False
+
+    def write(self, data):
+        # 边写边检查大小，分块传输（没有Content-Length）时也能及时中止
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise RequestEntityTooLarge()
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        # seek/read等操作交给底层文件
+        return getattr(self.file, name)
+
+    @property
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+    def commit(self, path):
+        """写入完成后原子地重命名到最终位置"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.temp_path, path)
+        self.committed = True
+
+    def close(self):
+        # 请求结束时关闭，没有提交的临时文件直接删除
+        if not self.file.closed:
+            self.file.close()
+        if not self.committed and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class UploadRequest(Request):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 本次请求创建的所有临时文件，解析中途出错（超过大小、客户端断开、格式错误）的部分不在 request.files 中
+        self.upload_streams = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # 不经过内存或系统临时目录，上传内容直接流式写入上传目录
+        stream = HashingUploadStream(app.config['UPLOAD_FOLDER'], app.config['MAX_CONTENT_LENGTH'])
+        self.upload_streams.append(stream)
+        return stream
+
 
 app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'
+app.request_class = UploadRequest
+# 会话保存在签名cookie中，多个worker使用相同的密钥即可共享登录状态
+app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['SUBMISSION_DB'] = os.environ.get('SUBMISSION_DB', 'submissions.db')
+
+app.config['COMPRESS_MIN_SIZE'] = 1024  # 超过该大小的JSON响应才压缩
+app.config['ASSET_DIR'] = os.path.join(app.static_folder, 'dist')  # src/utils/build_static.py 的输出目录
+app.config['ASSET_MAX_AGE'] = 365 * 24 * 3600  # 带指纹的资源长期缓存
+# 部署在nginx/Apache后面时由前端服务器直接发送文件（X-Sendfile），否则由WSGI服务器的file_wrapper发送
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
 
 # 确保上传目录存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# 简单的用户数据存储（实际应用中应使用数据库）
-users = {
-    'admin': {'password': 'admin123', 'role': 'admin'},
-    'user1': {'password': 'password1', 'role': 'user'}
-}
 
-# 存储提交记录（实际应用中应使用数据库）
-submissions = []
+# 加载静态资源manifest（原路径 -> 带指纹路径），未构建时使用原始静态文件
+def load_asset_manifest():
+    try:
+        with open(os.path.join(app.config['ASSET_DIR'], 'manifest.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+asset_manifest = load_asset_manifest()
+
+
+@app.context_processor
+def inject_asset_url():
+    def asset_url(filename):
+        hashed = asset_manifest.get(filename)
+        if hashed:
+            return url_for('hashed_asset', filename=hashed)
+        return url_for('static', filename=filename)
+
+    return {'asset_url': asset_url}
+
+
+@app.route('/assets/<path:filename>')
+def hashed_asset(filename):
+    """返回带指纹的静态资源，优先使用预压缩文件"""
+    response = send_precompressed(app.config['ASSET_DIR'], filename, max_age=app.config['ASSET_MAX_AGE'])
+    # 文件名随内容变化，可以永久缓存
+    response.cache_control.immutable = True
+    return response
+
+
+@app.after_request
+def compress_json_response(response):
+    """按Accept-Encoding压缩较大的响应"""
+    return compress_response(response, app.config['COMPRESS_MIN_SIZE'])
+
+
+@app.teardown_request
+def remove_upload_temp_files(exception=None):
+    """删除本次请求中没有提交的上传临时文件"""
+    for stream in getattr(request, 'upload_streams', ()):
+        stream.close()
+
+
+# 用户和提交记录存储，所有worker共享同一个数据库
+users = UserStore(app.config['SUBMISSION_DB'])
+submissions = SubmissionStore(app.config['SUBMISSION_DB'])
+
+# 默认账号
+users.ensure_user('admin', 'admin123', role='admin')
+users.ensure_user('user1', 'password1')
 
 # 允许的文件扩展名
 ALLOWED_EXTENSIONS = {'py', 'txt', 'js', 'html', 'css', 'java', 'c', 'cpp', 'json'}
@@ -45,9 +161,10 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
 
-        if username in users and users[username]['password'] == password:
+        role = users.authenticate(username, password)
+        if role:
             session['username'] = username
-            session['role'] = users[username]['role']
+            session['role'] = role
             return jsonify({'success': True, 'message': '登录成功'})
         else:
             return jsonify({'success': False, 'message': '用户名或密码错误'})
@@ -88,20 +205,18 @@ def submit_code():
         filename = secure_filename(file.filename)
         unique_filename = f"{uuid.uuid4().hex}_{filename}"
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
+        file.stream.commit(file_path)
 
         # 记录提交信息
-        submission = {
-            'id': len(submissions) + 1,
-            'username': session['username'],
-            'project_name': project_name,
-            'filename': filename,
-            'file_path': file_path,
-            'submission_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'file_size': os.path.getsize(file_path)
-        }
-
-        submissions.append(submission)
+        submission = submissions.add(
+            username=session['username'],
+            project_name=project_name,
+            filename=filename,
+            file_path=file_path,
+            submission_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            file_size=file.stream.size,
+            sha256=file.stream.hexdigest
+        )
 
         return jsonify({
             'success': True,
@@ -117,12 +232,14 @@ def get_submissions():
     if 'username' not in session:
         return jsonify({'success': False, 'message': '请先登录'})
 
+    # 分页参数：before为上一页返回的next_before，按ID倒序
+    before_id = request.args.get('before', type=int)
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+
     # 如果是管理员，返回所有提交；否则只返回当前用户的提交
-    if session.get('role') == 'admin':
-        return jsonify({'success': True, 'submissions': submissions})
-    else:
-        user_submissions = [s for s in submissions if s['username'] == session['username']]
-        return jsonify({'success': True, 'submissions': user_submissions})
+    username = None if session.get('role') == 'admin' else session['username']
+    items, next_before = submissions.list(username=username, before_id=before_id, limit=limit)
+    return jsonify({'success': True, 'submissions': items, 'next_before': next_before})
 
 
 @app.route('/api/code/<int:submission_id>')
@@ -131,7 +248,7 @@ def get_code(submission_id):
         return jsonify({'success': False, 'message': '请先登录'})
 
     # 查找提交记录
-    submission = next((s for s in submissions if s['id'] == submission_id), None)
+    submission = submissions.get(submission_id)
 
     if not submission:
         return jsonify({'success': False, 'message': '提交记录不存在'})
@@ -167,7 +284,7 @@ def save_code():
         return jsonify({'success': False, 'message': '参数不完整'})
 
     # 查找提交记录
-    submission = next((s for s in submissions if s['id'] == submission_id), None)
+    submission = submissions.get(submission_id)
 
     if not submission:
         return jsonify({'success': False, 'message': '提交记录不存在'})
@@ -181,6 +298,8 @@ def save_code():
         with open(submission['file_path'], 'w', encoding='utf-8') as f:
             f.write(content)
 
+        data = content.encode('utf-8')
+        submissions.update_file(submission_id, len(data), hashlib.sha256(data).hexdigest())
         return jsonify({'success': True, 'message': '文件保存成功'})
     except Exception as e:
         return jsonify({'success': False, 'message': f'保存文件失败: {str(e)}'})
@@ -192,7 +311,7 @@ def download_code(submission_id):
         return jsonify({'success': False, 'message': '请先登录'})
 
     # 查找提交记录
-    submission = next((s for s in submissions if s['id'] == submission_id), None)
+    submission = submissions.get(submission_id)
 
     if not submission:
         return jsonify({'success': False, 'message': '提交记录不存在'})
@@ -201,12 +320,40 @@ def download_code(submission_id):
     if session.get('role') != 'admin' and submission['username'] != session['username']:
         return jsonify({'success': False, 'message': '没有权限下载此文件'})
 
-    # 返回文件下载
-    return send_file(
+    return send_submission_file(submission, as_attachment=True)
+
+
+@app.route('/api/raw/<int:submission_id>')
+def raw_code(submission_id):
+    if 'username' not in session:
+        return jsonify({'success': False, 'message': '请先登录'})
+
+    # 查找提交记录
+    submission = submissions.get(submission_id)
+
+    if not submission:
+        return jsonify({'success': False, 'message': '提交记录不存在'})
+
+    # 检查权限（管理员或提交者本人）
+    if session.get('role') != 'admin' and submission['username'] != session['username']:
+        return jsonify({'success': False, 'message': '没有权限下载此文件'})
+
+    return send_submission_file(submission, as_attachment=False)
+
+
+def send_submission_file(submission, as_attachment):
+    """直接从磁盘发送提交的文件，支持Range断点续传和ETag条件请求，文件内容不经过Python内存"""
+    response = send_file(
         submission['file_path'],
-        as_attachment=True,
-        download_name=submission['filename']
+        mimetype=mimetypes.guess_type(submission['filename'])[0] or 'text/plain',
+        as_attachment=as_attachment,
+        download_name=submission['filename'],
+        conditional=True,
+        etag=True,
+        max_age=0
     )
+    response.cache_control.private = True
+    return response
 
 
 @app.route('/editor/<int:submission_id>')
@@ -215,7 +362,7 @@ def code_editor(submission_id):
         return redirect(url_for('login'))
 
     # 查找提交记录
-    submission = next((s for s in submissions if s['id'] == submission_id), None)
+    submission = submissions.get(submission_id)
 
     if not submission:
         return "提交记录不存在", 404
@@ -132,16 +132,23 @@ async function submitCode() {
     }
 }
 
-// 加载提交记录
-async function loadSubmissions() {
+// 下一页的游标（上一页最后一条记录的ID），null表示没有更多
+let nextSubmissionCursor = null;
+
+// 加载提交记录，append为true时加载下一页并追加到表格
+async function loadSubmissions(append = false) {
     try {
         showLoading();
 
-        const response = await fetch('/api/submissions');
+        const url = append && nextSubmissionCursor !== null
+            ? `/api/submissions?before=${nextSubmissionCursor}`
+            : '/api/submissions';
+        const response = await fetch(url);
         const data = await response.json();
 
         if (data.success) {
-            renderSubmissionsTable(data.submissions);
+            nextSubmissionCursor = data.next_before;
+            renderSubmissionsTable(data.submissions, append);
         } else {
             showNotification(data.message, 'error');
         }
@@ -154,11 +161,17 @@ async function loadSubmissions() {
 }
 
 // 渲染提交记录表格
-function renderSubmissionsTable(submissions) {
+function renderSubmissionsTable(submissions, append = false) {
     const tbody = document.querySelector('#submissions-table tbody');
-    tbody.innerHTML = '';
+    const moreRow = document.getElementById('load-more-row');
+    if (moreRow) {
+        moreRow.remove();
+    }
+    if (!append) {
+        tbody.innerHTML = '';
+    }
 
-    if (submissions.length === 0) {
+    if (submissions.length === 0 && !append) {
         tbody.innerHTML = `
             <tr>
                 <td colspan="7" style="text-align: center; padding: 40px;">
@@ -201,6 +214,18 @@ function renderSubmissionsTable(submissions) {
 
         tbody.appendChild(row);
     });
+
+    // 还有更多记录时显示"加载更多"
+    if (nextSubmissionCursor !== null) {
+        const row = document.createElement('tr');
+        row.id = 'load-more-row';
+        row.innerHTML = `
+            <td colspan="7" style="text-align: center;">
+                <button class="btn btn-refresh" onclick="loadSubmissions(true)">加载更多</button>
+            </td>
+        `;
+        tbody.appendChild(row);
+    }
 }
 
 // 格式化文件大小
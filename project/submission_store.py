@@ -0,0 +1,125 @@
+"""
+提交记录和用户存储（SQLite）
+- 按ID查询走主键，按用户查询走 (username, id) 索引
+- 列表接口按ID倒序分页：用上一页最后一条的ID作为游标，翻页代价与总记录数无关
+- 所有状态都在数据库中，ID由SQLite自增分配，多个worker进程/线程共享同一个数据库文件
+"""
+
+import sqlite3
+import threading
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+SUBMISSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    project_name TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    submission_time TEXT NOT NULL,
+    file_size INTEGER NOT NULL,
+    sha256 TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_username_id ON submissions (username, id);
+"""
+
+USER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'user'
+);
+"""
+
+COLUMNS = ('id', 'username', 'project_name', 'filename', 'file_path', 'submission_time', 'file_size', 'sha256')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class SQLiteStore:
+    schema = ''
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()  # 每个线程一个连接
+        with self.connect() as conn:
+            conn.executescript(self.schema)
+
+    def connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # 多个进程同时写时等待锁而不是立即失败；WAL模式下读不阻塞写
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+        return conn
+
+
+class UserStore(SQLiteStore):
+    schema = USER_SCHEMA
+
+    def ensure_user(self, username, password, role='user'):
+        """用户不存在时创建（用于初始化默认账号，多个worker同时启动也只插入一次）"""
+        with self.connect() as conn:
+            conn.execute('INSERT OR IGNORE INTO users (username, password_hash, role) VALUES (?, ?, ?)',
+                         (username, generate_password_hash(password), role))
+
+    def authenticate(self, username, password):
+        """验证用户名密码，成功时返回角色，否则返回None"""
+        row = self.connect().execute(
+            'SELECT password_hash, role FROM users WHERE username = ?', (username,)
+        ).fetchone()
+        if row and check_password_hash(row['password_hash'], password or ''):
+            return row['role']
+        return None
+
+
+class SubmissionStore(SQLiteStore):
+    schema = SUBMISSION_SCHEMA
+
+    def add(self, username, project_name, filename, file_path, submission_time, file_size, sha256=None):
+        """保存提交记录，返回包含新ID的记录"""
+        with self.connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO submissions (username, project_name, filename, file_path, submission_time, file_size, sha256) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (username, project_name, filename, file_path, submission_time, file_size, sha256)
+            )
+            submission_id = cursor.lastrowid
+        return self.get(submission_id)
+
+    def get(self, submission_id):
+        row = self.connect().execute(
+            f'SELECT {", ".join(COLUMNS)} FROM submissions WHERE id = ?', (submission_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def update_file(self, submission_id, file_size, sha256):
+        """文件内容修改后更新大小和哈希"""
+        with self.connect() as conn:
+            conn.execute('UPDATE submissions SET file_size = ?, sha256 = ? WHERE id = ?',
+                         (file_size, sha256, submission_id))
+
+    def list(self, username=None, before_id=None, limit=DEFAULT_PAGE_SIZE):
+        """按ID倒序返回一页记录和下一页的游标（没有更多时为None）"""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        conditions, params = [], []
+        if username is not None:
+            conditions.append('username = ?')
+            params.append(username)
+        if before_id is not None:
+            conditions.append('id < ?')
+            params.append(before_id)
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+
+        # 多取一条判断是否还有下一页
+        rows = self.connect().execute(
+            f'SELECT {", ".join(COLUMNS)} FROM submissions {where} ORDER BY id DESC LIMIT ?',
+            params + [limit + 1]
+        ).fetchall()
+        items = [dict(row) for row in rows[:limit]]
+        next_before = items[-1]['id'] if len(rows) > limit else None
+        return items, next_before
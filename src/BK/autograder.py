@@ -0,0 +1,112 @@
+"""
+作业自动评分
+- 测试用例为输入/期望输出对：把input作为标准输入运行学生代码，比较标准输出（忽略行尾空白和末尾空行）
+- 每个学生的提交在进程池中并行评分，进程数默认等于CPU核数
+- 结果按(代码内容哈希, 测试集哈希)缓存，重新评分时只运行有变化的提交
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import as_completed
+
+from process_pool import LazyProcessPool
+
+MEMORY_LIMIT = 256 * 1024 * 1024
+FILE_SIZE_LIMIT = 1024 * 1024
+MAX_OUTPUT = 64 * 1024  # 结果中保留的输出长度
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def suite_hash(tests, timeout):
+    """测试集哈希，用例或超时时间变化后缓存失效"""
+    raw = json.dumps({'tests': tests, 'timeout': timeout}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def normalize_output(text):
+    lines = [line.rstrip() for line in text.replace('\r\n', '\n').split('\n')]
+    while lines and not lines[-1]:
+        lines.pop()
+    return '\n'.join(lines)
+
+
+def _limit_resources(timeout):
+    def apply():
+        import resource
+        cpu = max(1, int(timeout)) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+        resource.setrlimit(resource.RLIMIT_AS, (MEMORY_LIMIT, MEMORY_LIMIT))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (FILE_SIZE_LIMIT, FILE_SIZE_LIMIT))
+    return apply
+
+
+def run_case(workdir, case, timeout):
+    """运行一个测试用例，返回结果字典"""
+    started = time.monotonic()
+    result = {'passed': False}
+    try:
+        completed = subprocess.run(
+            [sys.executable, '-I', 'main.py'],
+            input=case.get('input', ''),
+            capture_output=True,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            timeout=timeout,
+            cwd=workdir,
+            env={'PATH': os.environ.get('PATH', ''), 'PYTHONIOENCODING': 'utf-8', 'LANG': 'C.UTF-8'},
+            preexec_fn=_limit_resources(timeout),
+            start_new_session=True
+        )
+        result['passed'] = (completed.returncode == 0
+                            and normalize_output(completed.stdout) == normalize_output(case.get('expected', '')))
+        if not result['passed']:
+            result['output'] = completed.stdout[:MAX_OUTPUT]
+            if completed.returncode != 0:
+                result['error'] = completed.stderr[-MAX_OUTPUT:]
+    except subprocess.TimeoutExpired:
+        result['error'] = '运行超时'
+    result['duration'] = round(time.monotonic() - started, 3)
+    return result
+
+
+def grade_submission(code, tests, timeout):
+    """在临时目录中逐个运行测试用例，返回得分和每个用例的结果（在进程池中执行）"""
+    workdir = tempfile.mkdtemp(prefix='ec_grade_')
+    started = time.monotonic()
+    try:
+        with open(os.path.join(workdir, 'main.py'), 'w', encoding='utf-8') as f:
+            f.write(code)
+        cases = [run_case(workdir, case, timeout) for case in tests]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    passed = sum(1 for case in cases if case['passed'])
+    return {
+        'passed': passed,
+        'total': len(tests),
+        'score': round(100.0 * passed / len(tests), 1) if tests else 0.0,
+        'duration': round(time.monotonic() - started, 3),
+        'cases': cases
+    }
+
+
+class Grader(LazyProcessPool):
+    def grade_all(self, jobs, tests, timeout):
+        """jobs为{键: 代码}，按完成顺序生成(键, 结果)"""
+        if not jobs:
+            return
+        executor = self.get_executor()
+        futures = {executor.submit(grade_submission, code, tests, timeout): key
+                   for key, code in jobs.items()}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
@@ -1,18 +1,101 @@
-from flask import Flask, request, jsonify, send_file, render_template
+from flask import Flask, Response, request, jsonify, send_file, render_template, abort
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
+import collections
 import datetime
+import hashlib
+import io
+import json
 import os
+import sys
+import threading
+import time
 from functools import wraps
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from http_compression import compress_response, etag_variants
+from event_stream import EventBroker, parse_last_event_id
+from rate_limit import create_bucket_store, parse_rate, retry_after_seconds
+from shard_router import ShardRouter, configure_sqlite
+from file_cache import FileCache
+from sandbox_pool import SandboxPool
+from batch_writer import BatchWriter
+from autograder import Grader, content_hash, suite_hash
+import migrations
+import similarity
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///python_ide.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('EC_DATABASE_URI', 'sqlite:///python_ide.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'user_projects'
+# 事件流票据的有效期（秒）：EventSource只能把凭据放在URL中，不使用长期token
+app.config['EVENT_TICKET_TTL'] = 60
+# 写接口限流（令牌桶），格式为"次数/second|minute|hour|day"
+app.config['RATE_LIMITS'] = {
+    'register': '5/hour',
+    'login': '20/minute',
+    'submit_code': '60/minute',
+    'delete_file': '60/minute',
+    'run_code': '30/minute',
+}
+# 配置后多个进程通过本地Redis兼容服务共享限流状态，否则使用进程内存储
+app.config['RATE_LIMIT_REDIS_URL'] = os.environ.get('RATE_LIMIT_REDIS_URL')
+app.config['USER_STORAGE_QUOTA'] = 20 * 1024 * 1024  # 每个用户最多保存20MB代码
+# 项目和代码文件按用户分片存储的SQLite文件数量，0或1表示不分片（全部存放在主库）
+app.config['SHARD_COUNT'] = int(os.environ.get('EC_SHARD_COUNT', '0'))
+# 文件内容缓存大小（字节），0表示关闭；每次命中前都按主键核对更新时间，多进程部署时也不会返回旧内容
+app.config['FILE_CACHE_MAX_BYTES'] = int(os.environ.get('EC_FILE_CACHE_BYTES', 32 * 1024 * 1024))
+# 远程运行：预启动的沙箱进程数（默认等于CPU核数）和单次运行的资源限制
+app.config['RUN_POOL_SIZE'] = int(os.environ.get('EC_RUN_POOL_SIZE', os.cpu_count() or 2))
+app.config['RUN_TIMEOUT'] = 10  # 墙钟时间（秒）
+app.config['RUN_CPU_SECONDS'] = 5
+app.config['RUN_MEMORY'] = 256 * 1024 * 1024
+app.config['RUN_FILE_SIZE'] = 1024 * 1024
+app.config['RUN_MAX_OUTPUT'] = 1024 * 1024
+app.config['RUN_MAX_PROCESSES'] = int(os.environ.get('EC_RUN_MAX_PROCESSES', '0'))  # 按沙箱用户统计
+# 远程运行使用的专用无特权用户；没有设置时不开放远程运行（用户代码不能以服务自身的身份运行）
+app.config['RUN_USER'] = os.environ.get('EC_RUN_USER')
+app.config['RUN_PYTHON'] = os.environ.get('EC_RUN_PYTHON')  # 沙箱用户可以执行的解释器，默认与服务相同
+# 自动评分的并行进程数（默认等于CPU核数）
+app.config['GRADER_WORKERS'] = int(os.environ.get('EC_GRADER_WORKERS', os.cpu_count() or 2))
+# 删除用户：先标记删除（立即对查询不可见），宽限期内可以撤销，之后由后台清理线程分批删除数据
+app.config['DELETE_GRACE_SECONDS'] = int(os.environ.get('EC_DELETE_GRACE_SECONDS', 600))
+app.config['REAPER_INTERVAL'] = 30  # 清理线程检查间隔（秒）
+app.config['REAPER_BATCH_SIZE'] = 500  # 每个事务删除的行数，避免长时间占用写锁
 
 db = SQLAlchemy(app)
+app.after_request(compress_response)
+
+# 进程内事件发布，/api/events 推送给已连接的客户端
+broker = EventBroker()
+
+# 限流令牌桶存储
+bucket_store = create_bucket_store(app.config['RATE_LIMIT_REDIS_URL'])
+
+# 热点文件内容缓存
+file_cache = FileCache(app.config['FILE_CACHE_MAX_BYTES'])
+
+# 远程运行沙箱进程池（第一次运行时启动），没有配置沙箱用户时为None
+sandbox_pool = None
+if app.config['RUN_USER']:
+    sandbox_pool = SandboxPool(
+        app.config['RUN_USER'],
+        size=app.config['RUN_POOL_SIZE'],
+        timeout=app.config['RUN_TIMEOUT'],
+        cpu_seconds=app.config['RUN_CPU_SECONDS'],
+        memory=app.config['RUN_MEMORY'],
+        file_size=app.config['RUN_FILE_SIZE'],
+        max_output=app.config['RUN_MAX_OUTPUT'],
+        max_processes=app.config['RUN_MAX_PROCESSES'],
+        python=app.config['RUN_PYTHON']
+    )
+
+# 作业评分进程池，以及正在进行的评分任务状态（作业ID -> 进度）
+grader = Grader(app.config['GRADER_WORKERS'])
+grading_jobs = {}
+grading_lock = threading.Lock()
 
 
 # 数据库模型
@@ -22,6 +105,8 @@ class User(db.Model):
     password_hash = db.Column(db.String(120), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    class_name = db.Column(db.String(50))  # 班级，用于按班级统计
+    deleted_at = db.Column(db.DateTime, index=True)  # 删除标记，非空时对所有查询不可见
 
 
 class Project(db.Model):
@@ -30,6 +115,10 @@ class Project(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     user = db.relationship('User', backref=db.backref('projects', lazy=True))
+    __table_args__ = (
+        # 提交时按(用户, 项目名)查找项目
+        db.Index('uq_project_user_name', 'user_id', 'name', unique=True),
+    )
 
 
 class CodeFile(db.Model):
@@ -40,13 +129,145 @@ class CodeFile(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    revision = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # 每次提交加1
     project = db.relationship('Project', backref=db.backref('files', lazy=True))
     user = db.relationship('User', backref=db.backref('files', lazy=True))
+    __table_args__ = (
+        db.Index('uq_code_file_project_filename', 'project_id', 'filename', unique=True),
+        db.Index('ix_code_file_user_id', 'user_id'),
+    )
+
+
+class StorageUsage(db.Model):
+    """用户已用存储空间，提交和删除时增量更新"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    bytes_used = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Assignment(db.Model):
+    """作业：按项目名和文件名找到每个学生最新提交的代码，用测试用例评分"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    project_name = db.Column(db.String(100), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    tests = db.Column(db.Text, nullable=False)  # JSON: [{"input": ..., "expected": ...}]
+    timeout = db.Column(db.Float, nullable=False, default=5)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
 
-# 创建数据库表
+class GradeResult(db.Model):
+    """评分结果，每个作业每个学生一条；content_hash和suite_hash都没变时直接复用"""
+    id = db.Column(db.Integer, primary_key=True)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    file_id = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)
+    suite_hash = db.Column(db.String(64), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    passed = db.Column(db.Integer, nullable=False)
+    total = db.Column(db.Integer, nullable=False)
+    duration = db.Column(db.Float, nullable=False)
+    details = db.Column(db.Text)  # JSON: 每个用例的结果
+    graded_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint('assignment_id', 'user_id'),
+        db.Index('ix_grade_result_cache', 'content_hash', 'suite_hash'),
+    )
+
+
+# 用户代码分片：分片库位于实例目录，与主库同一位置
+shards = ShardRouter(
+    db, app.config['SHARD_COUNT'],
+    'sqlite:///' + os.path.join(app.instance_path, 'python_ide_shard{shard}.db'),
+    models=(Project, CodeFile, StorageUsage)
+)
+
+
+class SimilaritySignature(db.Model):
+    """代码文件的MinHash签名（全局文件ID），提交时增量更新"""
+    file_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    project_name = db.Column(db.String(100), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    signature = db.Column(db.LargeBinary, nullable=False)
+
+
+class SimilarityBand(db.Model):
+    """LSH索引：签名每一段的桶哈希，同一个桶里的文件互为候选"""
+    id = db.Column(db.Integer, primary_key=True)
+    band = db.Column(db.Integer, nullable=False)
+    bucket = db.Column(db.BigInteger, nullable=False)
+    file_id = db.Column(db.Integer, nullable=False, index=True)
+    __table_args__ = (db.Index('ix_similarity_band_bucket', 'band', 'bucket'),)
+
+
+class SubmissionRollup(db.Model):
+    """提交次数汇总：按分钟/小时/天和班级累计，提交时增量更新"""
+    granularity = db.Column(db.String(6), primary_key=True)  # minute / hour / day
+    bucket = db.Column(db.String(16), primary_key=True)  # UTC时间，如 2024-09-01 13:00
+    class_name = db.Column(db.String(50), primary_key=True, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ActiveUserDay(db.Model):
+    """每天有提交的用户（UTC日期）"""
+    day = db.Column(db.String(10), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+
+
+class ProjectChurn(db.Model):
+    """每天每个项目的提交次数和变化的字节数（删除和新增的行的字节数之和）"""
+    day = db.Column(db.String(10), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    project_name = db.Column(db.String(100), primary_key=True)
+    submissions = db.Column(db.Integer, nullable=False, default=0)
+    bytes_changed = db.Column(db.Integer, nullable=False, default=0)
+
+
+class AppSetting(db.Model):
+    """部署相关的持久设置，如数据实际存放的分片数"""
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(255), nullable=False)
+
+
+def recorded_shard_count():
+    """数据实际的分片数；旧数据库没有记录时根据数据所在位置推断并记录下来"""
+    setting = AppSetting.query.get('shard_count')
+    if setting:
+        return int(setting.value)
+    if shards.enabled and any(session.query(Project.id).first() for _, session in shards.all_shards()):
+        count = shards.shard_count  # 分片中已有数据：按当前配置存放
+    elif Project.query.first():
+        count = 1  # 只有主库中有数据：还没有迁移到分片
+    else:
+        count = shards.shard_count  # 新数据库
+    db.session.add(AppSetting(key='shard_count', value=str(count)))
+    db.session.commit()
+    return count
+
+
+def check_shard_layout():
+    """全局文件ID = 分片内ID * 分片数 + 分片号，分片数与数据不一致时所有ID都会指向错误的文件，拒绝启动"""
+    recorded = recorded_shard_count()
+    if recorded != shards.shard_count:
+        raise RuntimeError(
+            f"EC_SHARD_COUNT={shards.shard_count}，但数据按 {recorded} 个分片存放；"
+            f"从不分片改为分片请运行 python background.py --migrate-shards，已分片的数据不支持改变分片数"
+        )
+
+
+# 创建数据库表，已有的数据库按版本升级（create_all不会修改已有的表）
 with app.app_context():
+    # 分片之外的表（用户、相似度索引、评分、统计）都在主库，与分片使用相同的WAL和忙等待设置
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', configure_sqlite)
     db.create_all()
+    migrations.migrate_engine(db.engine, migrations.BK_MIGRATIONS)
+    shards.init_app(app)
+    for engine in shards.engines:
+        migrations.migrate_engine(engine, migrations.SHARD_MIGRATIONS)
+    if not (__name__ == '__main__' and '--migrate-shards' in sys.argv):
+        check_shard_layout()
     # 创建默认管理员账号
     admin_user = User.query.filter_by(username='admin').first()
     if not admin_user:
@@ -59,6 +280,21 @@ with app.app_context():
         db.session.commit()
 
 
+# 解析token，返回对应用户，无效时返回None
+def load_user_from_token(token, scope=None):
+    """scope为None时只接受登录token；事件流票据（scope='events'）不能当作登录token使用"""
+    try:
+        if token.startswith('Bearer '):
+            token = token[7:]
+        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+        if data.get('scope') != scope:
+            return None
+        user = User.query.get(data['user_id'])
+        return user if user and user.deleted_at is None else None
+    except:
+        return None
+
+
 # 装饰器：需要token验证
 def token_required(f):
     @wraps(f)
@@ -67,12 +303,8 @@ def token_required(f):
         if not token:
             return jsonify({'success': False, 'message': 'Token缺失'}), 401
 
-        try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = User.query.get(data['user_id'])
-        except:
+        current_user = load_user_from_token(token)
+        if not current_user:
             return jsonify({'success': False, 'message': 'Token无效'}), 401
 
         return f(current_user, *args, **kwargs)
@@ -80,6 +312,31 @@ def token_required(f):
     return decorated
 
 
+# 装饰器：令牌桶限流，per='user'时按用户限流（需放在token_required之后），否则按IP限流
+def rate_limit(endpoint, per='ip'):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            rate = app.config['RATE_LIMITS'].get(endpoint)
+            if rate:
+                if per == 'user':
+                    key = f'{endpoint}:user:{args[0].id}'
+                else:
+                    key = f'{endpoint}:ip:{request.remote_addr}'
+                capacity, refill_rate = parse_rate(rate)
+                allowed, wait = bucket_store.take(key, capacity, refill_rate)
+                if not allowed:
+                    response = jsonify({'success': False, 'message': '请求过于频繁，请稍后再试'})
+                    response.status_code = 429
+                    response.headers['Retry-After'] = str(retry_after_seconds(wait))
+                    return response
+            return f(*args, **kwargs)
+
+        return decorated
+
+    return decorator
+
+
 # 装饰器：需要管理员权限
 def admin_required(f):
     @wraps(f)
@@ -91,8 +348,75 @@ def admin_required(f):
     return decorated
 
 
+# 条件请求辅助函数：ETag / Last-Modified
+def make_etag(*parts):
+    """根据版本字段生成强ETag"""
+    raw = ':'.join(str(part) for part in parts)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+def http_datetime(value):
+    """数据库中的UTC时间转为带时区、精度到秒的时间"""
+    if value is None:
+        return None
+    return value.replace(microsecond=0, tzinfo=datetime.timezone.utc)
+
+
+def check_not_modified(etag, last_modified=None):
+    """客户端缓存仍然有效时返回304响应，否则返回None"""
+    if request.if_none_match:
+        # 有If-None-Match时忽略If-Modified-Since（RFC 7232）；压缩后的ETag带编码后缀
+        matched = [tag for tag in etag_variants(etag) if request.if_none_match.contains(tag)]
+        if not matched:
+            return None
+        etag = matched[0]
+    elif not (request.if_modified_since and last_modified
+              and http_datetime(last_modified) <= request.if_modified_since):
+        return None
+
+    response = app.response_class(status=304)
+    return with_validators(response, etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    """为响应加上ETag/Last-Modified，并要求客户端每次重新验证"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = http_datetime(last_modified)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# 存储配额辅助函数
+def content_size(content):
+    """代码内容占用的字节数"""
+    return len(content.encode('utf-8')) if content else 0
+
+
+def changed_bytes(old, new):
+    """两个版本之间删除和新增的行的总字节数；按行的多重集合比较，线性时间，只移动位置的行不计入"""
+    old_lines = collections.Counter((old or '').splitlines(keepends=True))
+    new_lines = collections.Counter((new or '').splitlines(keepends=True))
+    changed = (old_lines - new_lines) + (new_lines - old_lines)
+    return sum(content_size(line) * count for line, count in changed.items())
+
+
+def get_storage_usage(session, user_id):
+    """获取用户的存储用量记录，第一次使用时根据已有文件统计一次"""
+    usage = session.get(StorageUsage, user_id)
+    if not usage:
+        total = session.query(
+            db.func.coalesce(db.func.sum(db.func.length(db.cast(CodeFile.content, db.LargeBinary))), 0)
+        ).filter(CodeFile.user_id == user_id).scalar()
+        usage = StorageUsage(user_id=user_id, bytes_used=total)
+        session.add(usage)
+        session.flush()
+    return usage
+
+
 # API路由
 @app.route('/api/register', methods=['POST'])
+@rate_limit('register')
 def register():
     data = request.get_json()
     username = data.get('username')
@@ -106,21 +430,24 @@ def register():
 
     user = User(
         username=username,
-        password_hash=generate_password_hash(password)
+        password_hash=generate_password_hash(password),
+        class_name=data.get('class_name') or None
     )
     db.session.add(user)
     db.session.commit()
+    broker.publish('user.created', {'user_id': user.id, 'username': user.username})
 
     return jsonify({'success': True, 'message': '注册成功'})
 
 
 @app.route('/api/login', methods=['POST'])
+@rate_limit('login')
 def login():
     data = request.get_json()
     username = data.get('username')
     password = data.get('password')
 
-    user = User.query.filter_by(username=username).first()
+    user = User.query.filter_by(username=username, deleted_at=None).first()
     if not user or not check_password_hash(user.password_hash, password):
         return jsonify({'success': False, 'message': '用户名或密码错误'})
 
@@ -138,6 +465,7 @@ def login():
 
 @app.route('/api/submit_code', methods=['POST'])
 @token_required
+@rate_limit('submit_code', per='user')
 def submit_code(current_user):
     data = request.get_json()
     project_name = data.get('project_name')
@@ -147,94 +475,247 @@ def submit_code(current_user):
     if not all([project_name, file_path, code_content]):
         return jsonify({'success': False, 'message': '参数不完整'})
 
-    # 查找或创建项目
-    project = Project.query.filter_by(name=project_name, user_id=current_user.id).first()
-    if not project:
-        project = Project(name=project_name, user_id=current_user.id)
-        db.session.add(project)
-        db.session.commit()
-
-    # 查找或更新文件
-    code_file = CodeFile.query.filter_by(filename=file_path, project_id=project.id).first()
-    if code_file:
-        code_file.content = code_content
-        code_file.updated_at = datetime.datetime.utcnow()
-    else:
-        code_file = CodeFile(
-            filename=file_path,
-            content=code_content,
-            project_id=project.id,
-            user_id=current_user.id
+    shard = shards.shard_for_key(current_user.id)
+    session = shards.session(shard)
+    now = datetime.datetime.utcnow()
+
+    # 一个事务内完成：第一条语句就是写入，直接拿到写锁，后面的读取不会与并发提交交错
+    # 项目已存在时执行一次无变化的更新，这样RETURNING总能返回项目ID
+    project_id = session.execute(
+        sqlite_insert(Project)
+        .values(name=project_name, user_id=current_user.id, created_at=now)
+        .on_conflict_do_update(index_elements=['user_id', 'name'], set_={'name': project_name})
+        .returning(Project.id)
+    ).scalar_one()
+
+    # 检查存储配额（只计算本次提交带来的变化量）
+    old_content = session.query(CodeFile.content) \
+        .filter(CodeFile.project_id == project_id, CodeFile.filename == file_path).scalar()
+    size_delta = content_size(code_content) - content_size(old_content)
+    usage = get_storage_usage(session, current_user.id)
+    if size_delta > 0 and usage.bytes_used + size_delta > app.config['USER_STORAGE_QUOTA']:
+        session.rollback()
+        return jsonify({'success': False, 'message': '存储空间不足，请删除不需要的文件后再提交'}), 413
+
+    file_id, revision = session.execute(
+        sqlite_insert(CodeFile)
+        .values(filename=file_path, content=code_content, project_id=project_id, user_id=current_user.id,
+                created_at=now, updated_at=now, revision=1)
+        .on_conflict_do_update(
+            index_elements=['project_id', 'filename'],
+            set_={'content': code_content, 'updated_at': now, 'revision': CodeFile.revision + 1}
         )
-        db.session.add(code_file)
-
-    db.session.commit()
-
-    return jsonify({'success': True, 'message': '代码提交成功'})
+        .returning(CodeFile.id, CodeFile.revision)
+    ).one()
+
+    # 在数据库中原子地累加
+    usage.bytes_used = StorageUsage.bytes_used + size_delta
+    session.commit()
+
+    global_file_id = shards.to_global_id(shard, file_id)
+    file_cache.invalidate(global_file_id)
+    # 相似度索引和统计汇总在主库，交给后台线程批量写入
+    main_writer.submit(index_similarity, global_file_id, current_user.id, project_name, file_path, code_content)
+    main_writer.submit(record_submission, current_user.id, current_user.class_name or '', project_name,
+                       changed_bytes(old_content, code_content), now)
+    broker.publish('file.submitted', {
+        'file_id': global_file_id,
+        'filename': file_path,
+        'project_id': shards.to_global_id(shard, project_id),
+        'project_name': project_name,
+        'user_id': current_user.id,
+        'revision': revision
+    }, user_id=current_user.id)
+
+    return jsonify({'success': True, 'message': '代码提交成功', 'file_id': global_file_id, 'revision': revision})
+
+
+@app.route('/api/quota', methods=['GET'])
+@token_required
+def get_quota(current_user):
+    session = shards.session_for_user(current_user.id)
+    usage = get_storage_usage(session, current_user.id)
+    session.commit()
+    return jsonify({
+        'success': True,
+        'quota': {'bytes_used': usage.bytes_used, 'bytes_limit': app.config['USER_STORAGE_QUOTA']}
+    })
 
 
 @app.route('/api/projects', methods=['GET'])
 @token_required
 def get_projects(current_user):
-    projects = Project.query.filter_by(user_id=current_user.id).all()
+    shard = shards.shard_for_key(current_user.id)
+    session = shards.session(shard)
+
+    # 只查询统计信息，不加载文件内容
+    file_counts = session.query(
+        CodeFile.project_id,
+        db.func.count(CodeFile.id).label('file_count'),
+        db.func.max(CodeFile.updated_at).label('updated_at')
+    ).group_by(CodeFile.project_id).subquery()
+    projects = session.query(
+        Project.id, Project.name, Project.created_at,
+        db.func.coalesce(file_counts.c.file_count, 0).label('file_count'),
+        file_counts.c.updated_at
+    ).outerjoin(file_counts, file_counts.c.project_id == Project.id) \
+        .filter(Project.user_id == current_user.id).order_by(Project.id).all()
+
+    last_modified = max([p.updated_at or p.created_at for p in projects], default=None)
+    etag = make_etag('projects', current_user.id,
+                     *[(p.id, p.name, p.file_count, p.updated_at) for p in projects])
+    cached = check_not_modified(etag, last_modified)
+    if cached:
+        return cached
+
     result = []
     for project in projects:
         result.append({
-            'id': project.id,
+            'id': shards.to_global_id(shard, project.id),
             'name': project.name,
             'created_at': project.created_at.isoformat(),
-            'file_count': len(project.files)
+            'file_count': project.file_count
         })
-    return jsonify({'success': True, 'projects': result})
+    return with_validators(jsonify({'success': True, 'projects': result}), etag, last_modified)
 
 
 @app.route('/api/project/<int:project_id>/files', methods=['GET'])
 @token_required
 def get_project_files(current_user, project_id):
-    project = Project.query.get_or_404(project_id)
+    session, shard, local_id = shards.locate(project_id)
+    project = session.get(Project, local_id)
+    if not project:
+        abort(404)
     if project.user_id != current_user.id and not current_user.is_admin:
         return jsonify({'success': False, 'message': '无权访问此项目'}), 403
 
-    files = CodeFile.query.filter_by(project_id=project_id).all()
+    # 先用聚合值判断是否变化，命中缓存时不读取文件列表
+    file_count, last_modified, id_sum = session.query(
+        db.func.count(CodeFile.id), db.func.max(CodeFile.updated_at), db.func.sum(CodeFile.id)
+    ).filter(CodeFile.project_id == local_id).one()
+    etag = make_etag('project-files', project_id, file_count, last_modified, id_sum)
+    cached = check_not_modified(etag, last_modified)
+    if cached:
+        return cached
+
+    files = session.query(
+        CodeFile.id, CodeFile.filename, CodeFile.created_at, CodeFile.updated_at
+    ).filter(CodeFile.project_id == local_id).all()
     result = []
     for file in files:
         result.append({
-            'id': file.id,
+            'id': shards.to_global_id(shard, file.id),
             'filename': file.filename,
             'created_at': file.created_at.isoformat(),
             'updated_at': file.updated_at.isoformat()
         })
-    return jsonify({'success': True, 'files': result})
+    return with_validators(jsonify({'success': True, 'files': result}), etag, last_modified)
 
 
 @app.route('/api/file/<int:file_id>', methods=['GET'])
 @token_required
 def get_file_content(current_user, file_id):
-    code_file = CodeFile.query.get_or_404(file_id)
-    if code_file.user_id != current_user.id and not current_user.is_admin:
-        return jsonify({'success': False, 'message': '无权访问此文件'}), 403
-
-    return jsonify({
+    session, shard, local_id = shards.locate(file_id)
+    token = file_cache.read_token()
+
+    # 只按主键读取权限和版本字段，304或命中缓存时不加载content列
+    meta = session.query(CodeFile.user_id, CodeFile.updated_at).filter(CodeFile.id == local_id).first()
+    if not meta:
+        abort(404)
+    if meta.user_id != current_user.id:
+        if not current_user.is_admin:
+            return jsonify({'success': False, 'message': '无权访问此文件'}), 403
+        if is_deleted_user(meta.user_id):
+            abort(404)  # 已标记删除的用户的文件对管理员也不可见
+
+    etag = make_etag('file', file_id, meta.updated_at.isoformat())
+    cached = check_not_modified(etag, meta.updated_at)
+    if cached:
+        return cached
+
+    # 缓存只在版本与数据库一致时使用，其他进程修改过的文件不会返回旧内容
+    entry = file_cache.get(file_id, meta.updated_at)
+    if entry:
+        response = Response(entry.body, mimetype='application/json')
+        return with_validators(response, etag, entry.updated_at)
+
+    code_file = session.get(CodeFile, local_id)
+    if not code_file:
+        abort(404)
+    response = jsonify({
         'success': True,
         'file': {
-            'id': code_file.id,
+            'id': file_id,
             'filename': code_file.filename,
             'content': code_file.content,
             'created_at': code_file.created_at.isoformat(),
-            'updated_at': code_file.updated_at.isoformat()
+            'updated_at': code_file.updated_at.isoformat(),
+            'revision': code_file.revision
         }
     })
+    file_cache.put(file_id, code_file.updated_at, code_file.user_id, response.get_data(), token)
+    # 两次查询之间文件可能已被修改，校验字段与返回的内容保持一致
+    etag = make_etag('file', file_id, code_file.updated_at.isoformat())
+    return with_validators(response, etag, code_file.updated_at)
+
+
+@app.route('/api/file/<int:file_id>/raw', methods=['GET'])
+@token_required
+def download_file_raw(current_user, file_id):
+    """以原始字节下载文件，支持Range断点续传和条件请求"""
+    session, shard, local_id = shards.locate(file_id)
+    code_file = session.get(CodeFile, local_id)
+    if not code_file:
+        abort(404)
+    if code_file.user_id != current_user.id:
+        if not current_user.is_admin:
+            return jsonify({'success': False, 'message': '无权访问此文件'}), 403
+        if is_deleted_user(code_file.user_id):
+            abort(404)
+
+    # 内容保存在数据库中，只能从内存发送；ETag与JSON接口的版本一致，Range按原始字节计算
+    response = send_file(
+        io.BytesIO(code_file.content.encode('utf-8')),
+        mimetype='text/plain; charset=utf-8',
+        as_attachment=True,
+        download_name=os.path.basename(code_file.filename),
+        etag=make_etag('raw', file_id, code_file.updated_at.isoformat()),
+        last_modified=http_datetime(code_file.updated_at),
+        max_age=0,
+        conditional=True
+    )
+    response.cache_control.private = True
+    return response
+
+
+def remove_code_file(session, shard, code_file):
+    """删除文件并扣减所属用户的存储用量，发布删除事件"""
+    file_id = shards.to_global_id(shard, code_file.id)
+    project_id = shards.to_global_id(shard, code_file.project_id)
+    owner_id = code_file.user_id
+
+    usage = get_storage_usage(session, owner_id)
+    usage.bytes_used = StorageUsage.bytes_used - content_size(code_file.content)
+    session.delete(code_file)
+    session.commit()
+    file_cache.invalidate(file_id)
+    # 与提交的索引写入走同一个队列，保证排在之前的索引之后执行
+    main_writer.submit(unindex_similarity, [file_id])
+    broker.publish('file.deleted', {'file_id': file_id, 'project_id': project_id}, user_id=owner_id)
 
 
 @app.route('/api/file/<int:file_id>', methods=['DELETE'])
 @token_required
+@rate_limit('delete_file', per='user')
 def delete_file(current_user, file_id):
-    code_file = CodeFile.query.get_or_404(file_id)
+    session, shard, local_id = shards.locate(file_id)
+    code_file = session.get(CodeFile, local_id)
+    if not code_file:
+        abort(404)
     if code_file.user_id != current_user.id and not current_user.is_admin:
         return jsonify({'success': False, 'message': '无权删除此文件'}), 403
 
-    db.session.delete(code_file)
-    db.session.commit()
+    remove_code_file(session, shard, code_file)
 
     return jsonify({'success': True, 'message': '文件删除成功'})
 
@@ -244,7 +725,19 @@ def delete_file(current_user, file_id):
 @token_required
 @admin_required
 def admin_get_users(current_user):
-    users = User.query.all()
+    users = User.query.filter_by(deleted_at=None).all()
+
+    # 各分片分别统计后合并
+    project_counts = {}
+    file_counts = {}
+    for shard, session in shards.all_shards():
+        for user_id, count in session.query(Project.user_id, db.func.count(Project.id)) \
+                .group_by(Project.user_id):
+            project_counts[user_id] = project_counts.get(user_id, 0) + count
+        for user_id, count in session.query(CodeFile.user_id, db.func.count(CodeFile.id)) \
+                .group_by(CodeFile.user_id):
+            file_counts[user_id] = file_counts.get(user_id, 0) + count
+
     result = []
     for user in users:
         result.append({
@@ -252,8 +745,9 @@ def admin_get_users(current_user):
             'username': user.username,
             'is_admin': user.is_admin,
             'created_at': user.created_at.isoformat(),
-            'project_count': len(user.projects),
-            'file_count': len(user.files)
+            'class_name': user.class_name,
+            'project_count': project_counts.get(user.id, 0),
+            'file_count': file_counts.get(user.id, 0)
         })
     return jsonify({'success': True, 'users': result})
 
@@ -262,29 +756,519 @@ def admin_get_users(current_user):
 @token_required
 @admin_required
 def admin_get_all_files(current_user):
-    files = CodeFile.query.all()
+    usernames = dict(db.session.query(User.id, User.username).filter(User.deleted_at.is_(None)).all())
+
+    # 所有分片的文件合并后按创建时间排序
     result = []
-    for file in files:
+    for shard, session in shards.all_shards():
+        files = session.query(
+            CodeFile.id, CodeFile.filename, CodeFile.user_id, CodeFile.project_id,
+            Project.name.label('project_name'), CodeFile.created_at, CodeFile.updated_at
+        ).join(Project, Project.id == CodeFile.project_id).all()
+        for file in files:
+            if file.user_id not in usernames:
+                continue  # 已标记删除、等待清理的用户
+            result.append({
+                'id': shards.to_global_id(shard, file.id),
+                'filename': file.filename,
+                'user_id': file.user_id,
+                'username': usernames.get(file.user_id),
+                'project_id': shards.to_global_id(shard, file.project_id),
+                'project_name': file.project_name,
+                'created_at': file.created_at.isoformat(),
+                'updated_at': file.updated_at.isoformat()
+            })
+    result.sort(key=lambda f: f['created_at'])
+    return jsonify({'success': True, 'files': result})
+
+
+# 主库的后台批量写入
+def apply_main_writes(operations):
+    """按顺序执行一批写操作，一起提交"""
+    with app.app_context():
+        try:
+            for func, args in operations:
+                func(*args)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+main_writer = BatchWriter(apply_main_writes)
+
+
+# 提交统计汇总
+ROLLUP_FORMATS = {'minute': '%Y-%m-%d %H:%M', 'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d'}
+MINUTE_ROLLUP_RETENTION = datetime.timedelta(days=2)  # 分钟粒度只保留最近两天
+last_rollup_prune = None
+
+
+def record_submission(user_id, class_name, project_name, bytes_changed, now):
+    """累加一次提交在各粒度的汇总数据（由调用者提交事务）"""
+    global last_rollup_prune
+    day = now.strftime(ROLLUP_FORMATS['day'])
+
+    for granularity, fmt in ROLLUP_FORMATS.items():
+        stmt = sqlite_insert(SubmissionRollup).values(
+            granularity=granularity, bucket=now.strftime(fmt), class_name=class_name, count=1
+        )
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['granularity', 'bucket', 'class_name'],
+            set_={'count': SubmissionRollup.count + 1}
+        ))
+    db.session.execute(sqlite_insert(ActiveUserDay).values(day=day, user_id=user_id).on_conflict_do_nothing())
+    stmt = sqlite_insert(ProjectChurn).values(
+        day=day, user_id=user_id, project_name=project_name, submissions=1, bytes_changed=bytes_changed
+    )
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['day', 'user_id', 'project_name'],
+        set_={'submissions': ProjectChurn.submissions + 1,
+              'bytes_changed': ProjectChurn.bytes_changed + bytes_changed}
+    ))
+
+    # 每小时清理一次过期的分钟数据
+    if last_rollup_prune is None or now - last_rollup_prune > datetime.timedelta(hours=1):
+        cutoff = (now - MINUTE_ROLLUP_RETENTION).strftime(ROLLUP_FORMATS['minute'])
+        SubmissionRollup.query.filter(SubmissionRollup.granularity == 'minute',
+                                      SubmissionRollup.bucket < cutoff).delete(synchronize_session=False)
+        last_rollup_prune = now
+
+
+def analytics_since(days, granularity='day'):
+    """统计窗口的起点（与汇总表的时间格式一致）"""
+    start = datetime.datetime.utcnow() - datetime.timedelta(days=max(1, min(days, 366)))
+    return start.strftime(ROLLUP_FORMATS[granularity])
+
+
+# 相似度索引
+def unindex_similarity(file_ids):
+    SimilarityBand.query.filter(SimilarityBand.file_id.in_(file_ids)).delete(synchronize_session=False)
+    SimilaritySignature.query.filter(SimilaritySignature.file_id.in_(file_ids)).delete(synchronize_session=False)
+
+
+def index_similarity(file_id, user_id, project_name, filename, content):
+    """计算文件的MinHash签名并更新LSH索引（没有可比较的记号时只删除旧索引，由调用者提交事务）"""
+    signature = similarity.signature_for_code(content)
+    unindex_similarity([file_id])
+    if signature:
+        db.session.add(SimilaritySignature(
+            file_id=file_id, user_id=user_id, project_name=project_name, filename=filename,
+            signature=similarity.pack_signature(signature)
+        ))
+        db.session.bulk_insert_mappings(SimilarityBand, [
+            {'band': band, 'bucket': bucket, 'file_id': file_id}
+            for band, bucket in similarity.band_keys(signature)
+        ])
+
+
+# 删除标记和后台清理
+def delete_grace():
+    return datetime.timedelta(seconds=app.config['DELETE_GRACE_SECONDS'])
+
+
+def purge_time(user):
+    return user.deleted_at + delete_grace()
+
+
+def deleted_user_ids():
+    return {user_id for user_id, in db.session.query(User.id).filter(User.deleted_at.isnot(None))}
+
+
+def is_deleted_user(user_id):
+    return db.session.query(User.deleted_at).filter(User.id == user_id).scalar() is not None
+
+
+def purge_in_batches(session, model, user_id, on_batch=None):
+    """每次删除一批行并提交，两批之间释放写锁，其他请求的写入可以插进来"""
+    batch_size = app.config['REAPER_BATCH_SIZE']
+    total = 0
+    while True:
+        ids = [row_id for row_id, in session.query(model.id).filter_by(user_id=user_id).limit(batch_size)]
+        if not ids:
+            return total
+        session.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+        session.commit()
+        if on_batch:
+            on_batch(ids)
+        total += len(ids)
+
+
+def purge_user(user_id):
+    """删除用户的所有数据，最后删除用户本身"""
+    main_writer.flush()  # 先写完队列中该用户的索引
+    session = shards.session_for_user(user_id)
+    shard = shards.shard_for_key(user_id)
+
+    def unindex(ids):
+        unindex_similarity([shards.to_global_id(shard, file_id) for file_id in ids])
+        db.session.commit()
+
+    files = purge_in_batches(session, CodeFile, user_id, on_batch=unindex)
+    purge_in_batches(session, Project, user_id)
+    session.query(StorageUsage).filter_by(user_id=user_id).delete()
+    session.commit()
+    file_cache.invalidate_user(user_id)
+
+    # 按用户ID查找遗留的相似度索引（例如索引建立时文件已被移动）
+    unindex_similarity([row.file_id for row in SimilaritySignature.query.filter_by(user_id=user_id)])
+    GradeResult.query.filter_by(user_id=user_id).delete()
+    User.query.filter_by(id=user_id).delete()
+    db.session.commit()
+    return files
+
+
+def reap_deleted_users():
+    """清理超过宽限期的已删除用户，返回清理的用户数"""
+    cutoff = datetime.datetime.utcnow() - delete_grace()
+    user_ids = [user_id for user_id, in db.session.query(User.id).filter(User.deleted_at <= cutoff)]
+    db.session.commit()  # 结束读事务
+    for user_id in user_ids:
+        files = purge_user(user_id)
+        broker.publish('user.purged', {'user_id': user_id, 'files': files})
+    return len(user_ids)
+
+
+def start_reaper():
+    def loop():
+        while True:
+            time.sleep(app.config['REAPER_INTERVAL'])
+            with app.app_context():
+                try:
+                    reap_deleted_users()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"清理已删除用户失败: {e}")
+
+    threading.Thread(target=loop, daemon=True).start()
+
+
+# WSGI部署时随模块导入启动；直接运行时debug重载器的父进程不处理请求，只在子进程中启动（命令行工具模式也不启动）
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    start_reaper()
+
+
+# 作业评分
+def latest_submissions(assignment):
+    """各分片中匹配作业的文件，每个学生取最新的一份，返回{用户ID: (全局文件ID, 代码)}"""
+    deleted = deleted_user_ids()
+    latest = {}
+    for shard, session in shards.all_shards():
+        files = session.query(CodeFile.id, CodeFile.user_id, CodeFile.content, CodeFile.updated_at) \
+            .join(Project, Project.id == CodeFile.project_id) \
+            .filter(Project.name == assignment.project_name, CodeFile.filename == assignment.filename).all()
+        for file in files:
+            if file.user_id in deleted:
+                continue
+            current = latest.get(file.user_id)
+            if current is None or file.updated_at > current[0]:
+                latest[file.user_id] = (file.updated_at, shards.to_global_id(shard, file.id), file.content)
+    return {user_id: (file_id, content) for user_id, (_, file_id, content) in latest.items()}
+
+
+def save_grade(assignment_id, user_id, file_id, code_hash, tests_hash, result):
+    grade = GradeResult.query.filter_by(assignment_id=assignment_id, user_id=user_id).first()
+    if not grade:
+        grade = GradeResult(assignment_id=assignment_id, user_id=user_id)
+        db.session.add(grade)
+    grade.file_id = file_id
+    grade.content_hash = code_hash
+    grade.suite_hash = tests_hash
+    grade.score = result['score']
+    grade.passed = result['passed']
+    grade.total = result['total']
+    grade.duration = result['duration']
+    grade.details = result['details']
+    grade.graded_at = datetime.datetime.utcnow()
+    db.session.commit()
+
+
+def run_grading(assignment_id):
+    """后台线程：对作业的所有最新提交评分，结果未变化的提交直接复用缓存"""
+    job = grading_jobs[assignment_id]
+    try:
+        with app.app_context():
+            assignment = db.session.get(Assignment, assignment_id)
+            tests = json.loads(assignment.tests)
+            tests_hash = suite_hash(tests, assignment.timeout)
+            submissions = latest_submissions(assignment)
+            hashes = {user_id: content_hash(content) for user_id, (_, content) in submissions.items()}
+            job['total'] = len(submissions)
+
+            # 相同代码和相同测试集的已有结果（可能来自其他作业或其他学生）
+            cached = {}
+            if hashes:
+                for grade in GradeResult.query.filter(GradeResult.suite_hash == tests_hash,
+                                                      GradeResult.content_hash.in_(set(hashes.values()))):
+                    cached[grade.content_hash] = grade
+
+            jobs = {}
+            for user_id, (file_id, content) in submissions.items():
+                grade = cached.get(hashes[user_id])
+                if grade:
+                    if grade.assignment_id != assignment_id or grade.user_id != user_id or grade.file_id != file_id:
+                        save_grade(assignment_id, user_id, file_id, grade.content_hash, tests_hash, {
+                            'score': grade.score, 'passed': grade.passed, 'total': grade.total,
+                            'duration': grade.duration, 'details': grade.details
+                        })
+                    job['cached'] += 1
+                    job['done'] += 1
+                else:
+                    jobs[user_id] = content
+
+            for user_id, result in grader.grade_all(jobs, tests, assignment.timeout):
+                result['details'] = json.dumps(result.pop('cases'), ensure_ascii=False)
+                save_grade(assignment_id, user_id, submissions[user_id][0], hashes[user_id], tests_hash, result)
+                job['done'] += 1
+        job['status'] = 'finished'
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    broker.publish('grade.finished', {'assignment_id': assignment_id, 'status': job['status']})
+
+
+def assignment_to_dict(assignment):
+    return {
+        'id': assignment.id,
+        'name': assignment.name,
+        'project_name': assignment.project_name,
+        'filename': assignment.filename,
+        'tests': json.loads(assignment.tests),
+        'timeout': assignment.timeout,
+        'created_at': assignment.created_at.isoformat(),
+        'job': grading_jobs.get(assignment.id)
+    }
+
+
+@app.route('/api/admin/assignments', methods=['GET'])
+@token_required
+@admin_required
+def admin_get_assignments(current_user):
+    assignments = Assignment.query.order_by(Assignment.id).all()
+    return jsonify({'success': True, 'assignments': [assignment_to_dict(a) for a in assignments]})
+
+
+@app.route('/api/admin/assignments', methods=['POST'])
+@token_required
+@admin_required
+def admin_create_assignment(current_user):
+    data = request.get_json() or {}
+    tests = data.get('tests')
+    if not all([data.get('name'), data.get('project_name'), data.get('filename')]) or not isinstance(tests, list):
+        return jsonify({'success': False, 'message': '参数不完整'})
+
+    assignment = Assignment(
+        name=data['name'],
+        project_name=data['project_name'],
+        filename=data['filename'],
+        tests=json.dumps(tests, ensure_ascii=False),
+        timeout=float(data.get('timeout') or 5)
+    )
+    db.session.add(assignment)
+    db.session.commit()
+    return jsonify({'success': True, 'message': '作业创建成功', 'assignment': assignment_to_dict(assignment)})
+
+
+@app.route('/api/admin/assignment/<int:assignment_id>', methods=['DELETE'])
+@token_required
+@admin_required
+def admin_delete_assignment(current_user, assignment_id):
+    assignment = Assignment.query.get_or_404(assignment_id)
+    if grading_jobs.get(assignment_id, {}).get('status') == 'running':
+        return jsonify({'success': False, 'message': '正在评分，请稍后再删除'}), 409
+
+    GradeResult.query.filter_by(assignment_id=assignment_id).delete()
+    db.session.delete(assignment)
+    db.session.commit()
+    grading_jobs.pop(assignment_id, None)
+    return jsonify({'success': True, 'message': '作业删除成功'})
+
+
+@app.route('/api/admin/assignment/<int:assignment_id>/grade', methods=['POST'])
+@token_required
+@admin_required
+def admin_grade_assignment(current_user, assignment_id):
+    Assignment.query.get_or_404(assignment_id)
+    with grading_lock:
+        if grading_jobs.get(assignment_id, {}).get('status') == 'running':
+            return jsonify({'success': False, 'message': '该作业正在评分'}), 409
+        grading_jobs[assignment_id] = {'status': 'running', 'done': 0, 'total': 0, 'cached': 0}
+
+    threading.Thread(target=run_grading, args=(assignment_id,), daemon=True).start()
+    return jsonify({'success': True, 'message': '已开始评分'}), 202
+
+
+@app.route('/api/admin/assignment/<int:assignment_id>/results', methods=['GET'])
+@token_required
+@admin_required
+def admin_get_grade_results(current_user, assignment_id):
+    assignment = Assignment.query.get_or_404(assignment_id)
+    rows = db.session.query(GradeResult, User.username) \
+        .join(User, User.id == GradeResult.user_id) \
+        .filter(GradeResult.assignment_id == assignment_id).order_by(User.username).all()
+
+    result = []
+    for grade, username in rows:
         result.append({
-            'id': file.id,
-            'filename': file.filename,
-            'user_id': file.user_id,
-            'username': file.user.username,
-            'project_id': file.project_id,
-            'project_name': file.project.name,
-            'created_at': file.created_at.isoformat(),
-            'updated_at': file.updated_at.isoformat()
+            'user_id': grade.user_id,
+            'username': username,
+            'file_id': grade.file_id,
+            'score': grade.score,
+            'passed': grade.passed,
+            'total': grade.total,
+            'duration': grade.duration,
+            'graded_at': grade.graded_at.isoformat(),
+            'cases': json.loads(grade.details) if grade.details else []
         })
-    return jsonify({'success': True, 'files': result})
+    return jsonify({'success': True, 'assignment': assignment_to_dict(assignment), 'results': result})
+
+
+@app.route('/api/admin/similar', methods=['GET'])
+@token_required
+@admin_required
+def admin_find_similar(current_user):
+    """返回不同学生之间相似度不低于阈值的文件对（只比较LSH候选对）"""
+    threshold = request.args.get('threshold', 0.8, type=float)
+    limit = request.args.get('limit', 200, type=int)
+    project_name = request.args.get('project_name')
+    filename = request.args.get('filename')
+
+    # 同一个桶里的文件（至少两个）
+    query = db.session.query(SimilarityBand.band, SimilarityBand.bucket,
+                             db.func.group_concat(SimilarityBand.file_id))
+    if project_name or filename:
+        query = query.join(SimilaritySignature, SimilaritySignature.file_id == SimilarityBand.file_id)
+        if project_name:
+            query = query.filter(SimilaritySignature.project_name == project_name)
+        if filename:
+            query = query.filter(SimilaritySignature.filename == filename)
+    buckets = query.group_by(SimilarityBand.band, SimilarityBand.bucket) \
+        .having(db.func.count(SimilarityBand.id) > 1).all()
+
+    candidates = set()
+    for _, _, file_ids in buckets:
+        file_ids = sorted(int(file_id) for file_id in file_ids.split(','))
+        for i, first in enumerate(file_ids):
+            for second in file_ids[i + 1:]:
+                candidates.add((first, second))
+
+    involved = {file_id for pair in candidates for file_id in pair}
+    signatures = {}
+    for start in range(0, len(involved), 500):
+        chunk = list(involved)[start:start + 500]
+        for row in SimilaritySignature.query.filter(SimilaritySignature.file_id.in_(chunk)):
+            signatures[row.file_id] = (row, similarity.unpack_signature(row.signature))
+
+    deleted = deleted_user_ids()
+    pairs = []
+    for first, second in candidates:
+        (row_a, sig_a), (row_b, sig_b) = signatures[first], signatures[second]
+        if row_a.user_id == row_b.user_id or row_a.user_id in deleted or row_b.user_id in deleted:
+            continue
+        score = similarity.estimate_similarity(sig_a, sig_b)
+        if score >= threshold:
+            pairs.append((score, row_a, row_b))
+    pairs.sort(key=lambda pair: pair[0], reverse=True)
+
+    usernames = dict(db.session.query(User.id, User.username).all())
+
+    def file_info(row):
+        return {
+            'file_id': row.file_id,
+            'user_id': row.user_id,
+            'username': usernames.get(row.user_id),
+            'project_name': row.project_name,
+            'filename': row.filename
+        }
+
+    result = [{'similarity': round(score, 3), 'a': file_info(a), 'b': file_info(b)} for score, a, b in pairs[:limit]]
+    return jsonify({'success': True, 'candidates': len(candidates), 'pairs': result})
+
+
+# 统计分析（只读汇总表，耗时与历史数据量无关）
+@app.route('/api/admin/analytics/submissions', methods=['GET'])
+@token_required
+@admin_required
+def admin_analytics_submissions(current_user):
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in ROLLUP_FORMATS:
+        return jsonify({'success': False, 'message': '不支持的统计粒度'}), 400
+    days = request.args.get('days', 30, type=int)
+    class_name = request.args.get('class_name')
+
+    query = db.session.query(SubmissionRollup.bucket, SubmissionRollup.class_name, SubmissionRollup.count) \
+        .filter(SubmissionRollup.granularity == granularity,
+                SubmissionRollup.bucket >= analytics_since(days, granularity))
+    if class_name is not None:
+        query = query.filter(SubmissionRollup.class_name == class_name)
+
+    series = [{'bucket': bucket, 'class_name': name, 'count': count}
+              for bucket, name, count in query.order_by(SubmissionRollup.bucket)]
+    return jsonify({'success': True, 'granularity': granularity, 'series': series})
+
+
+@app.route('/api/admin/analytics/active-users', methods=['GET'])
+@token_required
+@admin_required
+def admin_analytics_active_users(current_user):
+    days = request.args.get('days', 30, type=int)
+    rows = db.session.query(ActiveUserDay.day, db.func.count(ActiveUserDay.user_id)) \
+        .filter(ActiveUserDay.day >= analytics_since(days)) \
+        .group_by(ActiveUserDay.day).order_by(ActiveUserDay.day).all()
+    return jsonify({'success': True, 'series': [{'day': day, 'active_users': count} for day, count in rows]})
+
+
+@app.route('/api/admin/analytics/top-projects', methods=['GET'])
+@token_required
+@admin_required
+def admin_analytics_top_projects(current_user):
+    days = request.args.get('days', 30, type=int)
+    limit = request.args.get('limit', 10, type=int)
+    churn = db.func.sum(ProjectChurn.bytes_changed)
+    rows = db.session.query(ProjectChurn.user_id, ProjectChurn.project_name,
+                            db.func.sum(ProjectChurn.submissions), churn) \
+        .filter(ProjectChurn.day >= analytics_since(days)) \
+        .group_by(ProjectChurn.user_id, ProjectChurn.project_name) \
+        .order_by(churn.desc()).limit(limit).all()
+
+    usernames = dict(db.session.query(User.id, User.username).all())
+    result = [{
+        'user_id': user_id,
+        'username': usernames.get(user_id),
+        'project_name': project_name,
+        'submissions': submissions,
+        'bytes_changed': bytes_changed
+    } for user_id, project_name, submissions, bytes_changed in rows]
+    return jsonify({'success': True, 'projects': result})
+
+
+@app.route('/api/admin/user/<int:user_id>/class', methods=['PUT'])
+@token_required
+@admin_required
+def admin_set_user_class(current_user, user_id):
+    user = User.query.get_or_404(user_id)
+    user.class_name = (request.get_json() or {}).get('class_name') or None
+    db.session.commit()
+    return jsonify({'success': True, 'message': '班级已更新'})
+
+
+@app.route('/api/admin/cache', methods=['GET'])
+@token_required
+@admin_required
+def admin_cache_stats(current_user):
+    return jsonify({'success': True, 'cache': file_cache.stats()})
 
 
 @app.route('/api/admin/file/<int:file_id>', methods=['DELETE'])
 @token_required
 @admin_required
 def admin_delete_file(current_user, file_id):
-    code_file = CodeFile.query.get_or_404(file_id)
-    db.session.delete(code_file)
-    db.session.commit()
+    session, shard, local_id = shards.locate(file_id)
+    code_file = session.get(CodeFile, local_id)
+    if not code_file:
+        abort(404)
+
+    remove_code_file(session, shard, code_file)
 
     return jsonify({'success': True, 'message': '文件删除成功'})
 
@@ -296,16 +1280,106 @@ def admin_delete_user(current_user, user_id):
     if current_user.id == user_id:
         return jsonify({'success': False, 'message': '不能删除自己的账户'}), 400
 
-    user = User.query.get_or_404(user_id)
+    user = User.query.filter_by(id=user_id, deleted_at=None).first_or_404()
 
-    # 删除用户的所有文件和项目
-    CodeFile.query.filter_by(user_id=user_id).delete()
-    Project.query.filter_by(user_id=user_id).delete()
+    # 只标记删除，项目和文件由清理线程在宽限期后分批删除
+    user.deleted_at = datetime.datetime.utcnow()
+    db.session.commit()
+    file_cache.invalidate_user(user_id)
+    broker.publish('user.deleted', {'user_id': user_id})
 
-    db.session.delete(user)
+    return jsonify({
+        'success': True,
+        'message': '用户已删除，可在宽限期内撤销',
+        'restore_until': purge_time(user).isoformat()
+    })
+
+
+@app.route('/api/admin/users/deleted', methods=['GET'])
+@token_required
+@admin_required
+def admin_get_deleted_users(current_user):
+    """已标记删除、尚未清理的用户"""
+    users = User.query.filter(User.deleted_at.isnot(None)).order_by(User.deleted_at.desc()).all()
+    now = datetime.datetime.utcnow()
+    result = [{
+        'id': user.id,
+        'username': user.username,
+        'deleted_at': user.deleted_at.isoformat(),
+        'restore_until': purge_time(user).isoformat(),
+        'restorable': purge_time(user) > now
+    } for user in users]
+    return jsonify({'success': True, 'users': result})
+
+
+@app.route('/api/admin/user/<int:user_id>/restore', methods=['POST'])
+@token_required
+@admin_required
+def admin_restore_user(current_user, user_id):
+    user = User.query.get_or_404(user_id)
+    if user.deleted_at is None:
+        return jsonify({'success': False, 'message': '用户未被删除'}), 400
+
+    # 条件更新：与清理线程的认领竞争时只有一方成功
+    restored = User.query.filter(
+        User.id == user_id,
+        User.deleted_at > datetime.datetime.utcnow() - delete_grace()
+    ).update({User.deleted_at: None}, synchronize_session=False)
     db.session.commit()
+    if not restored:
+        return jsonify({'success': False, 'message': '已超过撤销期限，数据正在清理'}), 409
 
-    return jsonify({'success': True, 'message': '用户删除成功'})
+    broker.publish('user.restored', {'user_id': user_id})
+    return jsonify({'success': True, 'message': '用户已恢复'})
+
+
+@app.route('/api/run', methods=['POST'])
+@token_required
+@rate_limit('run_code', per='user')
+def run_code(current_user):
+    if not sandbox_pool:
+        return jsonify({'success': False, 'message': '服务器没有开放远程运行'}), 403
+
+    data = request.get_json()
+    code = data.get('code') if data else None
+    if not code:
+        return jsonify({'success': False, 'message': '代码不能为空'})
+
+    # 每行一个JSON事件（NDJSON），输出实时推送给客户端
+    events = (json.dumps(event, ensure_ascii=False) + '\n' for event in sandbox_pool.run(code))
+    return Response(events, mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# 事件推送（SSE）
+@app.route('/api/events/ticket', methods=['POST'])
+@token_required
+def event_ticket(current_user):
+    """换取短期的事件流票据：浏览器EventSource无法设置请求头，票据放在URL中，长期token不会进入访问日志"""
+    ticket = jwt.encode({
+        'user_id': current_user.id,
+        'scope': 'events',
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(seconds=app.config['EVENT_TICKET_TTL'])
+    }, app.config['SECRET_KEY'], algorithm='HS256')
+    return jsonify({'success': True, 'ticket': ticket, 'expires_in': app.config['EVENT_TICKET_TTL']})
+
+
+@app.route('/api/events', methods=['GET'])
+def event_stream():
+    # 票据只在建立连接时检查，连接建立后过期不影响推送
+    token = request.headers.get('Authorization')
+    if token:
+        current_user = load_user_from_token(token)
+    else:
+        ticket = request.args.get('ticket')
+        current_user = load_user_from_token(ticket, scope='events') if ticket else None
+    if not current_user:
+        return jsonify({'success': False, 'message': 'Token无效'}), 401
+
+    last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    stream = broker.stream(current_user.id, current_user.is_admin, last_event_id)
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 # 网页界面
@@ -345,6 +1419,8 @@ with open('templates/admin.html', 'w', encoding='utf-8') as f:
     <div class="section">
         <h2>用户管理</h2>
         <div id="users-list"></div>
+        <h3>已删除（宽限期内可撤销）</h3>
+        <div id="deleted-users-list"></div>
     </div>
 
     <div class="section">
@@ -352,6 +1428,37 @@ with open('templates/admin.html', 'w', encoding='utf-8') as f:
         <div id="files-list"></div>
     </div>
 
+    <div class="section">
+        <h2>提交统计</h2>
+        <div>
+            <select id="analytics-granularity" onchange="loadAnalytics()">
+                <option value="hour">最近7天（按小时）</option>
+                <option value="day">最近30天（按天）</option>
+            </select>
+            <input id="analytics-class" placeholder="班级（留空为全部）" onchange="loadAnalytics()">
+        </div>
+        <canvas id="submissions-chart" width="900" height="220"></canvas>
+        <div id="active-users"></div>
+        <div id="top-projects"></div>
+    </div>
+
+    <div class="section">
+        <h2>作业评分</h2>
+        <div>
+            <input id="assignment-name" placeholder="作业名称">
+            <input id="assignment-project" placeholder="项目名，如 PythonL2">
+            <input id="assignment-file" placeholder="文件名，如 PY2_10.py">
+            <input id="assignment-timeout" type="number" value="5" style="width: 60px;"> 秒
+            <br>
+            <textarea id="assignment-tests" rows="4" cols="80"
+                      placeholder='测试用例JSON，如 [{"input": "1 2\\n", "expected": "3"}]'></textarea>
+            <br>
+            <button class="btn" onclick="createAssignment()">创建作业</button>
+        </div>
+        <div id="assignments-list"></div>
+        <div id="grade-results"></div>
+    </div>
+
     <script>
         const API_BASE = '/api';
         let token = localStorage.getItem('token');
@@ -376,6 +1483,12 @@ with open('templates/admin.html', 'w', encoding='utf-8') as f:
             return response;
         }
 
+        function escapeHtml(value) {
+            const div = document.createElement('div');
+            div.textContent = value == null ? '' : String(value);
+            return div.innerHTML.replace(/"/g, '&quot;').replace(/'/g, '&#39;');
+        }
+
         async function loadUsers() {
             const response = await fetchWithAuth(`${API_BASE}/admin/users`);
             const data = await response.json();
@@ -388,6 +1501,7 @@ with open('templates/admin.html', 'w', encoding='utf-8') as f:
                             <th>用户名</th>
                             <th>管理员</th>
                             <th>注册时间</th>
+                            <th>班级</th>
                             <th>项目数</th>
                             <th>文件数</th>
                             <th>操作</th>
@@ -395,9 +1509,10 @@ with open('templates/admin.html', 'w', encoding='utf-8') as f:
                         ${data.users.map(user => `
                             <tr>
                                 <td>${user.id}</td>
-                                <td>${user.username}</td>
+                                <td>${escapeHtml(user.username)}</td>
                                 <td>${user.is_admin ? '是' : '否'}</td>
                                 <td>${new Date(user.created_at).toLocaleString()}</td>
+                                <td class="user-class"></td>
                                 <td>${user.project_count}</td>
                                 <td>${user.file_count}</td>
                                 <td>
@@ -412,7 +1527,59 @@ with open('templates/admin.html', 'w', encoding='utf-8') as f:
                     </table>
                 `;
                 document.getElementById('users-list').innerHTML = usersHtml;
+                // 班级名称由用户输入，用textContent填入，不拼接到HTML和内联事件处理器中
+                document.querySelectorAll('#users-list .user-class').forEach((cell, index) => {
+                    const user = data.users[index];
+                    const button = document.createElement('button');
+                    button.className = 'btn';
+                    button.textContent = '修改';
+                    button.addEventListener('click', () => setUserClass(user.id, user.class_name || ''));
+                    cell.append(user.class_name || '', ' ', button);
+                });
             }
+            loadDeletedUsers();
+        }
+
+        async function loadDeletedUsers() {
+            const response = await fetchWithAuth(`${API_BASE}/admin/users/deleted`);
+            const data = await response.json();
+
+            if (data.success) {
+                document.getElementById('deleted-users-list').innerHTML = data.users.length ? `
+                    <table>
+                        <tr>
+                            <th>ID</th>
+                            <th>用户名</th>
+                            <th>删除时间</th>
+                            <th>撤销期限</th>
+                            <th>操作</th>
+                        </tr>
+                        ${data.users.map(user => `
+                            <tr>
+                                <td>${user.id}</td>
+                                <td>${escapeHtml(user.username)}</td>
+                                <td>${new Date(user.deleted_at + 'Z').toLocaleString()}</td>
+                                <td>${new Date(user.restore_until + 'Z').toLocaleString()}</td>
+                                <td>
+                                    ${user.restorable ? `
+                                        <button class="btn" onclick="restoreUser(${user.id})">撤销删除</button>
+                                    ` : '清理中'}
+                                </td>
+                            </tr>
+                        `).join('')}
+                    </table>
+                ` : '<p>无</p>';
+            }
+        }
+
+        async function restoreUser(userId) {
+            const response = await fetchWithAuth(`${API_BASE}/admin/user/${userId}/restore`, {
+                method: 'POST'
+            });
+            const data = await response.json();
+            alert(data.message);
+            loadUsers();
+            loadFiles();
         }
 
         async function loadFiles() {
@@ -434,9 +1601,9 @@ with open('templates/admin.html', 'w', encoding='utf-8') as f:
                         ${data.files.map(file => `
                             <tr>
                                 <td>${file.id}</td>
-                                <td>${file.filename}</td>
-                                <td>${file.username} (ID: ${file.user_id})</td>
-                                <td>${file.project_name}</td>
+                                <td>${escapeHtml(file.filename)}</td>
+                                <td>${escapeHtml(file.username)} (ID: ${file.user_id})</td>
+                                <td>${escapeHtml(file.project_name)}</td>
                                 <td>${new Date(file.created_at).toLocaleString()}</td>
                                 <td>${new Date(file.updated_at).toLocaleString()}</td>
                                 <td>
@@ -453,7 +1620,7 @@ with open('templates/admin.html', 'w', encoding='utf-8') as f:
         }
 
         async function deleteUser(userId) {
-            if (confirm('确定要删除这个用户吗？这将删除该用户的所有项目和文件！')) {
+            if (confirm('确定要删除这个用户吗？宽限期过后将删除该用户的所有项目和文件！')) {
                 const response = await fetchWithAuth(`${API_BASE}/admin/user/${userId}`, {
                     method: 'DELETE'
                 });
@@ -479,9 +1646,272 @@ with open('templates/admin.html', 'w', encoding='utf-8') as f:
             }
         }
 
+        async function setUserClass(userId, current) {
+            const className = prompt('班级名称', current);
+            if (className === null) {
+                return;
+            }
+            const response = await fetchWithAuth(`${API_BASE}/admin/user/${userId}/class`, {
+                method: 'PUT',
+                body: JSON.stringify({ class_name: className })
+            });
+            const data = await response.json();
+            if (data.success) {
+                loadUsers();
+            }
+        }
+
+        function drawBarChart(canvas, labels, values) {
+            const ctx = canvas.getContext('2d');
+            const width = canvas.width, height = canvas.height, bottom = height - 20;
+            ctx.clearRect(0, 0, width, height);
+            const max = Math.max(1, ...values);
+            const barWidth = width / Math.max(1, values.length);
+            ctx.fillStyle = '#4a90d9';
+            values.forEach((value, i) => {
+                const barHeight = (bottom - 10) * value / max;
+                ctx.fillRect(i * barWidth + 1, bottom - barHeight, Math.max(1, barWidth - 2), barHeight);
+            });
+            ctx.fillStyle = '#333';
+            ctx.font = '11px Arial';
+            ctx.fillText(`最大值 ${max}`, 4, 12);
+            if (labels.length) {
+                ctx.fillText(labels[0], 4, height - 4);
+                const last = labels[labels.length - 1];
+                ctx.fillText(last, width - ctx.measureText(last).width - 4, height - 4);
+            }
+        }
+
+        async function loadAnalytics() {
+            const granularity = document.getElementById('analytics-granularity').value;
+            const days = granularity === 'hour' ? 7 : 30;
+            const className = document.getElementById('analytics-class').value;
+            let url = `${API_BASE}/admin/analytics/submissions?granularity=${granularity}&days=${days}`;
+            if (className) {
+                url += `&class_name=${encodeURIComponent(className)}`;
+            }
+            const response = await fetchWithAuth(url);
+            const data = await response.json();
+            if (data.success) {
+                // 不同班级的同一时间段合并显示
+                const totals = {};
+                data.series.forEach(point => {
+                    totals[point.bucket] = (totals[point.bucket] || 0) + point.count;
+                });
+                const labels = Object.keys(totals).sort();
+                drawBarChart(document.getElementById('submissions-chart'), labels, labels.map(l => totals[l]));
+            }
+
+            const activeResponse = await fetchWithAuth(`${API_BASE}/admin/analytics/active-users?days=${days}`);
+            const active = await activeResponse.json();
+            if (active.success) {
+                document.getElementById('active-users').innerHTML = `
+                    <p>每日活跃用户：${active.series.map(d => `${d.day.slice(5)}: ${d.active_users}`).join('，') || '暂无数据'}</p>
+                `;
+            }
+
+            const topResponse = await fetchWithAuth(`${API_BASE}/admin/analytics/top-projects?days=${days}`);
+            const top = await topResponse.json();
+            if (top.success) {
+                document.getElementById('top-projects').innerHTML = `
+                    <table>
+                        <tr><th>项目</th><th>用户</th><th>提交次数</th><th>变更字节</th></tr>
+                        ${top.projects.map(p => `
+                            <tr>
+                                <td>${escapeHtml(p.project_name)}</td>
+                                <td>${escapeHtml(p.username)}</td>
+                                <td>${p.submissions}</td>
+                                <td>${p.bytes_changed}</td>
+                            </tr>
+                        `).join('')}
+                    </table>
+                `;
+            }
+        }
+
+        let currentAssignmentId = null;
+
+        async function loadAssignments() {
+            const response = await fetchWithAuth(`${API_BASE}/admin/assignments`);
+            const data = await response.json();
+
+            if (data.success) {
+                const assignmentsHtml = `
+                    <table>
+                        <tr>
+                            <th>ID</th>
+                            <th>作业</th>
+                            <th>文件</th>
+                            <th>用例数</th>
+                            <th>评分进度</th>
+                            <th>操作</th>
+                        </tr>
+                        ${data.assignments.map(a => `
+                            <tr>
+                                <td>${a.id}</td>
+                                <td>${escapeHtml(a.name)}</td>
+                                <td>${escapeHtml(a.project_name)}/${escapeHtml(a.filename)}</td>
+                                <td>${a.tests.length}</td>
+                                <td>${a.job ? `${a.job.status} ${a.job.done}/${a.job.total}（缓存 ${a.job.cached}）` : '未评分'}</td>
+                                <td>
+                                    <button class="btn" onclick="gradeAssignment(${a.id})">评分</button>
+                                    <button class="btn" onclick="loadGradeResults(${a.id})">查看结果</button>
+                                    <button class="btn btn-danger" onclick="deleteAssignment(${a.id})">删除</button>
+                                </td>
+                            </tr>
+                        `).join('')}
+                    </table>
+                `;
+                document.getElementById('assignments-list').innerHTML = assignmentsHtml;
+            }
+        }
+
+        async function createAssignment() {
+            let tests;
+            try {
+                tests = JSON.parse(document.getElementById('assignment-tests').value);
+            } catch (e) {
+                alert('测试用例不是有效的JSON');
+                return;
+            }
+            const response = await fetchWithAuth(`${API_BASE}/admin/assignments`, {
+                method: 'POST',
+                body: JSON.stringify({
+                    name: document.getElementById('assignment-name').value,
+                    project_name: document.getElementById('assignment-project').value,
+                    filename: document.getElementById('assignment-file').value,
+                    timeout: parseFloat(document.getElementById('assignment-timeout').value),
+                    tests: tests
+                })
+            });
+            const data = await response.json();
+            alert(data.message);
+            if (data.success) {
+                loadAssignments();
+            }
+        }
+
+        async function gradeAssignment(assignmentId) {
+            const response = await fetchWithAuth(`${API_BASE}/admin/assignment/${assignmentId}/grade`, {
+                method: 'POST'
+            });
+            const data = await response.json();
+            if (!data.success) {
+                alert(data.message);
+            }
+            currentAssignmentId = assignmentId;
+            loadAssignments();
+        }
+
+        async function deleteAssignment(assignmentId) {
+            if (confirm('确定要删除这个作业及其评分结果吗？')) {
+                const response = await fetchWithAuth(`${API_BASE}/admin/assignment/${assignmentId}`, {
+                    method: 'DELETE'
+                });
+                const data = await response.json();
+                alert(data.message);
+                if (data.success) {
+                    if (currentAssignmentId === assignmentId) {
+                        currentAssignmentId = null;
+                        document.getElementById('grade-results').innerHTML = '';
+                    }
+                    loadAssignments();
+                }
+            }
+        }
+
+        async function loadGradeResults(assignmentId) {
+            currentAssignmentId = assignmentId;
+            const response = await fetchWithAuth(`${API_BASE}/admin/assignment/${assignmentId}/results`);
+            const data = await response.json();
+
+            if (data.success) {
+                const resultsHtml = `
+                    <h3>${escapeHtml(data.assignment.name)} 评分结果</h3>
+                    <table>
+                        <tr>
+                            <th>学生</th>
+                            <th>得分</th>
+                            <th>通过用例</th>
+                            <th>用时(秒)</th>
+                            <th>评分时间</th>
+                        </tr>
+                        ${data.results.map(r => `
+                            <tr>
+                                <td>${escapeHtml(r.username)}</td>
+                                <td>${r.score}</td>
+                                <td>${r.passed}/${r.total}</td>
+                                <td>${r.duration}</td>
+                                <td>${new Date(r.graded_at).toLocaleString()}</td>
+                            </tr>
+                        `).join('')}
+                    </table>
+                `;
+                document.getElementById('grade-results').innerHTML = resultsHtml;
+            }
+        }
+
+        function onGradeFinished(event) {
+            const data = JSON.parse(event.data);
+            loadAssignments();
+            if (data.assignment_id === currentAssignmentId) {
+                loadGradeResults(currentAssignmentId);
+            }
+        }
+
+        // 订阅服务器事件，数据变化时自动刷新
+        let refreshTimer = null;
+        function scheduleRefresh() {
+            clearTimeout(refreshTimer);
+            refreshTimer = setTimeout(() => {
+                loadUsers();
+                loadFiles();
+            }, 300);
+        }
+
+        // 登录token不放在URL中（会进入访问日志），每次连接前换取短期的事件流票据
+        // 票据过期后浏览器自动重连会被拒绝，这时重新换取票据，并带上最后收到的事件ID补发漏掉的事件
+        let lastEventId = null;
+        async function connectEvents() {
+            let ticket = null;
+            try {
+                const response = await fetchWithAuth(`${API_BASE}/events/ticket`, { method: 'POST' });
+                ticket = (await response.json()).ticket;
+            } catch (error) {
+                setTimeout(connectEvents, 5000);
+                return;
+            }
+            if (!ticket) {
+                return;
+            }
+            let url = `${API_BASE}/events?ticket=${encodeURIComponent(ticket)}`;
+            if (lastEventId) {
+                url += `&last_event_id=${encodeURIComponent(lastEventId)}`;
+            }
+            const events = new EventSource(url);
+            const track = handler => event => {
+                if (event.lastEventId) {
+                    lastEventId = event.lastEventId;
+                }
+                handler(event);
+            };
+            ['user.created', 'user.deleted', 'user.restored', 'user.purged', 'file.submitted', 'file.deleted', 'reset'].forEach(type => {
+                events.addEventListener(type, track(scheduleRefresh));
+            });
+            events.addEventListener('grade.finished', track(onGradeFinished));
+            events.onerror = () => {
+                if (events.readyState === EventSource.CLOSED) {
+                    setTimeout(connectEvents, 1000);
+                }
+            };
+        }
+        connectEvents();
+
         // 初始化加载数据
         loadUsers();
         loadFiles();
+        loadAnalytics();
+        loadAssignments();
     </script>
 </body>
 </html>''')
@@ -540,9 +1970,94 @@ with open('templates/index.html', 'w', encoding='utf-8') as f:
 </body>
 </html>''')
 
+
+def migrate_to_shards():
+    """把主库中的项目、文件和存储用量复制到各分片（启用分片前运行）
+    - 分片中的记录沿用主库的ID，已复制过的按主键合并，中途失败后可以重新运行
+    - 全局文件ID变为 主库ID * 分片数 + 分片号：相似度索引重建，评分结果中的文件ID一并换算
+    - 客户端缓存和收藏的文件地址使用旧ID，迁移后需要重新获取文件列表
+    - 只能从不分片迁移一次；已分片的数据改变分片数需要导出后重新导入"""
+    if not shards.enabled:
+        print("未启用分片，请先设置环境变量 EC_SHARD_COUNT")
+        return
+
+    with app.app_context():
+        recorded = recorded_shard_count()
+        if recorded != 1:
+            print(f"✗ 数据已按 {recorded} 个分片存放，不能再次迁移")
+            return
+
+        count = 0
+        for project in Project.query.order_by(Project.id):
+            session = shards.session_for_user(project.user_id)
+            session.merge(Project(id=project.id, name=project.name, user_id=project.user_id,
+                                  created_at=project.created_at))
+            count += 1
+
+        for code_file in CodeFile.query.order_by(CodeFile.id):
+            session = shards.session_for_user(code_file.user_id)
+            session.merge(CodeFile(
+                id=code_file.id,
+                filename=code_file.filename,
+                content=code_file.content,
+                project_id=code_file.project_id,
+                user_id=code_file.user_id,
+                created_at=code_file.created_at,
+                updated_at=code_file.updated_at,
+                revision=code_file.revision
+            ))
+
+        for usage in StorageUsage.query:
+            session = shards.session_for_user(usage.user_id)
+            session.merge(StorageUsage(user_id=usage.user_id, bytes_used=usage.bytes_used))
+
+        for shard, session in shards.all_shards():
+            session.commit()
+
+        build_similarity_index()
+
+        # 评分结果的换算和分片数的记录在同一个事务中提交，失败后重新运行不会重复换算
+        for grade in GradeResult.query:
+            grade.file_id = shards.to_global_id(shards.shard_for_key(grade.user_id), grade.file_id)
+        AppSetting.query.get('shard_count').value = str(shards.shard_count)
+        db.session.commit()
+        print(f"✓ 已迁移 {count} 个项目到 {shards.shard_count} 个分片，文件ID已改变")
+
+
+def build_similarity_index():
+    """为已有的所有文件重建相似度索引"""
+    with app.app_context():
+        SimilarityBand.query.delete()
+        SimilaritySignature.query.delete()
+        db.session.commit()
+        count = 0
+        for shard, session in shards.all_shards():
+            files = session.query(CodeFile.id, CodeFile.user_id, CodeFile.filename, CodeFile.content,
+                                  Project.name.label('project_name')) \
+                .join(Project, Project.id == CodeFile.project_id)
+            for file in files:
+                index_similarity(shards.to_global_id(shard, file.id), file.user_id, file.project_name,
+                                 file.filename, file.content)
+                count += 1
+        db.session.commit()
+        print(f"✓ 已为 {count} 个文件建立相似度索引")
+
+
 if __name__ == '__main__':
+    if '--migrate-shards' in sys.argv:
+        migrate_to_shards()
+        sys.exit(0)
+    if '--build-similarity-index' in sys.argv:
+        build_similarity_index()
+        sys.exit(0)
+
     # 确保上传目录存在
     if not os.path.exists(app.config['UPLOAD_FOLDER']):
         os.makedirs(app.config['UPLOAD_FOLDER'])
 
+    # 提前启动沙箱进程，第一次远程运行也不需要等待解释器启动
+    # debug模式下的重载器父进程只负责重启子进程，不处理请求，不需要沙箱进程
+    if sandbox_pool and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        sandbox_pool.start()
+
     app.run(host='0.0.0.0', port=8081, debug=True)
\ No newline at end of file
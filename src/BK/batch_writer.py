@@ -0,0 +1,56 @@
+"""
+后台批量写入
+- 请求线程只把写操作放入队列，不等待数据库，也不与其他请求争用主库的写锁
+- 后台线程一次取出队列中已有的全部操作，在同一个事务中执行并提交
+- 操作按放入的顺序执行；队列满时放入会阻塞，写入跟不上时请求自然减速
+- 进程退出前写完队列中剩余的操作
+"""
+
+import atexit
+import queue
+import threading
+
+MAX_PENDING = 10000  # 队列中最多等待的操作数
+MAX_BATCH = 500  # 每个事务最多执行的操作数
+
+
+class BatchWriter:
+    def __init__(self, apply_batch, max_pending=MAX_PENDING, max_batch=MAX_BATCH):
+        # apply_batch(operations) 按顺序执行一批操作并提交，每个操作是 (函数, 参数)
+        self.apply_batch = apply_batch
+        self.max_batch = max_batch
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.loop, daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+
+    def submit(self, func, *args):
+        self.start()
+        self.pending.put((func, args))
+
+    def flush(self):
+        """等待此前放入的操作全部写完"""
+        if self.thread is not None and self.thread.is_alive():
+            self.pending.join()
+
+    def loop(self):
+        while True:
+            batch = [self.pending.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.apply_batch(batch)
+            except Exception as e:
+                print(f"批量写入失败，丢弃 {len(batch)} 个操作: {e}")
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
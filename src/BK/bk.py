@@ -7,6 +7,7 @@ import subprocess
 import sys
 import threading
 import queue
+from urllib.parse import urlparse
 from pathlib import Path
 
 
@@ -28,6 +29,12 @@ class PythonIDEClient:
         # 控制台相关
         self.console_process = None
         self.console_queue = queue.Queue()
+        self.console_env = None  # 控制台命令的环境变量，None表示继承当前环境
+
+        # 服务器事件推送（SSE）
+        self.event_stop = None
+        self.event_refresh_job = None
+        self.pending_refresh = set()
 
         # 创建界面
         self.create_widgets()
@@ -35,6 +42,9 @@ class PythonIDEClient:
         # 启动控制台输出监控
         self.start_console_monitor()
 
+        # 服务器提供本地包索引时，pip从服务器安装
+        self.configure_package_index()
+
     def create_widgets(self):
         # 创建主框架
         main_frame = ttk.Frame(self.root)
@@ -213,6 +223,80 @@ class PythonIDEClient:
         # 系统设置标签页
         self.create_settings_tab()
 
+        # 订阅服务器事件，列表自动刷新
+        self.start_event_listener()
+
+    def start_event_listener(self):
+        """在后台线程订阅服务器事件（SSE），断线后带Last-Event-ID重连"""
+        self.stop_event_listener()
+        stop = threading.Event()
+        self.event_stop = stop
+        token = self.admin_token
+
+        def listen():
+            last_event_id = None
+            while not stop.is_set():
+                try:
+                    headers = {"Authorization": f"Bearer {token}"}
+                    if last_event_id:
+                        headers["Last-Event-ID"] = last_event_id
+                    with requests.get(f"{self.server_url}/events", headers=headers,
+                                      stream=True, timeout=(5, 60)) as response:
+                        if response.status_code == 401:
+                            return
+                        response.encoding = 'utf-8'
+                        event_type = None
+                        for line in response.iter_lines(decode_unicode=True):
+                            if stop.is_set():
+                                return
+                            if line.startswith("id:"):
+                                last_event_id = line[3:].strip()
+                            elif line.startswith("event:"):
+                                event_type = line[6:].strip()
+                            elif line == "" and event_type:
+                                self.root.after(0, self.on_server_event, event_type)
+                                event_type = None
+                except requests.RequestException:
+                    pass
+                stop.wait(3)
+
+        threading.Thread(target=listen, daemon=True).start()
+
+    def stop_event_listener(self):
+        """停止事件订阅"""
+        if self.event_stop:
+            self.event_stop.set()
+            self.event_stop = None
+
+    def on_server_event(self, event_type):
+        """收到服务器事件，合并300ms内的事件后刷新对应列表"""
+        if not hasattr(self, 'admin_notebook'):
+            return
+
+        if event_type.startswith("user."):
+            self.pending_refresh.update(["users", "system"])
+        elif event_type.startswith("project."):
+            self.pending_refresh.update(["projects", "system"])
+        elif event_type == "reset":
+            self.pending_refresh.update(["users", "projects", "system"])
+
+        if self.event_refresh_job:
+            self.root.after_cancel(self.event_refresh_job)
+        self.event_refresh_job = self.root.after(300, self.apply_pending_refresh)
+
+    def apply_pending_refresh(self):
+        """执行合并后的刷新"""
+        self.event_refresh_job = None
+        pending, self.pending_refresh = self.pending_refresh, set()
+        if not hasattr(self, 'admin_notebook'):
+            return
+        if "users" in pending:
+            self.refresh_users_list()
+        if "projects" in pending:
+            self.refresh_projects_list()
+        if "system" in pending:
+            self.refresh_system_info()
+
     def create_users_tab(self):
         """创建用户管理标签页"""
         users_frame = ttk.Frame(self.admin_notebook)
@@ -224,6 +308,7 @@ class PythonIDEClient:
 
         ttk.Button(users_toolbar, text="刷新列表", command=self.refresh_users_list).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(users_toolbar, text="创建用户", command=self.show_create_user_dialog).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(users_toolbar, text="批量导入", command=self.import_users).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(users_toolbar, text="编辑用户", command=self.edit_selected_user).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(users_toolbar, text="删除用户", command=self.delete_selected_user).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(users_toolbar, text="设为管理员", command=self.make_user_admin).pack(side=tk.LEFT, padx=(0, 5))
@@ -372,6 +457,84 @@ class PythonIDEClient:
 
         username_entry.focus()
 
+    def import_users(self):
+        """从CSV/JSON文件批量导入用户，服务器后台处理，轮询显示进度"""
+        file_path = filedialog.askopenfilename(
+            title="选择导入文件",
+            filetypes=[("CSV文件", "*.csv"), ("JSON文件", "*.json"), ("所有文件", "*.*")]
+        )
+        if not file_path:
+            return
+
+        try:
+            headers = {"Authorization": f"Bearer {self.admin_token}"}
+            with open(file_path, 'rb') as f:
+                response = requests.post(f"{self.server_url}/admin/users/import",
+                                         files={"file": (os.path.basename(file_path), f)},
+                                         headers=headers)
+            data = response.json()
+        except Exception as e:
+            messagebox.showerror("错误", f"连接服务器失败: {str(e)}")
+            return
+
+        if not data.get("success"):
+            messagebox.showerror("错误", data.get("message", "导入失败"))
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("批量导入用户")
+        dialog.geometry("500x400")
+        dialog.transient(self.root)
+
+        status_label = ttk.Label(dialog, text="正在导入...")
+        status_label.pack(pady=10)
+        progress = ttk.Progressbar(dialog, maximum=data["total"], length=400)
+        progress.pack(pady=5)
+        errors_text = scrolledtext.ScrolledText(dialog, height=15)
+        errors_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        ttk.Button(dialog, text="关闭", command=dialog.destroy).pack(pady=(0, 10))
+
+        job_id = data["job_id"]
+        results = queue.Queue()
+
+        def fetch():
+            try:
+                response = requests.get(f"{self.server_url}/admin/users/import/{job_id}", headers=headers)
+                results.put(response.json())
+            except Exception as e:
+                results.put({"success": False, "message": f"连接服务器失败: {str(e)}"})
+
+        def poll():
+            if not dialog.winfo_exists():
+                return
+            try:
+                result = results.get_nowait()
+            except queue.Empty:
+                dialog.after(200, poll)
+                return
+
+            if not result.get("success"):
+                status_label.config(text=result.get("message", "获取导入进度失败"))
+                return
+
+            job = result["job"]
+            progress["value"] = job["processed"]
+            status_label.config(
+                text=f"已处理 {job['processed']}/{job['total']}，成功 {job['created']}，失败 {len(job['errors'])}")
+            if job["status"] == "running":
+                dialog.after(500, lambda: threading.Thread(target=fetch, daemon=True).start())
+                dialog.after(700, poll)
+                return
+
+            for error in job["errors"]:
+                errors_text.insert(tk.END, f"第{error['row']}行 {error.get('username', '')}：{error['message']}\n")
+            if job["status"] == "failed":
+                status_label.config(text=f"导入失败: {job.get('message', '')}")
+            self.refresh_users_list()
+
+        threading.Thread(target=fetch, daemon=True).start()
+        dialog.after(200, poll)
+
     def edit_selected_user(self):
         """编辑选中的用户"""
         selected = self.users_tree.selection()
@@ -555,6 +718,8 @@ class PythonIDEClient:
                                                                                                padx=(0, 5))
         ttk.Button(projects_toolbar, text="删除项目", command=self.delete_selected_project).pack(side=tk.LEFT,
                                                                                                  padx=(0, 5))
+        ttk.Button(projects_toolbar, text="撤销删除", command=self.show_deleted_projects_dialog).pack(side=tk.LEFT,
+                                                                                                    padx=(0, 5))
 
         # 搜索框
         search_frame = ttk.Frame(projects_frame)
@@ -639,7 +804,7 @@ class PythonIDEClient:
         project_id = self.projects_tree.item(selected[0], "values")[0]
         project_name = self.projects_tree.item(selected[0], "values")[1]
 
-        if messagebox.askyesno("确认删除", f"确定要删除项目 {project_name} 吗？此操作不可恢复！"):
+        if messagebox.askyesno("确认删除", f"确定要删除项目 {project_name} 吗？宽限期内可以撤销。"):
             try:
                 headers = {"Authorization": f"Bearer {self.admin_token}"}
                 response = requests.delete(
@@ -649,13 +814,69 @@ class PythonIDEClient:
                 data = response.json()
 
                 if data.get("success"):
-                    messagebox.showinfo("成功", "项目已删除")
+                    messagebox.showinfo("成功", data.get("message", "项目已删除"))
                     self.refresh_projects_list()
                 else:
                     messagebox.showerror("错误", data.get("message", "删除项目失败"))
             except Exception as e:
                 messagebox.showerror("错误", f"连接服务器失败: {str(e)}")
 
+    def show_deleted_projects_dialog(self):
+        """列出已删除、尚未清理的项目，宽限期内可以恢复"""
+        headers = {"Authorization": f"Bearer {self.admin_token}"}
+        try:
+            response = requests.get(f"{self.server_url}/admin/projects/deleted", headers=headers)
+            data = response.json()
+        except Exception as e:
+            messagebox.showerror("错误", f"连接服务器失败: {str(e)}")
+            return
+
+        if not data.get("success"):
+            messagebox.showerror("错误", data.get("message", "获取已删除项目失败"))
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("撤销删除")
+        dialog.geometry("700x350")
+        dialog.transient(self.root)
+
+        columns = ("ID", "项目名", "所有者", "删除时间", "撤销期限")
+        tree = ttk.Treeview(dialog, columns=columns, show="headings")
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=50 if col == "ID" else 150)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        for project in data["projects"]:
+            if project["restorable"]:
+                tree.insert("", tk.END, values=(project["id"], project["name"], project["owner"],
+                                                project["deleted_at"], project["restore_until"]))
+
+        def restore():
+            selected = tree.selection()
+            if not selected:
+                messagebox.showwarning("警告", "请先选择一个项目", parent=dialog)
+                return
+            project_id = tree.item(selected[0], "values")[0]
+            try:
+                response = requests.post(f"{self.server_url}/admin/projects/{project_id}/restore",
+                                         headers=headers)
+                result = response.json()
+            except Exception as e:
+                messagebox.showerror("错误", f"连接服务器失败: {str(e)}", parent=dialog)
+                return
+
+            if result.get("success"):
+                tree.delete(selected[0])
+                self.refresh_projects_list()
+            else:
+                messagebox.showerror("错误", result.get("message", "恢复项目失败"), parent=dialog)
+
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=(0, 10))
+        ttk.Button(button_frame, text="恢复", command=restore).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="关闭", command=dialog.destroy).pack(side=tk.LEFT)
+
     def create_settings_tab(self):
         """创建系统设置标签页"""
         settings_frame = ttk.Frame(self.admin_notebook)
@@ -834,6 +1055,7 @@ class PythonIDEClient:
 
     def admin_logout(self):
         """管理员退出登录"""
+        self.stop_event_listener()
         if hasattr(self, 'admin_notebook'):
             self.admin_notebook.destroy()
             del self.admin_notebook
@@ -1041,6 +1263,26 @@ class PythonIDEClient:
         self.console_text.insert(tk.END, output)
         self.console_text.see(tk.END)
 
+    def configure_package_index(self):
+        """在后台检测服务器的本地包索引（/simple/），可用时控制台中的pip命令都从它安装"""
+        index_url = os.environ.get("EC_PACKAGE_INDEX_URL") or self.server_url.rsplit("/api", 1)[0] + "/simple/"
+
+        def probe():
+            try:
+                response = requests.get(index_url, timeout=3)
+            except requests.RequestException:
+                return
+            if response.status_code != 200:
+                return
+            env = os.environ.copy()
+            env["PIP_INDEX_URL"] = index_url
+            # 局域网内的索引一般没有HTTPS证书
+            env["PIP_TRUSTED_HOST"] = urlparse(index_url).hostname or ""
+            self.console_env = env
+            self.console_queue.put(f"pip 将从服务器的包索引安装: {index_url}\n")
+
+        threading.Thread(target=probe, daemon=True).start()
+
     def execute_console_command(self, event):
         """执行控制台命令"""
         command = self.console_input.get().strip()
@@ -1062,7 +1304,7 @@ class PythonIDEClient:
                 # 执行命令
                 result = subprocess.run(
                     command, shell=True, capture_output=True, text=True,
-                    cwd=cwd, timeout=30
+                    cwd=cwd, timeout=30, env=self.console_env
                 )
 
                 # 输出结果
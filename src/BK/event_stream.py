@@ -0,0 +1,107 @@
+"""
+服务器推送事件（SSE）
+- 进程内发布/订阅：写操作调用 broker.publish()，所有订阅的连接实时收到
+- 保留最近的事件，断线重连时根据Last-Event-ID补发
+- 定时发送心跳，及时发现已断开的连接
+"""
+
+import collections
+import json
+import queue
+import threading
+import time
+
+HEARTBEAT_INTERVAL = 15  # 秒
+HISTORY_SIZE = 1000  # 保留的历史事件数量
+SUBSCRIBER_QUEUE_SIZE = 500  # 单个连接积压上限，超过后断开让客户端重连补发
+
+
+class Event:
+    def __init__(self, event_id, event_type, data, user_id):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+        self.user_id = user_id  # 事件所属用户，None表示只推送给管理员
+
+    def visible_to(self, user_id, is_admin):
+        return is_admin or (self.user_id is not None and self.user_id == user_id)
+
+    def encode(self):
+        payload = json.dumps(self.data, ensure_ascii=False)
+        return f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+class EventBroker:
+    def __init__(self, history_size=HISTORY_SIZE):
+        self.lock = threading.Lock()
+        # 以毫秒时间戳为起点，服务重启后事件ID仍然递增
+        self.next_id = int(time.time() * 1000)
+        self.history = collections.deque(maxlen=history_size)
+        self.subscribers = set()
+
+    def publish(self, event_type, data, user_id=None):
+        """发布事件"""
+        with self.lock:
+            event = Event(self.next_id, event_type, data, user_id)
+            self.next_id += 1
+            self.history.append(event)
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # 消费太慢，标记后由该连接自行关闭，客户端重连时补发
+                subscriber.lagging = True
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """订阅事件，返回(队列, 需要补发的历史事件, 无法完整补发时的reset事件ID，否则为None)"""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        subscriber.lagging = False
+        with self.lock:
+            self.subscribers.add(subscriber)
+            backlog = []
+            reset_id = None
+            if last_event_id is not None:
+                backlog = [event for event in self.history if event.id > last_event_id]
+                oldest = self.history[0].id if self.history else self.next_id
+                if last_event_id < oldest - 1:
+                    # 与事件ID在同一把锁内读取，不会和并发发布的事件重号
+                    reset_id = self.next_id - 1
+        return subscriber, backlog, reset_id
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def stream(self, user_id, is_admin, last_event_id=None):
+        """生成SSE数据流"""
+        subscriber, backlog, reset_id = self.subscribe(last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            if reset_id is not None:
+                # 断线太久，历史已被覆盖，通知客户端全量刷新
+                yield f"id: {reset_id}\nevent: reset\ndata: {{}}\n\n"
+            for event in backlog:
+                if event.visible_to(user_id, is_admin):
+                    yield event.encode()
+
+            while not subscriber.lagging:
+                try:
+                    event = subscriber.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event.visible_to(user_id, is_admin):
+                    yield event.encode()
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def parse_last_event_id(value):
+    """解析Last-Event-ID请求头"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
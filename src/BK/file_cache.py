@@ -0,0 +1,112 @@
+"""
+文件内容缓存
+- 按字节数（而不是条目数）限制大小的LRU缓存，缓存序列化后的文件响应
+- 键为(文件ID, 更新时间)：读取时先按主键查出当前的更新时间再查缓存，其他进程修改过的文件也不会返回旧内容
+- 提交和删除时主动清除；读取数据库期间文件被清除过时，读到的旧内容不再放入缓存
+- 每个文件只保留最新版本，并记录所属用户
+"""
+
+import collections
+import threading
+
+MAX_INVALIDATIONS = 10000  # 记录最近被清除的文件数，超过后清空记录，之前开始的读取都不再放入缓存
+
+
+class CachedFile:
+    def __init__(self, file_id, updated_at, user_id, body):
+        self.file_id = file_id
+        self.updated_at = updated_at
+        self.user_id = user_id
+        self.body = body  # 序列化后的JSON（bytes）
+
+    @property
+    def key(self):
+        return self.file_id, self.updated_at
+
+
+class FileCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # (文件ID, 更新时间) -> CachedFile
+        self.latest = {}  # 文件ID -> 当前缓存的键
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # 清除计数：文件ID -> 最后一次被清除时的计数，早于floor的读取一律不放入缓存
+        self.clock = 0
+        self.invalidated = {}
+        self.floor = 0
+
+    def get(self, file_id, updated_at):
+        """返回文件指定版本的缓存项，未缓存或缓存的是其他版本时返回None"""
+        with self.lock:
+            key = self.latest.get(file_id)
+            if key != (file_id, updated_at):
+                if key is not None:
+                    self._remove(file_id)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+    def read_token(self):
+        """从数据库读取文件之前取得，put时用来判断读取期间文件是否被清除过"""
+        with self.lock:
+            return self.clock
+
+    def put(self, file_id, updated_at, user_id, body, token):
+        """缓存文件响应，超过容量时淘汰最久未使用的文件"""
+        if len(body) > self.max_bytes:
+            return
+        entry = CachedFile(file_id, updated_at, user_id, body)
+        with self.lock:
+            if token < self.floor or self.invalidated.get(file_id, 0) > token:
+                return  # 读取期间文件被修改或删除，读到的可能是旧内容
+            self._remove(file_id)
+            self.entries[entry.key] = entry
+            self.latest[file_id] = entry.key
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                del self.latest[evicted.file_id]
+                self.size -= len(evicted.body)
+                self.evictions += 1
+
+    def invalidate(self, file_id):
+        with self.lock:
+            self._remove(file_id)
+            self.clock += 1
+            self.invalidated[file_id] = self.clock
+            if len(self.invalidated) > MAX_INVALIDATIONS:
+                self.invalidated.clear()
+                self.floor = self.clock
+
+    def invalidate_user(self, user_id):
+        """清除某个用户的所有缓存文件；正在进行的读取不知道属于哪个用户，全部不再放入缓存"""
+        with self.lock:
+            for entry in [e for e in self.entries.values() if e.user_id == user_id]:
+                self._remove(entry.file_id)
+            self.clock += 1
+            self.invalidated.clear()
+            self.floor = self.clock
+
+    def _remove(self, file_id):
+        key = self.latest.pop(file_id, None)
+        if key is not None:
+            self.size -= len(self.entries.pop(key).body)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes_used': self.size,
+                'bytes_limit': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
@@ -0,0 +1,106 @@
+"""
+响应压缩工具
+- JSON等文本响应按Accept-Encoding协商gzip/brotli压缩
+- 静态文件优先直接返回构建时生成的.br/.gz预压缩文件
+- project/http_compression.py 是同一份代码的副本，修改时两份同步
+"""
+
+import gzip
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，没有安装时只使用gzip
+    brotli = None
+
+# 小于该大小的响应不压缩（压缩收益不抵CPU开销）
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+}
+
+# 预压缩文件的扩展名，按优先级排列
+PRECOMPRESSED = [('br', '.br'), ('gzip', '.gz')]
+
+
+def choose_encoding(available=('br', 'gzip')):
+    """根据Accept-Encoding选出客户端支持的最佳编码"""
+    for encoding in available:
+        if encoding == 'br' and brotli is None:
+            continue
+        if request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def etag_variants(etag):
+    """同一ETag在不同压缩编码下的所有形式"""
+    return [etag] + [f'{etag}-{encoding}' for encoding, _ in PRECOMPRESSED]
+
+
+def compress_response(response, min_size=MIN_COMPRESS_SIZE):
+    """after_request钩子：压缩较大的文本响应（支持Range的下载响应保持原始字节）"""
+    if (response.status_code < 200 or response.status_code >= 300
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or 'Accept-Ranges' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+    if not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    if encoding == 'br':
+        data = brotli.compress(data, quality=5)
+    else:
+        data = gzip.compress(data, compresslevel=6)
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    # 压缩后内容不同，强ETag需要区分编码
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
+
+def precompressed_is_fresh(directory, filename, suffix):
+    """预压缩文件存在且不比原文件旧；原文件在构建后被修改过时不能再使用"""
+    try:
+        compressed = os.stat(os.path.join(directory, filename + suffix))
+    except OSError:
+        return False
+    try:
+        source = os.stat(os.path.join(directory, filename))
+    except OSError:
+        return True  # 只部署了压缩文件
+    return compressed.st_mtime >= source.st_mtime
+
+
+def send_precompressed(directory, filename, max_age=None):
+    """发送静态文件，存在对应的.br/.gz预压缩文件且没有过期时直接返回压缩文件"""
+    for encoding, suffix in PRECOMPRESSED:
+        if request.accept_encodings[encoding] > 0 and precompressed_is_fresh(directory, filename, suffix):
+            response = send_from_directory(directory, filename + suffix, max_age=max_age)
+            # 按原文件类型返回，由浏览器解压
+            response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, max_age=max_age)
+    response.vary.add('Accept-Encoding')
+    return response
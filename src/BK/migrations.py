@@ -0,0 +1,183 @@
+"""
+数据库结构迁移
+- 每个数据库文件用 PRAGMA user_version 记录已执行到的版本，启动时按顺序执行更高的版本
+- 每个迁移和版本号在同一个事务中提交，中途失败整体回滚，下次启动重试；多个进程同时启动时只有一个执行
+- 迁移要兼容 create_all 刚建好的新库：建索引用 IF NOT EXISTS，加列前先检查
+"""
+
+from collections import namedtuple
+
+Migration = namedtuple('Migration', ['version', 'description', 'apply'])
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def table_exists(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def add_column(conn, table, column, ddl):
+    """旧数据库缺少新增的列时补上"""
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+    if column not in columns:
+        conn.execute(f'ALTER TABLE "{table}" ADD COLUMN {ddl}')
+
+
+def sql(*statements):
+    """由SQL语句组成的迁移（不能用executescript，它会先提交当前事务）"""
+    def apply(conn):
+        for statement in statements:
+            conn.execute(statement)
+    return apply
+
+
+def migrate(conn, migrations):
+    """执行未执行过的迁移，返回本次执行的版本号列表"""
+    pending = [m for m in migrations if m.version > current_version(conn)]
+    if not pending:
+        return []
+
+    applied = []
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # 手动控制事务，DDL也包含在事务内
+    try:
+        for migration in sorted(pending, key=lambda m: m.version):
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # 拿到写锁后再检查一次，其他进程可能已经执行过
+                if migration.version <= current_version(conn):
+                    conn.execute('ROLLBACK')
+                    continue
+                migration.apply(conn)
+                conn.execute(f'PRAGMA user_version = {int(migration.version)}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            applied.append(migration.version)
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
+
+
+def migrate_engine(engine, migrations):
+    """对SQLAlchemy引擎对应的SQLite数据库执行迁移"""
+    raw = engine.raw_connection()
+    try:
+        return migrate(raw.driver_connection, migrations)
+    finally:
+        raw.close()
+
+
+# background.py 的项目和代码文件（主库和各分片都有这两张表）
+def merge_duplicate_projects(conn):
+    """同一用户的同名项目合并到ID最小的一个，同一项目中的同名文件只保留最后更新的一份"""
+    duplicates = conn.execute('''
+        SELECT user_id, name, MIN(id) FROM project GROUP BY user_id, name HAVING COUNT(*) > 1
+    ''').fetchall()
+    for user_id, name, keep_id in duplicates:
+        conn.execute('UPDATE code_file SET project_id = ? WHERE project_id IN '
+                     '(SELECT id FROM project WHERE user_id = ? AND name = ? AND id != ?)',
+                     (keep_id, user_id, name, keep_id))
+        conn.execute('DELETE FROM project WHERE user_id = ? AND name = ? AND id != ?', (user_id, name, keep_id))
+
+    # 被删除的重复文件ID -> 同一项目中保留的同名文件ID
+    replaced = conn.execute('''
+        SELECT id, keep_id FROM (
+            SELECT id, FIRST_VALUE(id) OVER (
+                PARTITION BY project_id, filename ORDER BY updated_at DESC, id DESC
+            ) AS keep_id FROM code_file
+        ) WHERE id != keep_id
+    ''').fetchall()
+    removed = conn.execute('''
+        DELETE FROM code_file WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY project_id, filename ORDER BY updated_at DESC, id DESC
+                ) AS rank FROM code_file
+            ) WHERE rank = 1
+        )
+    ''').rowcount
+
+    # 相似度索引和评分结果只在主库（分片上没有这些表），按文件ID引用被删除的文件
+    if replaced and table_exists(conn, 'similarity_signature'):
+        # 保留的文件有自己的索引，被删除文件的索引直接删掉
+        removed_ids = [(file_id,) for file_id, _ in replaced]
+        conn.executemany('DELETE FROM similarity_signature WHERE file_id = ?', removed_ids)
+        conn.executemany('DELETE FROM similarity_band WHERE file_id = ?', removed_ids)
+    if replaced and table_exists(conn, 'grade_result'):
+        # 评分结果指向保留的文件，content_hash不变，内容不同时下次评分会重新运行
+        conn.executemany('UPDATE grade_result SET file_id = ? WHERE file_id = ?',
+                         [(keep_id, file_id) for file_id, keep_id in replaced])
+    if removed and table_exists(conn, 'storage_usage'):
+        # 删除了重复文件，已用空间按实际内容重新计算
+        conn.execute('''
+            UPDATE storage_usage SET bytes_used = (
+                SELECT COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0)
+                FROM code_file WHERE code_file.user_id = storage_usage.user_id
+            )
+        ''')
+
+
+CODE_INDEXES = sql(
+    'CREATE UNIQUE INDEX IF NOT EXISTS uq_project_user_name ON project (user_id, name)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS uq_code_file_project_filename ON code_file (project_id, filename)',
+    'CREATE INDEX IF NOT EXISTS ix_code_file_user_id ON code_file (user_id)',
+)
+
+
+def add_file_revision(conn):
+    add_column(conn, 'code_file', 'revision', 'revision INTEGER NOT NULL DEFAULT 1')
+
+
+SHARD_MIGRATIONS = [
+    Migration(1, '合并重复的项目和文件', merge_duplicate_projects),
+    Migration(2, '项目(user_id, name)和文件(project_id, filename)唯一索引', CODE_INDEXES),
+    Migration(3, '文件版本号', add_file_revision),
+]
+
+
+def add_user_deleted_at(conn):
+    add_column(conn, 'user', 'deleted_at', 'deleted_at DATETIME')
+    conn.execute('CREATE INDEX IF NOT EXISTS ix_user_deleted_at ON "user" (deleted_at)')
+
+
+BK_MIGRATIONS = [
+    Migration(1, '用户班级', lambda conn: add_column(conn, 'user', 'class_name', 'class_name VARCHAR(50)')),
+    Migration(2, '用户删除标记', add_user_deleted_at),
+    Migration(3, '合并重复的项目和文件', merge_duplicate_projects),
+    Migration(4, '项目(user_id, name)和文件(project_id, filename)唯一索引', CODE_INDEXES),
+    Migration(5, '文件版本号', add_file_revision),
+]
+
+
+# server.py 的管理数据库
+SERVER_MIGRATIONS = [
+    Migration(1, '项目删除标记', lambda conn: add_column(conn, 'projects', 'deleted_at', 'deleted_at TIMESTAMP')),
+    Migration(2, '列表排序和级联删除使用的索引', sql(
+        'CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at)',
+        # 项目列表只显示未删除的项目并按创建时间排序，清理线程按删除时间查找
+        'CREATE INDEX IF NOT EXISTS idx_projects_deleted_created ON projects (deleted_at, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_projects_owner_id ON projects (owner_id)',
+        'CREATE INDEX IF NOT EXISTS idx_files_project_id ON files (project_id)',
+    )),
+    Migration(3, '本地包索引的文件', sql(
+        '''CREATE TABLE IF NOT EXISTS package_files
+           (filename TEXT PRIMARY KEY,
+            project TEXT NOT NULL,
+            version TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            requires_python TEXT,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        'CREATE INDEX IF NOT EXISTS idx_package_files_project ON package_files (project)',
+    )),
+    # 删除旧版本的统计触发器，init_db 按新定义重建（不计入已标记删除的项目）
+    Migration(4, '统计不计入已删除的项目', sql(*[
+        f'DROP TRIGGER IF EXISTS {name}' for name in (
+            'stats_project_insert', 'stats_project_delete', 'stats_file_insert', 'stats_file_update', 'stats_file_delete'
+        )
+    ])),
+]
@@ -0,0 +1,172 @@
+"""
+本地Python包索引（PEP 503 "simple" 格式）
+- 包文件按规范化的项目名存放：<目录>/<项目名>/<文件名>，由管理员上传或用 pip download 同步
+- 客户端 pip 使用 --index-url http://服务器/simple/，实验室里同一个版本只从外网下载一次
+- 本地没有的项目可以转发到上游索引，保证依赖仍能解析；本地只有部分文件时，项目页合并上游的其他文件链接
+"""
+
+import hashlib
+import html
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import zipfile
+from html.parser import HTMLParser
+from urllib.error import HTTPError
+from urllib.parse import urljoin
+
+DIST_EXTENSIONS = ('.whl', '.tar.gz', '.zip')
+_NORMALIZE = re.compile(r'[-_.]+')
+_SDIST = re.compile(r'^(?P<name>.+)-(?P<version>[^-]+)\.(tar\.gz|zip)$')
+
+UPSTREAM_TIMEOUT = 10  # 请求上游项目页的超时（秒）
+UPSTREAM_CACHE_SECONDS = 600  # 上游项目页的缓存时间
+_upstream_cache = {}  # URL -> (获取时间, 链接列表)
+_upstream_lock = threading.Lock()
+
+
+class InvalidPackageFile(ValueError):
+    pass
+
+
+def normalize_name(name):
+    """PEP 503 项目名规范化"""
+    return _NORMALIZE.sub('-', name).lower()
+
+
+def parse_filename(filename):
+    """从发行文件名解析(项目名, 版本)"""
+    if filename != os.path.basename(filename) or filename.startswith('.'):
+        raise InvalidPackageFile(f'文件名无效: {filename}')
+    if filename.endswith('.whl'):
+        # PEP 427: {name}-{version}(-{build})?-{python}-{abi}-{platform}.whl
+        parts = filename[:-4].split('-')
+        if len(parts) not in (5, 6):
+            raise InvalidPackageFile(f'wheel文件名无效: {filename}')
+        return parts[0], parts[1]
+    match = _SDIST.match(filename)
+    if not match:
+        raise InvalidPackageFile(f'不支持的文件类型: {filename}（只支持 {", ".join(DIST_EXTENSIONS)}）')
+    return match.group('name'), match.group('version')
+
+
+def read_requires_python(path):
+    """wheel元数据中的Requires-Python，没有时返回None"""
+    if not path.endswith('.whl'):
+        return None
+    try:
+        with zipfile.ZipFile(path) as wheel:
+            for name in wheel.namelist():
+                if name.count('/') == 1 and name.endswith('.dist-info/METADATA'):
+                    for line in wheel.read(name).decode('utf-8', 'replace').splitlines():
+                        if not line:
+                            break  # 元数据头部结束
+                        if line.lower().startswith('requires-python:'):
+                            return line.split(':', 1)[1].strip() or None
+    except zipfile.BadZipFile:
+        raise InvalidPackageFile(f'wheel文件已损坏: {os.path.basename(path)}')
+    return None
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_file(package_dir, source_path, filename):
+    """把发行文件移入索引目录，返回文件信息字典"""
+    name, version = parse_filename(filename)
+    project = normalize_name(name)
+    info = {
+        'project': project,
+        'name': name,
+        'version': version,
+        'filename': filename,
+        'size': os.path.getsize(source_path),
+        'sha256': file_sha256(source_path),
+        'requires_python': read_requires_python(source_path)
+    }
+    target_dir = os.path.join(package_dir, project)
+    os.makedirs(target_dir, exist_ok=True)
+    shutil.move(source_path, os.path.join(target_dir, filename))
+    return info
+
+
+def download(requirements, pip_args=(), index_url=None):
+    """用 pip download 下载包及其依赖到临时目录，返回目录（调用方负责删除）"""
+    dest = tempfile.mkdtemp(prefix='ec_packages_')
+    command = [sys.executable, '-m', 'pip', 'download', '--dest', dest, '--no-cache-dir']
+    if index_url:
+        command += ['--index-url', index_url]
+    subprocess.run(command + list(pip_args) + list(requirements), check=True)
+    return dest
+
+
+def render_page(title, links):
+    """links为[(链接, 文本, 其他属性字典)]"""
+    lines = ['<!DOCTYPE html>', '<html>', '<head>', f'<title>{html.escape(title)}</title>', '</head>', '<body>']
+    for href, text, attrs in links:
+        extra = ''.join(f' {key}="{html.escape(value)}"' for key, value in attrs.items() if value)
+        lines.append(f'<a href="{html.escape(href)}"{extra}>{html.escape(text)}</a><br>')
+    lines += ['</body>', '</html>', '']
+    return '\n'.join(lines)
+
+
+class _LinkParser(HTMLParser):
+    """解析simple页面中的链接，href转为绝对地址，只保留data-*属性"""
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+        self.links = []
+        self.current = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'a' and attrs.get('href'):
+            data = {key: value for key, value in attrs.items() if key.startswith('data-')}
+            if 'data-yanked' in data and not data['data-yanked']:
+                data['data-yanked'] = 'yanked'  # 没有写原因的撤回，render_page会省略空值
+            self.current = [urljoin(self.base_url, attrs['href']), '', data]
+
+    def handle_data(self, data):
+        if self.current is not None:
+            self.current[1] += data
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self.current is not None:
+            href, text, attrs = self.current
+            self.links.append((href, text.strip(), attrs))
+            self.current = None
+
+
+def fetch_links(url):
+    """读取上游的项目页，返回与render_page相同格式的链接列表（项目不存在时为空），结果缓存一段时间"""
+    with _upstream_lock:
+        cached = _upstream_cache.get(url)
+    if cached and time.monotonic() - cached[0] < UPSTREAM_CACHE_SECONDS:
+        return cached[1]
+
+    request = urllib.request.Request(url, headers={'Accept': 'text/html'})
+    try:
+        with urllib.request.urlopen(request, timeout=UPSTREAM_TIMEOUT) as response:
+            parser = _LinkParser(response.geturl())
+            parser.feed(response.read().decode('utf-8', 'replace'))
+            links = parser.links
+    except HTTPError as e:
+        if e.code != 404:
+            raise
+        links = []
+
+    with _upstream_lock:
+        _upstream_cache[url] = (time.monotonic(), links)
+    return links
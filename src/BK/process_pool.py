@@ -0,0 +1,28 @@
+"""
+按需创建的进程池
+- 第一次使用时才启动工作进程，导入模块和不使用的部署不占资源
+- 创建过程加锁，多个请求线程同时第一次使用时只创建一个进程池
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+class LazyProcessPool:
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self.executor
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,107 @@
+"""
+令牌桶限流
+- MemoryBucketStore: 进程内存储（默认）
+- RedisBucketStore: 使用本地Redis兼容服务（Redis/Valkey/KeyDB等），多个进程共享限流状态
+"""
+
+import collections
+import math
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # redis为可选依赖
+    redis = None
+
+
+def parse_rate(rate):
+    """解析'30/minute'形式的限流配置，返回(桶容量, 每秒补充令牌数)"""
+    count, _, period = rate.partition('/')
+    seconds = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}[period.strip()]
+    count = int(count)
+    return count, count / seconds
+
+
+class MemoryBucketStore:
+    MAX_BUCKETS = 10000  # 超过后按最近最少使用淘汰
+    PRUNE_INTERVAL = 60  # 定期清理已经补满的桶（秒）
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> [剩余令牌, 上次更新时间, 补满的时间]，按最近使用排序
+        self.buckets = collections.OrderedDict()
+        self.next_prune = time.monotonic() + self.PRUNE_INTERVAL
+
+    def take(self, key, capacity, refill_rate, cost=1):
+        """尝试取出令牌，返回(是否允许, 需要等待的秒数)"""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated, _ = self.buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            if tokens >= cost:
+                tokens -= cost
+                allowed, wait = True, 0.0
+            else:
+                allowed, wait = False, (cost - tokens) / refill_rate
+            # 补满时间按这个桶自己的容量和速率计算，清理时不依赖触发清理的路由
+            self.buckets[key] = [tokens, now, now + (capacity - tokens) / refill_rate]
+            self.buckets.move_to_end(key)
+
+            if now >= self.next_prune:
+                self.prune(now)
+            while len(self.buckets) > self.MAX_BUCKETS:
+                self.buckets.popitem(last=False)
+        return allowed, wait
+
+    def prune(self, now):
+        """删除已经补满的桶：补满的桶和新建的桶等价"""
+        for key in [key for key, (_, _, full_at) in self.buckets.items() if full_at <= now]:
+            del self.buckets[key]
+        self.next_prune = now + self.PRUNE_INTERVAL
+
+
+class RedisBucketStore:
+    # 在服务端原子地完成补充和扣减
+    TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.script = self.client.register_script(self.TAKE_SCRIPT)
+
+    def take(self, key, capacity, refill_rate, cost=1):
+        allowed, wait = self.script(keys=[self.prefix + key], args=[capacity, refill_rate, time.time(), cost])
+        return bool(allowed), float(wait)
+
+
+def create_bucket_store(redis_url=None):
+    """配置了Redis地址且安装了redis库时使用Redis，否则使用进程内存储"""
+    if redis_url and redis is not None:
+        return RedisBucketStore(redis_url)
+    return MemoryBucketStore()
+
+
+def retry_after_seconds(wait):
+    """Retry-After头的值（整数秒，至少1秒）"""
+    return max(1, math.ceil(wait))
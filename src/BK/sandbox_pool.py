@@ -0,0 +1,215 @@
+"""
+远程运行沙箱进程池
+- 预先启动若干Python解释器进程等待任务，收到代码后立即执行，省去每次启动解释器的开销
+- 每个进程只执行一次任务，执行前用setrlimit限制CPU时间、内存、写文件大小和进程数，执行完即退出，由池补充新进程
+- 沙箱进程通过 unshare 进入没有网卡的网络命名空间，并切换到专用的无特权用户（服务需要以root运行）：
+  服务的源码、数据库和密钥对该用户不可读（部署时保证这些文件不是所有人可读），RLIMIT_NPROC 只统计沙箱用户的进程
+- 解释器由沙箱用户执行，必须放在该用户可以访问的位置（如系统Python，而不是 /root 下的虚拟环境）
+- 运行过程中stdout/stderr按块实时返回，超过墙钟时间或输出上限时结束整个进程组
+"""
+
+import codecs
+import json
+import os
+import pwd
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# 沙箱进程启动后先阻塞在读取任务上；收到任务后设置资源限制再执行用户代码
+WORKER_BOOTSTRAP = r"""
+import json, os, resource, sys
+job = json.loads(sys.stdin.readline())
+resource.setrlimit(resource.RLIMIT_CPU, (job['cpu_seconds'], job['cpu_seconds'] + 1))
+resource.setrlimit(resource.RLIMIT_AS, (job['memory'], job['memory']))
+resource.setrlimit(resource.RLIMIT_FSIZE, (job['file_size'], job['file_size']))
+resource.setrlimit(resource.RLIMIT_NPROC, (job['processes'], job['processes']))
+sys.stdin.close()
+sys.stdin = open(os.devnull)
+os.chdir(job['workdir'])
+sys.argv = ['main.py']
+sys.path.insert(0, job['workdir'])
+del json, os, resource
+exec(compile(job.pop('code'), 'main.py', 'exec'), {'__name__': '__main__', '__file__': 'main.py', '__builtins__': __builtins__})
+"""
+
+READ_CHUNK = 4096
+
+
+class SandboxPool:
+    def __init__(self, user, size=None, timeout=10, cpu_seconds=5, memory=256 * 1024 * 1024,
+                 file_size=1024 * 1024, max_output=1024 * 1024, max_processes=0, python=None):
+        account = pwd.getpwnam(user)
+        if account.pw_uid == 0:
+            raise ValueError('沙箱用户不能是root')
+        self.uid, self.gid = account.pw_uid, account.pw_gid
+        self.python = python or sys.executable
+        self.size = size or os.cpu_count() or 2
+        self.timeout = timeout  # 墙钟时间上限（秒）
+        self.cpu_seconds = cpu_seconds
+        self.memory = memory
+        self.file_size = file_size
+        self.max_output = max_output
+        self.max_processes = max_processes
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = False
+        self.spawning = 0  # 后台正在启动、还没有放入空闲队列的进程数
+
+    def start(self):
+        """预先启动沙箱进程"""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        for _ in range(self.size):
+            self.idle.put(self.spawn())
+
+    def spawn(self):
+        # unshare：新的网络命名空间中只有未启用的回环接口；清空附加组后切换到沙箱用户
+        # -I 隔离模式：忽略PYTHON*环境变量和用户site-packages；新会话便于结束整个进程组
+        return subprocess.Popen(
+            ['unshare', '--net', '--setgid', str(self.gid), '--setuid', str(self.uid), '--',
+             self.python, '-I', '-u', '-c', WORKER_BOOTSTRAP],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+            env={'PATH': os.environ.get('PATH', ''), 'PYTHONIOENCODING': 'utf-8', 'LANG': 'C.UTF-8'}
+        )
+
+    def acquire(self):
+        """取出一个空闲进程，并在后台补充一个新进程"""
+        self.start()
+        try:
+            process = self.idle.get_nowait()
+        except queue.Empty:
+            process = self.spawn()
+        self.replenish()
+        return process
+
+    def replenish(self):
+        """空闲和正在启动的进程合计不足size时在后台补充一个，突发请求时空闲进程不会越积越多"""
+        with self.lock:
+            if self.idle.qsize() + self.spawning >= self.size:
+                return
+            self.spawning += 1
+        threading.Thread(target=self._spawn_idle, daemon=True).start()
+
+    def _spawn_idle(self):
+        try:
+            self.idle.put(self.spawn())
+        finally:
+            with self.lock:
+                self.spawning -= 1
+
+    def run(self, code):
+        """执行代码，逐个生成事件：{'stream': 'stdout'|'stderr', 'data': ...}，最后是{'exit_code': ...}"""
+        workdir = tempfile.mkdtemp(prefix='ec_run_')
+        os.chown(workdir, self.uid, self.gid)  # 工作目录只有沙箱用户可以访问
+        process = self.acquire()
+        started = time.monotonic()
+        events = queue.Queue()
+        readers = [
+            threading.Thread(target=_read_stream, args=(process.stdout, 'stdout', events), daemon=True),
+            threading.Thread(target=_read_stream, args=(process.stderr, 'stderr', events), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+
+        reason = None
+        output_size = 0
+        try:
+            job = {
+                'code': code,
+                'workdir': workdir,
+                'cpu_seconds': self.cpu_seconds,
+                'memory': self.memory,
+                'file_size': self.file_size,
+                'processes': self.max_processes,
+            }
+            try:
+                process.stdin.write((json.dumps(job) + '\n').encode('utf-8'))
+                process.stdin.close()
+            except OSError:
+                pass  # 进程已退出，由下面的退出码反映
+
+            open_streams = len(readers)
+            while open_streams:
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    reason = 'timeout'
+                    break
+                try:
+                    stream, data = events.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if data is None:
+                    open_streams -= 1
+                    continue
+                output_size += len(data)
+                if output_size > self.max_output:
+                    reason = 'output_limit'
+                    break
+                yield {'stream': stream, 'data': data}
+
+            if reason is None:
+                # 输出已关闭，等进程自己退出；关闭了输出仍在运行的程序按超时结束
+                try:
+                    process.wait(timeout=max(0, self.timeout - (time.monotonic() - started)))
+                except subprocess.TimeoutExpired:
+                    reason = 'timeout'
+        finally:
+            # 客户端断开（生成器被关闭）时也会执行到这里；池自己结束的进程由reason说明原因
+            if process.poll() is None:
+                _kill_group(process)
+            exit_code = process.wait()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        result = {'exit_code': exit_code, 'duration': round(time.monotonic() - started, 3)}
+        if reason:
+            result['terminated'] = reason
+        elif exit_code == -signal.SIGXCPU:
+            result['terminated'] = 'cpu_limit'
+        elif exit_code == -signal.SIGKILL:
+            result['terminated'] = 'killed'  # 不是池发送的：CPU时间硬限制或系统内存不足
+        yield result
+
+    def shutdown(self):
+        while True:
+            try:
+                process = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            _kill_group(process)
+            process.wait()
+
+
+def _read_stream(pipe, name, events):
+    """按块读取输出并放入事件队列，结束时放入None"""
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    fd = pipe.fileno()
+    while True:
+        chunk = os.read(fd, READ_CHUNK)
+        if not chunk:
+            break
+        text = decoder.decode(chunk)
+        if text:
+            events.put((name, text))
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        events.put((name, tail))
+    events.put((name, None))
+    pipe.close()
+
+
+def _kill_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
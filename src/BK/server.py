@@ -1,18 +1,49 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, redirect, send_from_directory, url_for
 from flask_cors import CORS
 import json
 import os
+import shutil
 import sqlite3
-from datetime import datetime
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+import threading
 import uuid
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import time
+from http_compression import compress_response, send_precompressed
+from event_stream import EventBroker, parse_last_event_id
+import migrations
+import package_index
+from user_import import (BATCH_SIZE, MAX_ROWS, ImportFormatError, PasswordHasher,
+                         parse_json, parse_upload, validate_rows)
 
 app = Flask(__name__)
 CORS(app)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['DATABASE'] = 'ide_system.db'
+# 事件流票据的有效期（秒）：EventSource只能把凭据放在URL中，不使用长期token
+app.config['EVENT_TICKET_TTL'] = 60
+app.config['STATS_RECONCILE_INTERVAL'] = 3600  # 统计表与实际数据核对的间隔（秒）
+# 删除项目：先标记删除，宽限期内可撤销，之后由后台线程分批删除文件
+app.config['DELETE_GRACE_SECONDS'] = int(os.environ.get('EC_DELETE_GRACE_SECONDS', 600))
+app.config['REAPER_INTERVAL'] = 30
+app.config['REAPER_BATCH_SIZE'] = 500
+# 本地包索引（PEP 503）：包文件存放目录；本地没有的项目转发到上游索引，设为空字符串则只使用本地文件
+app.config['PACKAGE_DIR'] = os.environ.get('EC_PACKAGE_DIR', 'packages')
+app.config['PACKAGE_UPSTREAM'] = os.environ.get('EC_PACKAGE_UPSTREAM', 'https://pypi.org/simple')
+app.after_request(compress_response)
+
+# 进程内事件发布，/api/events 推送给已连接的管理端
+broker = EventBroker()
+
+# 批量导入任务：任务ID -> 进度，只保留最近的若干个
+password_hasher = PasswordHasher()
+import_jobs = {}
+import_jobs_lock = threading.Lock()
+MAX_IMPORT_JOBS = 20
 
 
 # 初始化数据库
@@ -39,6 +70,7 @@ def init_db():
                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                   last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                   file_count INTEGER DEFAULT 0,
+                  deleted_at TIMESTAMP,
                   FOREIGN KEY (owner_id) REFERENCES users (id))''')
 
     # 文件表
@@ -58,6 +90,21 @@ def init_db():
                   version TEXT NOT NULL,
                   installed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
 
+    # 统计表：由触发器增量维护，系统信息接口只读这一行
+    c.execute('''CREATE TABLE IF NOT EXISTS system_stats
+                 (id INTEGER PRIMARY KEY CHECK (id = 1),
+                  total_users INTEGER NOT NULL DEFAULT 0,
+                  total_projects INTEGER NOT NULL DEFAULT 0,
+                  total_files INTEGER NOT NULL DEFAULT 0,
+                  total_bytes INTEGER NOT NULL DEFAULT 0,
+                  reconciled_at TIMESTAMP)''')
+    c.execute('INSERT OR IGNORE INTO system_stats (id) VALUES (1)')
+
+    # 每天的提交次数（新建或修改文件）
+    c.execute('''CREATE TABLE IF NOT EXISTS daily_submissions
+                 (day TEXT PRIMARY KEY,
+                  count INTEGER NOT NULL DEFAULT 0)''')
+
     # 创建默认管理员用户
     hashed_password = generate_password_hash('admin123')
     try:
@@ -67,9 +114,100 @@ def init_db():
         pass
 
     conn.commit()
+
+    # 已有的数据库按版本升级（补充新增的列和索引）
+    migrations.migrate(conn, migrations.SERVER_MIGRATIONS)
+    # 在迁移之后创建，迁移会删除旧版本的触发器
+    conn.executescript(STATS_TRIGGERS)
+    conn.close()
+
+    reconcile_stats()
+
+
+# 统计触发器：任何写入路径（包括直接操作数据库）都会同步更新统计表
+# 已标记删除的项目及其文件不计入统计；清理时先删文件再删项目，删除时也不会重复扣减
+LIVE_FILE = 'NOT EXISTS (SELECT 1 FROM projects WHERE id = {}.project_id AND deleted_at IS NOT NULL)'
+STATS_TRIGGERS = f'''
+CREATE TRIGGER IF NOT EXISTS stats_user_insert AFTER INSERT ON users BEGIN
+    UPDATE system_stats SET total_users = total_users + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_user_delete AFTER DELETE ON users BEGIN
+    UPDATE system_stats SET total_users = total_users - 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_project_insert AFTER INSERT ON projects
+WHEN NEW.deleted_at IS NULL BEGIN
+    UPDATE system_stats SET total_projects = total_projects + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_project_delete AFTER DELETE ON projects
+WHEN OLD.deleted_at IS NULL BEGIN
+    UPDATE system_stats SET total_projects = total_projects - 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_project_tombstone AFTER UPDATE OF deleted_at ON projects
+WHEN OLD.deleted_at IS NULL AND NEW.deleted_at IS NOT NULL BEGIN
+    UPDATE system_stats SET total_projects = total_projects - 1,
+        total_files = total_files - (SELECT COUNT(*) FROM files WHERE project_id = NEW.id),
+        total_bytes = total_bytes - (SELECT COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0)
+                                     FROM files WHERE project_id = NEW.id) WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_project_restore AFTER UPDATE OF deleted_at ON projects
+WHEN OLD.deleted_at IS NOT NULL AND NEW.deleted_at IS NULL BEGIN
+    UPDATE system_stats SET total_projects = total_projects + 1,
+        total_files = total_files + (SELECT COUNT(*) FROM files WHERE project_id = NEW.id),
+        total_bytes = total_bytes + (SELECT COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0)
+                                     FROM files WHERE project_id = NEW.id) WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_file_insert AFTER INSERT ON files BEGIN
+    UPDATE system_stats SET total_files = total_files + 1,
+        total_bytes = total_bytes + COALESCE(LENGTH(CAST(NEW.content AS BLOB)), 0)
+    WHERE id = 1 AND {LIVE_FILE.format("NEW")};
+    INSERT OR IGNORE INTO daily_submissions (day, count) VALUES (date('now', 'localtime'), 0);
+    UPDATE daily_submissions SET count = count + 1 WHERE day = date('now', 'localtime');
+END;
+CREATE TRIGGER IF NOT EXISTS stats_file_update AFTER UPDATE OF content ON files BEGIN
+    UPDATE system_stats SET total_bytes = total_bytes
+        - COALESCE(LENGTH(CAST(OLD.content AS BLOB)), 0)
+        + COALESCE(LENGTH(CAST(NEW.content AS BLOB)), 0)
+    WHERE id = 1 AND {LIVE_FILE.format("NEW")};
+    INSERT OR IGNORE INTO daily_submissions (day, count) VALUES (date('now', 'localtime'), 0);
+    UPDATE daily_submissions SET count = count + 1 WHERE day = date('now', 'localtime');
+END;
+CREATE TRIGGER IF NOT EXISTS stats_file_delete AFTER DELETE ON files BEGIN
+    UPDATE system_stats SET total_files = total_files - 1,
+        total_bytes = total_bytes - COALESCE(LENGTH(CAST(OLD.content AS BLOB)), 0)
+    WHERE id = 1 AND {LIVE_FILE.format("OLD")};
+END;
+'''
+
+
+def reconcile_stats():
+    """按实际数据重新计算统计表（启动时和定期执行，修正触发器之外的偏差）"""
+    conn = get_db()
+    with conn:
+        conn.execute(f'''
+            UPDATE system_stats SET
+                total_users = (SELECT COUNT(*) FROM users),
+                total_projects = (SELECT COUNT(*) FROM projects WHERE deleted_at IS NULL),
+                total_files = (SELECT COUNT(*) FROM files f WHERE {LIVE_FILE.format("f")}),
+                total_bytes = (SELECT COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0)
+                               FROM files f WHERE {LIVE_FILE.format("f")}),
+                reconciled_at = ?
+            WHERE id = 1
+        ''', (datetime.now().isoformat(),))
     conn.close()
 
 
+def start_stats_reconciler():
+    def loop():
+        while True:
+            time.sleep(app.config['STATS_RECONCILE_INTERVAL'])
+            try:
+                reconcile_stats()
+            except sqlite3.Error as e:
+                print(f"统计核对失败: {e}")
+
+    threading.Thread(target=loop, daemon=True).start()
+
+
 # 数据库连接辅助函数
 def get_db():
     conn = sqlite3.connect(app.config['DATABASE'])
@@ -77,6 +215,20 @@ def get_db():
     return conn
 
 
+# 解析token，返回对应用户，无效时返回None
+def load_user_from_token(token, scope=None):
+    """scope为None时只接受登录token；事件流票据（scope='events'）不能当作登录token使用"""
+    try:
+        if token.startswith('Bearer '):
+            token = token[7:]
+        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+        if data.get('scope') != scope:
+            return None
+        return get_user_by_id(data['user_id'])
+    except:
+        return None
+
+
 # JWT token验证装饰器
 def token_required(f):
     def decorated(*args, **kwargs):
@@ -84,14 +236,8 @@ def token_required(f):
         if not token:
             return jsonify({'success': False, 'message': 'Token is missing'}), 401
 
-        try:
-            if token.startswith('Bearer '):
-                token = token[7:]
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = get_user_by_id(data['user_id'])
-            if not current_user:
-                return jsonify({'success': False, 'message': 'Invalid token'}), 401
-        except:
+        current_user = load_user_from_token(token)
+        if not current_user:
             return jsonify({'success': False, 'message': 'Token is invalid'}), 401
 
         return f(current_user, *args, **kwargs)
@@ -229,14 +375,122 @@ def create_user(current_user):
 
     # 创建用户
     hashed_password = generate_password_hash(password)
-    conn.execute('INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)',
-                 (username, hashed_password, is_admin))
+    cursor = conn.execute('INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)',
+                          (username, hashed_password, is_admin))
     conn.commit()
     conn.close()
+    broker.publish('user.created', {'user_id': cursor.lastrowid, 'username': username})
 
     return jsonify({'success': True, 'message': '用户创建成功'})
 
 
+def insert_user_batch(conn, batch, job):
+    """一个事务插入一批用户；与并发创建的用户冲突时回退为逐行插入，记录冲突的行"""
+    try:
+        with conn:
+            conn.executemany('INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)',
+                             [(username, hashed, is_admin) for _, username, hashed, is_admin in batch])
+        return len(batch)
+    except sqlite3.IntegrityError:
+        pass
+
+    created = 0
+    for line_no, username, hashed, is_admin in batch:
+        try:
+            with conn:
+                conn.execute('INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)',
+                             (username, hashed, is_admin))
+            created += 1
+        except sqlite3.IntegrityError:
+            job['errors'].append({'row': line_no, 'username': username, 'message': '用户名已存在'})
+    return created
+
+
+def run_user_import(job, rows):
+    """后台线程：校验、并行哈希、分批插入，进度写入job"""
+    conn = get_db()
+    try:
+        existing = {row['username'] for row in conn.execute('SELECT username FROM users')}
+        valid, errors = validate_rows(rows, existing)
+        job['errors'].extend(errors)
+        job['processed'] = len(errors)
+
+        hashes = password_hasher.hash_all([password for _, _, password, _ in valid])
+        batch = []
+        for (line_no, username, _, is_admin), hashed in zip(valid, hashes):
+            batch.append((line_no, username, hashed, is_admin))
+            if len(batch) >= BATCH_SIZE:
+                job['created'] += insert_user_batch(conn, batch, job)
+                job['processed'] += len(batch)
+                batch = []
+        if batch:
+            job['created'] += insert_user_batch(conn, batch, job)
+            job['processed'] += len(batch)
+        job['status'] = 'finished'
+    except Exception as e:
+        job['status'] = 'failed'
+        job['message'] = str(e)
+    finally:
+        conn.close()
+        job['errors'].sort(key=lambda error: error['row'])
+        job['finished_at'] = datetime.now().isoformat()
+
+    if job['created']:
+        broker.publish('user.imported', {'job_id': job['id'], 'created': job['created']})
+
+
+@app.route('/api/admin/users/import', methods=['POST'])
+@token_required
+@admin_required
+def import_users(current_user):
+    # 上传文件（CSV或.json），或JSON请求体：用户列表 / {"users": [...]} / {"csv": "..."}
+    try:
+        upload = request.files.get('file')
+        if upload:
+            rows = parse_upload(upload.filename, upload.read())
+        else:
+            data = request.get_json(silent=True)
+            if isinstance(data, dict) and 'csv' in data:
+                rows = parse_upload('import.csv', data['csv'] or '')
+            else:
+                rows = parse_json(data)
+    except ImportFormatError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    if not rows:
+        return jsonify({'success': False, 'message': '没有可导入的用户'}), 400
+    if len(rows) > MAX_ROWS:
+        return jsonify({'success': False, 'message': f'一次最多导入{MAX_ROWS}个用户'}), 400
+
+    job = {
+        'id': uuid.uuid4().hex,
+        'status': 'running',
+        'total': len(rows),
+        'processed': 0,
+        'created': 0,
+        'errors': [],
+        'started_at': datetime.now().isoformat(),
+        'finished_at': None
+    }
+    with import_jobs_lock:
+        import_jobs[job['id']] = job
+        while len(import_jobs) > MAX_IMPORT_JOBS:
+            import_jobs.pop(next(iter(import_jobs)))
+    threading.Thread(target=run_user_import, args=(job, rows), daemon=True).start()
+
+    return jsonify({'success': True, 'job_id': job['id'], 'total': job['total']}), 202
+
+
+@app.route('/api/admin/users/import/<job_id>', methods=['GET'])
+@token_required
+@admin_required
+def get_import_job(current_user, job_id):
+    job = import_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': '导入任务不存在'}), 404
+    return jsonify({'success': True, 'job': dict(job, errors=list(job['errors']))})
+
+
 @app.route('/api/admin/users/<int:user_id>', methods=['PUT'])
 @token_required
 @admin_required
@@ -268,6 +522,7 @@ def update_user(current_user, user_id):
         query = f'UPDATE users SET {", ".join(update_fields)} WHERE id = ?'
         conn.execute(query, update_values)
         conn.commit()
+        broker.publish('user.updated', {'user_id': user_id})
 
     conn.close()
     return jsonify({'success': True, 'message': '用户信息已更新'})
@@ -287,6 +542,7 @@ def delete_user(current_user, user_id):
     conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
     conn.commit()
     conn.close()
+    broker.publish('user.deleted', {'user_id': user_id})
 
     return jsonify({'success': True, 'message': '用户已删除'})
 
@@ -305,6 +561,7 @@ def toggle_user_admin(current_user, user_id):
     conn.execute('UPDATE users SET is_admin = ? WHERE id = ?', (is_admin, user_id))
     conn.commit()
     conn.close()
+    broker.publish('user.updated', {'user_id': user_id, 'is_admin': bool(is_admin)})
 
     action = "设为管理员" if is_admin else "取消管理员权限"
     return jsonify({'success': True, 'message': f'用户已{action}'})
@@ -324,6 +581,7 @@ def toggle_user_status(current_user, user_id):
     conn.execute('UPDATE users SET is_active = ? WHERE id = ?', (is_active, user_id))
     conn.commit()
     conn.close()
+    broker.publish('user.updated', {'user_id': user_id, 'is_active': bool(is_active)})
 
     action = "激活" if is_active else "禁用"
     return jsonify({'success': True, 'message': f'用户已{action}'})
@@ -343,7 +601,7 @@ def get_projects(current_user):
                    p.file_count, p.last_modified
             FROM projects p
             JOIN users u ON p.owner_id = u.id
-            WHERE p.name LIKE ? OR u.username LIKE ?
+            WHERE p.deleted_at IS NULL AND (p.name LIKE ? OR u.username LIKE ?)
             ORDER BY p.created_at DESC
         ''', (f'%{search}%', f'%{search}%')).fetchall()
     else:
@@ -352,6 +610,7 @@ def get_projects(current_user):
                    p.file_count, p.last_modified
             FROM projects p
             JOIN users u ON p.owner_id = u.id
+            WHERE p.deleted_at IS NULL
             ORDER BY p.created_at DESC
         ''').fetchall()
 
@@ -377,15 +636,104 @@ def get_projects(current_user):
 def delete_project(current_user, project_id):
     conn = get_db()
 
-    # 先删除相关文件
-    conn.execute('DELETE FROM files WHERE project_id = ?', (project_id,))
-    # 再删除项目
-    conn.execute('DELETE FROM projects WHERE id = ?', (project_id,))
+    # 只标记删除，文件由清理线程在宽限期后分批删除
+    deleted_at = datetime.now()
+    cursor = conn.execute('UPDATE projects SET deleted_at = ? WHERE id = ? AND deleted_at IS NULL',
+                          (deleted_at.isoformat(), project_id))
+    conn.commit()
+    conn.close()
+    if not cursor.rowcount:
+        return jsonify({'success': False, 'message': '项目不存在'}), 404
+    broker.publish('project.deleted', {'project_id': project_id})
+
+    restore_until = deleted_at + timedelta(seconds=app.config['DELETE_GRACE_SECONDS'])
+    return jsonify({'success': True, 'message': '项目已删除，可在宽限期内撤销',
+                    'restore_until': restore_until.isoformat()})
+
+
+@app.route('/api/admin/projects/deleted', methods=['GET'])
+@token_required
+@admin_required
+def get_deleted_projects(current_user):
+    conn = get_db()
+    projects = conn.execute('''
+        SELECT p.id, p.name, u.username as owner, p.deleted_at
+        FROM projects p
+        JOIN users u ON p.owner_id = u.id
+        WHERE p.deleted_at IS NOT NULL
+        ORDER BY p.deleted_at DESC
+    ''').fetchall()
+    conn.close()
+
+    grace = timedelta(seconds=app.config['DELETE_GRACE_SECONDS'])
+    now = datetime.now()
+    projects_list = []
+    for project in projects:
+        restore_until = datetime.fromisoformat(project['deleted_at']) + grace
+        projects_list.append({
+            'id': project['id'],
+            'name': project['name'],
+            'owner': project['owner'],
+            'deleted_at': project['deleted_at'],
+            'restore_until': restore_until.isoformat(),
+            'restorable': restore_until > now
+        })
+
+    return jsonify({'success': True, 'projects': projects_list})
+
 
+@app.route('/api/admin/projects/<int:project_id>/restore', methods=['POST'])
+@token_required
+@admin_required
+def restore_project(current_user, project_id):
+    # 条件更新：超过宽限期（清理线程可能已开始删除）时不再恢复
+    cutoff = datetime.now() - timedelta(seconds=app.config['DELETE_GRACE_SECONDS'])
+    conn = get_db()
+    cursor = conn.execute('UPDATE projects SET deleted_at = NULL WHERE id = ? AND deleted_at > ?',
+                          (project_id, cutoff.isoformat()))
     conn.commit()
     conn.close()
+    if not cursor.rowcount:
+        return jsonify({'success': False, 'message': '项目不存在或已超过撤销期限'}), 409
+    broker.publish('project.restored', {'project_id': project_id})
+
+    return jsonify({'success': True, 'message': '项目已恢复'})
+
 
-    return jsonify({'success': True, 'message': '项目已删除'})
+def reap_deleted_projects():
+    """删除超过宽限期的项目：每个事务删除一批文件，两批之间释放写锁"""
+    cutoff = datetime.now() - timedelta(seconds=app.config['DELETE_GRACE_SECONDS'])
+    batch_size = app.config['REAPER_BATCH_SIZE']
+    conn = get_db()
+    try:
+        project_ids = [row['id'] for row in conn.execute(
+            'SELECT id FROM projects WHERE deleted_at <= ?', (cutoff.isoformat(),))]
+        for project_id in project_ids:
+            while True:
+                with conn:
+                    cursor = conn.execute(
+                        'DELETE FROM files WHERE id IN (SELECT id FROM files WHERE project_id = ? LIMIT ?)',
+                        (project_id, batch_size))
+                if cursor.rowcount < batch_size:
+                    break
+            with conn:
+                conn.execute('DELETE FROM projects WHERE id = ?', (project_id,))
+            broker.publish('project.purged', {'project_id': project_id})
+    finally:
+        conn.close()
+    return len(project_ids)
+
+
+def start_reaper():
+    def loop():
+        while True:
+            time.sleep(app.config['REAPER_INTERVAL'])
+            try:
+                reap_deleted_projects()
+            except sqlite3.Error as e:
+                print(f"清理已删除项目失败: {e}")
+
+    threading.Thread(target=loop, daemon=True).start()
 
 
 # 系统信息路由
@@ -395,14 +743,14 @@ def delete_project(current_user, project_id):
 def get_system_info(current_user):
     conn = get_db()
 
-    # 获取用户总数
-    total_users = conn.execute('SELECT COUNT(*) as count FROM users').fetchone()['count']
-
-    # 获取项目总数
-    total_projects = conn.execute('SELECT COUNT(*) as count FROM projects').fetchone()['count']
+    # 统计数据由触发器维护，这里只读一行，不随数据量增长
+    stats = conn.execute('SELECT * FROM system_stats WHERE id = 1').fetchone()
 
-    # 获取文件总数
-    total_files = conn.execute('SELECT COUNT(*) as count FROM files').fetchone()['count']
+    # 最近7天的提交次数（按主键范围查询）
+    daily = conn.execute('''
+        SELECT day, count FROM daily_submissions
+        WHERE day >= date('now', 'localtime', '-6 days') ORDER BY day
+    ''').fetchall()
 
     conn.close()
 
@@ -410,9 +758,12 @@ def get_system_info(current_user):
         'success': True,
         'info': {
             'version': 'v2.0',
-            'total_users': total_users,
-            'total_projects': total_projects,
-            'total_files': total_files
+            'total_users': stats['total_users'],
+            'total_projects': stats['total_projects'],
+            'total_files': stats['total_files'],
+            'total_bytes': stats['total_bytes'],
+            'reconciled_at': stats['reconciled_at'],
+            'daily_submissions': [{'day': row['day'], 'count': row['count']} for row in daily]
         }
     })
 
@@ -437,6 +788,191 @@ def get_packages(current_user):
     return jsonify({'success': True, 'packages': packages_list})
 
 
+# 本地包索引
+def register_package_file(conn, info):
+    conn.execute('''INSERT OR REPLACE INTO package_files
+                    (filename, project, version, size, sha256, requires_python) VALUES (?, ?, ?, ?, ?, ?)''',
+                 (info['filename'], info['project'], info['version'], info['size'], info['sha256'],
+                  info['requires_python']))
+    # 包列表显示最近加入的版本
+    conn.execute('''INSERT INTO packages (name, version) VALUES (?, ?)
+                    ON CONFLICT(name) DO UPDATE SET version = excluded.version, installed_at = CURRENT_TIMESTAMP''',
+                 (info['project'], info['version']))
+
+
+def add_package_files(paths):
+    """把本地的发行文件加入索引，返回(加入的文件信息, 错误列表)"""
+    added, errors = [], []
+    conn = get_db()
+    try:
+        for path in paths:
+            filename = os.path.basename(path)
+            try:
+                info = package_index.store_file(app.config['PACKAGE_DIR'], path, filename)
+            except package_index.InvalidPackageFile as e:
+                errors.append({'filename': filename, 'message': str(e)})
+                continue
+            with conn:
+                register_package_file(conn, info)
+            added.append(info)
+    finally:
+        conn.close()
+    return added, errors
+
+
+@app.route('/simple/', methods=['GET'])
+def simple_index():
+    conn = get_db()
+    projects = [row['project'] for row in conn.execute('SELECT DISTINCT project FROM package_files ORDER BY project')]
+    conn.close()
+    page = package_index.render_page('Simple index', [(f'{project}/', project, {}) for project in projects])
+    return Response(page, mimetype='text/html')
+
+
+@app.route('/simple/<project>/', methods=['GET'])
+def simple_project(project):
+    normalized = package_index.normalize_name(project)
+    if normalized != project:
+        return redirect(url_for('simple_project', project=normalized), 301)
+
+    conn = get_db()
+    files = conn.execute('SELECT filename, sha256, requires_python FROM package_files WHERE project = ? '
+                         'ORDER BY filename', (project,)).fetchall()
+    conn.close()
+
+    upstream = app.config['PACKAGE_UPSTREAM']
+    if not files:
+        if upstream:
+            return redirect(f"{upstream.rstrip('/')}/{project}/")
+        return Response('Not Found', status=404, mimetype='text/plain')
+
+    links = [
+        (f"{row['filename']}#sha256={row['sha256']}", row['filename'],
+         {'data-requires-python': row['requires_python']})
+        for row in files
+    ]
+    if upstream:
+        # 本地只有部分版本时，其他文件链接到上游，pip仍能选择本地没有的版本（同名文件使用本地的）
+        local = {row['filename'] for row in files}
+        try:
+            links += [link for link in package_index.fetch_links(f"{upstream.rstrip('/')}/{project}/")
+                      if link[1] not in local]
+        except OSError as e:
+            print(f"读取上游索引失败，只返回本地文件: {e}")
+
+    page = package_index.render_page(f'Links for {project}', links)
+    return Response(page, mimetype='text/html')
+
+
+@app.route('/simple/<project>/<filename>', methods=['GET'])
+def simple_file(project, filename):
+    # 文件名包含版本号，内容不会变化
+    directory = os.path.abspath(os.path.join(app.config['PACKAGE_DIR'], package_index.normalize_name(project)))
+    return send_from_directory(directory, filename, max_age=365 * 24 * 3600)
+
+
+@app.route('/api/admin/packages/index', methods=['GET'])
+@token_required
+@admin_required
+def get_package_files(current_user):
+    conn = get_db()
+    files = conn.execute('SELECT * FROM package_files ORDER BY project, filename').fetchall()
+    conn.close()
+    return jsonify({'success': True, 'files': [dict(row) for row in files]})
+
+
+@app.route('/api/admin/packages/upload', methods=['POST'])
+@token_required
+@admin_required
+def upload_packages(current_user):
+    uploads = request.files.getlist('files') or request.files.getlist('file')
+    if not uploads:
+        return jsonify({'success': False, 'message': '没有上传文件'}), 400
+
+    os.makedirs(app.config['PACKAGE_DIR'], exist_ok=True)
+    # 先写到索引目录下的临时目录，同一文件系统内移动，下载中的客户端不会读到不完整的文件
+    incoming = tempfile.mkdtemp(prefix='.incoming_', dir=app.config['PACKAGE_DIR'])
+    try:
+        paths, errors = [], []
+        for upload in uploads:
+            filename = os.path.basename(upload.filename or '')
+            try:
+                package_index.parse_filename(filename)
+            except package_index.InvalidPackageFile as e:
+                errors.append({'filename': filename, 'message': str(e)})
+                continue
+            path = os.path.join(incoming, filename)
+            upload.save(path)
+            paths.append(path)
+        added, store_errors = add_package_files(paths)
+    finally:
+        shutil.rmtree(incoming, ignore_errors=True)
+
+    errors += store_errors
+    if added:
+        broker.publish('package.added', {'files': [info['filename'] for info in added]})
+    return jsonify({
+        'success': bool(added),
+        'message': f'已加入 {len(added)} 个文件' if added else '没有可加入的文件',
+        'files': added,
+        'errors': errors
+    })
+
+
+@app.route('/api/admin/packages/index/<filename>', methods=['DELETE'])
+@token_required
+@admin_required
+def delete_package_file(current_user, filename):
+    conn = get_db()
+    row = conn.execute('SELECT project FROM package_files WHERE filename = ?', (filename,)).fetchone()
+    if not row:
+        conn.close()
+        return jsonify({'success': False, 'message': '文件不存在'}), 404
+    with conn:
+        conn.execute('DELETE FROM package_files WHERE filename = ?', (filename,))
+    conn.close()
+
+    path = os.path.join(app.config['PACKAGE_DIR'], row['project'], filename)
+    if os.path.exists(path):
+        os.remove(path)
+    return jsonify({'success': True, 'message': '文件已删除'})
+
+
+def sync_packages(args):
+    """命令行：python server.py --sync-packages [需求 ...] [-- pip download 参数]
+    不指定需求时同步包列表中的所有包；例如为Windows实验室机器下载：
+    python server.py --sync-packages pygame==2.5.2 -- --only-binary=:all: --platform win_amd64 --python-version 3.11
+    """
+    requirements, pip_args = args, []
+    if '--' in args:
+        index = args.index('--')
+        requirements, pip_args = args[:index], args[index + 1:]
+    if not requirements:
+        conn = get_db()
+        requirements = [row['name'] for row in conn.execute('SELECT name FROM packages ORDER BY name')]
+        conn.close()
+    if not requirements:
+        print("没有需要同步的包")
+        return False
+
+    try:
+        dest = package_index.download(requirements, pip_args, app.config['PACKAGE_UPSTREAM'] or None)
+    except subprocess.CalledProcessError as e:
+        print(f"pip download 失败，返回码: {e.returncode}")
+        return False
+    try:
+        paths = [os.path.join(dest, name) for name in sorted(os.listdir(dest))]
+        added, errors = add_package_files(paths)
+    finally:
+        shutil.rmtree(dest, ignore_errors=True)
+
+    for info in added:
+        print(f"✓ {info['filename']}")
+    for error in errors:
+        print(f"✗ {error['filename']}: {error['message']}")
+    return not errors
+
+
 # 系统操作路由
 @app.route('/api/admin/backup', methods=['POST'])
 @token_required
@@ -468,17 +1004,52 @@ def clean_temp_files(current_user):
     })
 
 
-# 静态文件服务
+# 事件推送（SSE）
+@app.route('/api/events/ticket', methods=['POST'])
+@token_required
+def event_ticket(current_user):
+    """换取短期的事件流票据：浏览器EventSource无法设置请求头，票据放在URL中，长期token不会进入访问日志"""
+    ticket = jwt.encode({
+        'user_id': current_user['id'],
+        'scope': 'events',
+        'exp': time.time() + app.config['EVENT_TICKET_TTL']
+    }, app.config['SECRET_KEY'], algorithm='HS256')
+    return jsonify({'success': True, 'ticket': ticket, 'expires_in': app.config['EVENT_TICKET_TTL']})
+
+
+@app.route('/api/events', methods=['GET'])
+def event_stream():
+    # 票据只在建立连接时检查，连接建立后过期不影响推送
+    token = request.headers.get('Authorization')
+    if token:
+        current_user = load_user_from_token(token)
+    else:
+        ticket = request.args.get('ticket')
+        current_user = load_user_from_token(ticket, scope='events') if ticket else None
+    if not current_user:
+        return jsonify({'success': False, 'message': 'Token is invalid'}), 401
+
+    last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    stream = broker.stream(current_user['id'], bool(current_user['is_admin']), last_event_id)
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# 静态文件服务（优先返回构建时生成的预压缩文件）
 @app.route('/')
 def serve_index():
-    return send_from_directory('.', 'admin.html')
+    return send_precompressed('.', 'admin.html', max_age=0)
 
 
 @app.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory('.', path)
+    return send_precompressed('.', path)
 
 
 if __name__ == '__main__':
     init_db()
+    if len(sys.argv) > 1 and sys.argv[1] == '--sync-packages':
+        sys.exit(0 if sync_packages(sys.argv[2:]) else 1)
+    start_stats_reconciler()
+    start_reaper()
     app.run(debug=True, port=8081)
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+用户代码分片存储
+- 项目和代码文件按用户ID哈希分布到N个SQLite文件，每个分片有独立的写锁
+- 对外的项目/文件ID编码了分片号：全局ID = 分片内ID * N + 分片号，只凭ID即可定位分片
+- 分片数 <= 1 时不分片，直接使用主库的db.session，ID保持不变
+- 分片数改变后全局ID随之改变，主库记录数据实际的分片数，与配置不一致时拒绝启动（见 background.py）
+"""
+
+import zlib
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+
+class ShardRouter:
+    def __init__(self, db, shard_count=0, uri_pattern=None, models=()):
+        self.db = db
+        self.shard_count = shard_count if shard_count and shard_count > 1 else 1
+        self.uri_pattern = uri_pattern
+        self.models = models
+        self.engines = []
+        self.sessions = []
+
+    @property
+    def enabled(self):
+        return self.shard_count > 1
+
+    def init_app(self, app):
+        """创建各分片的引擎、表和会话"""
+        if not self.enabled:
+            return
+
+        tables = [model.__table__ for model in self.models]
+        for shard in range(self.shard_count):
+            engine = create_engine(self.uri_pattern.format(shard=shard))
+            event.listen(engine, 'connect', configure_sqlite)
+            self.db.metadata.create_all(engine, tables=tables)
+            self.engines.append(engine)
+            self.sessions.append(scoped_session(sessionmaker(bind=engine)))
+
+        @app.teardown_appcontext
+        def remove_shard_sessions(exception=None):
+            for session in self.sessions:
+                session.remove()
+
+    def shard_for_key(self, key):
+        """分片键（用户ID，也可以是班级/租户名）对应的分片号"""
+        if not self.enabled:
+            return 0
+        return zlib.crc32(str(key).encode('utf-8')) % self.shard_count
+
+    def session(self, shard):
+        return self.sessions[shard] if self.enabled else self.db.session
+
+    def session_for_user(self, user_id):
+        """用户数据所在分片的会话"""
+        return self.session(self.shard_for_key(user_id))
+
+    def to_global_id(self, shard, local_id):
+        return local_id * self.shard_count + shard
+
+    def locate(self, global_id):
+        """根据全局ID返回(分片会话, 分片号, 分片内ID)"""
+        shard = global_id % self.shard_count
+        return self.session(shard), shard, global_id // self.shard_count
+
+    def all_shards(self):
+        """遍历所有分片，返回(分片号, 会话)，用于管理员的全局查询"""
+        return [(shard, self.session(shard)) for shard in range(self.shard_count)]
+
+
+def configure_sqlite(dbapi_connection, connection_record):
+    # WAL模式下读写互不阻塞，写锁冲突时等待而不是立即报错
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA busy_timeout=5000')
+    cursor.close()
@@ -0,0 +1,98 @@
+"""
+代码相似度检测（MinHash + LSH）
+- 用tokenize把代码转成记号序列：去掉注释，变量名/字符串/数字分别归一化，改名和改注释不影响结果
+- 连续K个记号组成一个shingle，对所有shingle计算MinHash签名；两个签名相同位置相等的比例近似Jaccard相似度
+- 签名分成若干段（band），每段的哈希作为LSH桶；至少有一段落在同一个桶里的文件才作为候选对，避免两两比较
+"""
+
+import array
+import builtins
+import hashlib
+import io
+import keyword
+import random
+import token
+import tokenize
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 32  # 每段4个值，相似度约0.42时成为候选的概率为50%
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 61) - 1
+# 固定种子，签名可以持久化并在不同进程间比较
+_rng = random.Random(20240901)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+# 保留的名字：关键字和内置函数是代码结构的一部分，不做归一化
+_RESERVED = set(keyword.kwlist) | set(dir(builtins))
+_SKIPPED = {tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER}
+
+
+def normalize_tokens(code):
+    """代码转成归一化的记号序列"""
+    result = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(code).readline):
+            if tok.type in _SKIPPED:
+                continue
+            if tok.type == token.NAME:
+                result.append(tok.string if tok.string in _RESERVED else 'ID')
+            elif tok.type == token.STRING:
+                result.append('STR')
+            elif tok.type == token.NUMBER:
+                result.append('NUM')
+            elif tok.type == token.NEWLINE:
+                result.append('NL')
+            elif tok.type in (token.INDENT, token.DEDENT):
+                result.append(token.tok_name[tok.type])
+            else:
+                result.append(tok.string)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass  # 未完成的代码只使用已经解析出的部分
+    return result
+
+
+def shingle_hashes(tokens, size=SHINGLE_SIZE):
+    """K个连续记号的64位哈希集合"""
+    hashes = set()
+    # 记号少于K个时整段作为一个shingle
+    for i in range(max(1, len(tokens) - size + 1) if tokens else 0):
+        raw = '\x1f'.join(tokens[i:i + size]).encode('utf-8')
+        hashes.add(int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), 'little'))
+    return hashes
+
+
+def minhash(hashes):
+    """MinHash签名（NUM_PERM个整数），空集合返回None"""
+    if not hashes:
+        return None
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def signature_for_code(code):
+    return minhash(shingle_hashes(normalize_tokens(code)))
+
+
+def band_keys(signature):
+    """签名每一段的桶哈希，返回[(段号, 桶哈希)]"""
+    keys = []
+    for band in range(BANDS):
+        part = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(repr(part).encode('ascii'), digest_size=8).digest()
+        # 转成有符号64位整数，便于存入SQLite的INTEGER列
+        keys.append((band, int.from_bytes(digest, 'little', signed=True)))
+    return keys
+
+
+def estimate_similarity(a, b):
+    """两个签名估计的Jaccard相似度"""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def pack_signature(signature):
+    return array.array('Q', signature).tobytes()
+
+
+def unpack_signature(data):
+    return array.array('Q', data).tolist()
@@ -0,0 +1,113 @@
+"""
+批量导入用户
+- 支持CSV（表头 username,password[,is_admin]，没有表头时按列顺序）和JSON（对象列表）
+- 密码哈希在进程池中并行计算；scrypt很慢，单线程导入几百个用户需要几十秒
+- 校验失败的行记录行号和原因，其余行照常导入
+"""
+
+import csv
+import io
+import json
+
+from werkzeug.security import generate_password_hash
+
+from process_pool import LazyProcessPool
+
+MAX_ROWS = 5000
+BATCH_SIZE = 200  # 每个事务插入的行数
+FIELDS = ('username', 'password', 'is_admin')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', '是'}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def decode_upload(data):
+    """上传文件解码：优先UTF-8（兼容Excel导出的BOM），失败时按GBK"""
+    if isinstance(data, str):
+        return data
+    try:
+        return data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        try:
+            return data.decode('gbk')
+        except UnicodeDecodeError:
+            raise ImportFormatError('文件编码无法识别，请保存为UTF-8')
+
+
+def parse_csv(text):
+    """返回[(行号, 字段字典)]，行号从1开始并与文件中的行对应"""
+    reader = csv.reader(io.StringIO(text))
+    rows = []
+    header = None
+    for line_no, record in enumerate(reader, start=1):
+        if not any(cell.strip() for cell in record):
+            continue
+        if header is None:
+            header = [cell.strip().lower() for cell in record]
+            if 'username' in header:
+                continue
+            header = list(FIELDS)  # 没有表头，第一行就是数据
+        rows.append((line_no, dict(zip(header, record))))
+    return rows
+
+
+def parse_json(data):
+    """接受对象列表，或 {"users": [...]}"""
+    if isinstance(data, dict):
+        data = data.get('users')
+    if not isinstance(data, list):
+        raise ImportFormatError('JSON格式应为用户对象列表')
+    rows = []
+    for index, item in enumerate(data, start=1):
+        rows.append((index, item if isinstance(item, dict) else {}))
+    return rows
+
+
+def parse_upload(filename, data):
+    text = decode_upload(data)
+    if (filename or '').lower().endswith('.json'):
+        try:
+            return parse_json(json.loads(text))
+        except json.JSONDecodeError as e:
+            raise ImportFormatError(f'JSON解析失败: {e}')
+    return parse_csv(text)
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def validate_rows(rows, existing_usernames):
+    """返回(有效行, 错误列表)；有效行为(行号, 用户名, 密码, 是否管理员)"""
+    valid, errors = [], []
+    seen = {}
+    for line_no, fields in rows:
+        username = str(fields.get('username') or '').strip()
+        password = str(fields.get('password') or '')
+        if not username or not password:
+            errors.append({'row': line_no, 'username': username, 'message': '用户名和密码不能为空'})
+        elif username in seen:
+            errors.append({'row': line_no, 'username': username, 'message': f'与第{seen[username]}行重复'})
+        elif username in existing_usernames:
+            errors.append({'row': line_no, 'username': username, 'message': '用户名已存在'})
+        else:
+            seen[username] = line_no
+            valid.append((line_no, username, password, parse_bool(fields.get('is_admin'))))
+    return valid, errors
+
+
+def hash_password(password):
+    return generate_password_hash(password)
+
+
+class PasswordHasher(LazyProcessPool):
+    """进程池按需创建，多个导入任务共用"""
+
+    def hash_all(self, passwords):
+        """按输入顺序生成哈希"""
+        chunksize = max(1, min(32, len(passwords) // (self.max_workers * 4)))
+        return self.get_executor().map(hash_password, passwords, chunksize=chunksize)
@@ -0,0 +1,169 @@
+"""
+控制台的持久shell会话
+- 每个会话是一个一直运行的shell，cd、环境变量和激活的虚拟环境在命令之间保持
+- Linux/macOS 使用伪终端（pty），交互式程序可以正常运行，Ctrl-C 由终端转成 SIGINT 发给前台进程
+- Windows 没有可用的伪终端，使用管道连接 cmd.exe，Ctrl-C 以 CTRL_BREAK_EVENT 发给会话的进程组
+- 输出在后台线程中读取，读到多少就通过回调交出多少，不等待命令结束
+"""
+
+import codecs
+import locale
+import os
+import re
+import signal
+import subprocess
+import threading
+
+if os.name != 'nt':
+    import fcntl
+    import pty
+    import struct
+    import termios
+
+TERMINAL_SIZE = (40, 120)  # 行, 列
+# 颜色、光标移动、窗口标题等控制序列，文本框中无法显示
+_CONTROL_SEQUENCE = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[()][0-9A-Za-z]|\x1b[=>]|[\x07\x08]')
+
+
+class OutputCleaner:
+    """去掉控制序列，统一换行；单独的\\r（进度条）保留给界面处理"""
+
+    def __init__(self, encoding):
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self.pending = ''
+
+    def feed(self, data, final=False):
+        text = self.pending + self.decoder.decode(data, final)
+        self.pending = ''
+        # 控制序列和\r\n可能被拆在两次读取之间，不完整的部分留到下次
+        if not final:
+            cut = len(text) - 1 if text.endswith('\r') else -1
+            escape = text.rfind('\x1b')
+            if escape >= len(text) - 32 and not _CONTROL_SEQUENCE.match(text, escape):
+                cut = escape if cut == -1 else min(cut, escape)
+            if cut != -1:
+                text, self.pending = text[:cut], text[cut:]
+        return _CONTROL_SEQUENCE.sub('', text).replace('\r\n', '\n')
+
+
+class PtySession:
+    """伪终端中的交互式shell"""
+
+    def __init__(self, cwd, env, on_output, on_exit):
+        self.cwd = cwd
+        self.env = env
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.pid = None
+        self.fd = None
+
+    @property
+    def alive(self):
+        return self.pid is not None
+
+    def start(self):
+        shell = self.env.get('SHELL') or '/bin/bash'
+        env = dict(self.env, TERM='dumb')  # 文本框不是真正的终端，尽量不输出颜色和光标控制
+        pid, fd = pty.fork()
+        if pid == 0:
+            # 子进程：pty.fork 已经建立新会话并把伪终端设为控制终端
+            try:
+                os.chdir(self.cwd)
+                os.execvpe(shell, [shell, '-i'], env)
+            finally:
+                os._exit(127)
+        rows, columns = TERMINAL_SIZE
+        fcntl.ioctl(fd, termios.TIOCSWINSZ, struct.pack('HHHH', rows, columns, 0, 0))
+        self.pid, self.fd = pid, fd
+        threading.Thread(target=self.read_output, args=(pid, fd), daemon=True).start()
+
+    def read_output(self, pid, fd):
+        cleaner = OutputCleaner('utf-8')
+        while True:
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                break  # shell退出后读取伪终端返回EIO
+            if not data:
+                break
+            self.on_output(cleaner.feed(data))
+        self.on_output(cleaner.feed(b'', final=True))
+
+        _, status = os.waitpid(pid, 0)
+        os.close(fd)
+        self.pid = self.fd = None
+        self.on_exit(os.waitstatus_to_exitcode(status))
+
+    def write(self, text):
+        os.write(self.fd, text.encode('utf-8'))
+
+    def send_line(self, line):
+        self.write(line + '\r')  # 与真正的终端一样按回车
+
+    def interrupt(self):
+        """Ctrl-C：终端驱动把它转成SIGINT发给前台进程组"""
+        self.write('\x03')
+
+    def close(self):
+        """与关闭终端窗口一样发送SIGHUP，伪终端由读取线程在shell退出后关闭"""
+        if self.pid is None:
+            return
+        try:
+            os.killpg(self.pid, signal.SIGHUP)
+        except ProcessLookupError:
+            pass
+
+
+class PipeSession:
+    """Windows：通过管道连接的 cmd.exe"""
+
+    def __init__(self, cwd, env, on_output, on_exit):
+        self.cwd = cwd
+        self.env = env
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.process = None
+        self.encoding = locale.getpreferredencoding(False)
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [self.env.get('COMSPEC') or 'cmd.exe'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            cwd=self.cwd, env=self.env,
+            creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
+        )
+        threading.Thread(target=self.read_output, args=(self.process,), daemon=True).start()
+
+    def read_output(self, process):
+        cleaner = OutputCleaner(self.encoding)
+        while True:
+            data = process.stdout.read1(4096)
+            if not data:
+                break
+            self.on_output(cleaner.feed(data))
+        self.on_output(cleaner.feed(b'', final=True))
+        self.on_exit(process.wait())
+
+    def write(self, text):
+        self.process.stdin.write(text.encode(self.encoding, errors='replace'))
+        self.process.stdin.flush()
+
+    def send_line(self, line):
+        self.write(line + '\r\n')
+
+    def interrupt(self):
+        self.process.send_signal(signal.CTRL_BREAK_EVENT)
+
+    def close(self):
+        if self.alive:
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(self.process.pid)], capture_output=True)
+
+
+def create_session(cwd, env, on_output, on_exit):
+    """on_output(文本)和on_exit(返回码)在后台线程中调用"""
+    session_class = PipeSession if os.name == 'nt' else PtySession
+    return session_class(cwd, env, on_output, on_exit)
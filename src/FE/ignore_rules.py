@@ -0,0 +1,236 @@
+"""
+项目文件忽略规则（.gitignore 语法）
+- 规则来源：内置默认规则、项目根目录的 .ecignore，以及各级目录中的 .gitignore
+- 深层目录的 .gitignore 优先于上级目录；同一来源中后面的规则优先，! 开头的规则取消忽略
+- 每个规则文件只编译一次（文件修改后重新编译），没有 ! 规则的文件合并成一个正则表达式
+- 被忽略的目录不会再进入，其中的文件也就无法用 ! 取消忽略（与git一致）
+"""
+
+import os
+import re
+
+# 虚拟环境、缓存和IDE配置目录，项目里没有 .gitignore 时也不显示、不提交
+DEFAULT_RULES = [
+    '__pycache__/',
+    '*.py[cod]',
+    'venv/',
+    '.venv/',
+    'env/',
+    'node_modules/',
+    '.idea/',
+    '.vscode/',
+    '.git/',
+    '.mypy_cache/',
+    '.pytest_cache/',
+    '*.egg-info/',
+    'build/',
+    'dist/',
+]
+IGNORE_FILES = ('.gitignore',)
+PROJECT_IGNORE_FILE = '.ecignore'  # 只在项目根目录读取，优先于根目录的 .gitignore
+
+
+def glob_to_regex(pattern):
+    """把一条规则（已去掉开头的!和结尾的/）转换成正则表达式，匹配相对于规则文件所在目录的路径"""
+    # 只有结尾以外的位置包含/时才相对于规则文件所在目录，否则匹配任意层级的名称
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**/', i) and (i == 0 or pattern[i - 1] == '/'):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i) and i + 2 == len(pattern) and (i == 0 or pattern[i - 1] == '/'):
+            parts.append('.*')
+            i += 2
+        elif char == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif char == '?':
+            parts.append('[^/]')
+            i += 1
+        elif char == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                parts.append(re.escape(char))
+                i += 1
+                continue
+            content = pattern[i + 1:end]
+            if content[0] in '!^':
+                content = '^' + content[1:]
+            parts.append('[' + content.replace('\\', '\\\\') + ']')
+            i = end + 1
+        elif char == '\\' and i + 1 < len(pattern):
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(char))
+            i += 1
+    body = ''.join(parts)
+    return body if anchored else '(?:.*/)?' + body
+
+
+def parse_rules(lines):
+    """返回[(正则, 是否取消忽略, 是否只匹配目录)]"""
+    rules = []
+    for line in lines:
+        line = line.rstrip('\n').rstrip('\r')
+        # 结尾的空格被忽略，除非用反斜杠转义
+        stripped = line.rstrip(' ')
+        if stripped.endswith('\\') and len(stripped) < len(line):
+            stripped += ' '
+        line = stripped
+        if not line or line.startswith('#'):
+            continue
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        elif line.startswith('\\#') or line.startswith('\\!'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            continue
+        rules.append((glob_to_regex(line), negate, dir_only))
+    return rules
+
+
+class RuleSet:
+    """一个规则文件编译后的结果"""
+
+    def __init__(self, rules):
+        self.has_negation = any(negate for _, negate, _ in rules)
+        if self.has_negation:
+            # 从后往前找第一条匹配的规则
+            self.rules = [(re.compile(regex + '$', re.DOTALL), negate, dir_only)
+                          for regex, negate, dir_only in reversed(rules)]
+        else:
+            self.dir_pattern = self.combine(regex for regex, _, _ in rules)
+            self.file_pattern = self.combine(regex for regex, _, dir_only in rules if not dir_only)
+
+    @staticmethod
+    def combine(regexes):
+        regexes = list(regexes)
+        if not regexes:
+            return None
+        return re.compile('(?:' + '|'.join(regexes) + ')$', re.DOTALL)
+
+    def match(self, rel_path, is_dir):
+        """True表示忽略，False表示明确不忽略，None表示没有规则匹配"""
+        if self.has_negation:
+            for pattern, negate, dir_only in self.rules:
+                if dir_only and not is_dir:
+                    continue
+                if pattern.match(rel_path):
+                    return not negate
+            return None
+        pattern = self.dir_pattern if is_dir else self.file_pattern
+        if pattern is not None and pattern.match(rel_path):
+            return True
+        return None
+
+
+class IgnoreRules:
+    def __init__(self, root, defaults=DEFAULT_RULES):
+        self.root = os.path.abspath(root)
+        self.defaults = RuleSet(parse_rules(defaults))
+        self.cache = {}  # 规则文件路径 -> (修改时间, RuleSet)
+
+    def load(self, path):
+        """读取并编译规则文件，文件没有变化时使用缓存；文件不存在返回None"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.cache.pop(path, None)
+            return None
+        cached = self.cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                rule_set = RuleSet(parse_rules(f))
+        except OSError:
+            return None
+        self.cache[path] = (mtime, rule_set)
+        return rule_set
+
+    def rule_sets(self, directory):
+        """对 directory 中的条目生效的规则，按优先级从高到低返回[(规则所在目录, RuleSet)]"""
+        directory = os.path.abspath(directory)
+        rel = os.path.relpath(directory, self.root)
+        dirs = [self.root]
+        if rel != '.' and not rel.startswith('..'):
+            for part in rel.split(os.sep):
+                dirs.append(os.path.join(dirs[-1], part))
+
+        result = []
+        for base in reversed(dirs):
+            for name in IGNORE_FILES:
+                rule_set = self.load(os.path.join(base, name))
+                if rule_set:
+                    result.append((base, rule_set))
+        project_rules = self.load(os.path.join(self.root, PROJECT_IGNORE_FILE))
+        # .ecignore 排在根目录的 .gitignore 前面
+        root_index = len(result) - sum(1 for base, _ in result if base == self.root)
+        if project_rules:
+            result.insert(root_index, (self.root, project_rules))
+        result.append((self.root, self.defaults))
+        return result
+
+    def matcher(self, directory):
+        """返回 is_ignored(名称, 是否目录)，用于判断 directory 中的条目；规则只在这里查找一次"""
+        directory = os.path.abspath(directory)
+        prefixes = []
+        for base, rule_set in self.rule_sets(directory):
+            rel = os.path.relpath(directory, base)
+            prefixes.append(('' if rel == '.' else rel.replace(os.sep, '/') + '/', rule_set))
+
+        def is_ignored(name, is_dir):
+            for prefix, rule_set in prefixes:
+                result = rule_set.match(prefix + name, is_dir)
+                if result is not None:
+                    return result
+            return False
+        return is_ignored
+
+    def is_ignored(self, path, is_dir=None):
+        """判断项目中的任意路径，任何一级上级目录被忽略时也算忽略"""
+        path = os.path.abspath(path)
+        rel = os.path.relpath(path, self.root)
+        if rel == '.' or rel.startswith('..'):
+            return False
+        if is_dir is None:
+            is_dir = os.path.isdir(path)
+        parts = rel.split(os.sep)
+        directory = self.root
+        for index, part in enumerate(parts):
+            last = index == len(parts) - 1
+            if self.matcher(directory)(part, is_dir if last else True):
+                return True
+            directory = os.path.join(directory, part)
+        return False
+
+    def walk(self, top=None):
+        """遍历项目中没有被忽略的文件，被忽略的目录不会进入"""
+        stack = [top or self.root]
+        while stack:
+            directory = stack.pop()
+            is_ignored = self.matcher(directory)
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in sorted(entries, key=lambda e: e.name):
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if is_ignored(entry.name, is_dir):
+                    continue
+                if is_dir:
+                    stack.append(entry.path)
+                else:
+                    yield entry.path
@@ -1,14 +1,125 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import requests
+import atexit
+import codecs
 import json
 import os
+import signal
 import subprocess
 import sys
 import threading
+import time
 import queue
+from collections import OrderedDict
+from urllib.parse import urlparse
 from pathlib import Path
 
+from console_session import create_session
+from ignore_rules import IgnoreRules
+from project_watcher import ProjectModel, create_watcher, is_under
+
+TREE_CHUNK_SIZE = 200  # 大目录每次插入文件树的节点数，其余分批在后续事件循环中插入
+RUN_POLL_MS = 50  # 运行中的程序输出刷新到界面的间隔
+RUN_POLL_MAX_CHARS = 64 * 1024  # 每次刷新最多写入的字符数，其余留到下一次，输出很快时界面仍能响应
+MAX_OUTPUT_LINES = 5000  # 输出区域最多保留的行数，死循环打印时界面不会越来越慢
+
+
+class ServerCache:
+    """本地HTTP缓存：保存ETag/Last-Modified，重复请求时发送条件请求"""
+
+    MAX_ENTRIES = 500
+    MAX_BYTES = 20 * 1024 * 1024  # 按响应JSON的长度估算
+    SAVE_DELAY = 2.0  # 修改后延迟写盘，连续拉取多个文件时只写一次
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # 按最近使用排序，最久未用的在前
+        self.total_bytes = 0
+        self.save_timer = None
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                for url, entry in json.load(f).items():
+                    entry.setdefault("size", len(json.dumps(entry.get("data"), ensure_ascii=False)))
+                    self.entries[url] = entry
+                    self.total_bytes += entry["size"]
+        except (OSError, ValueError, AttributeError):
+            self.entries = OrderedDict()
+            self.total_bytes = 0
+        with self.lock:
+            self.evict()
+        atexit.register(self.save)
+
+    def get_json(self, url, headers=None, **kwargs):
+        """GET请求，服务器返回304时直接使用本地缓存"""
+        headers = dict(headers or {})
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry:
+                self.entries.move_to_end(url)
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = requests.get(url, headers=headers, **kwargs)
+        if response.status_code == 304 and entry:
+            return entry["data"]
+
+        data = response.json()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.ok and data.get("success") and (etag or last_modified):
+            size = len(json.dumps(data, ensure_ascii=False))
+            with self.lock:
+                old = self.entries.pop(url, None)
+                if old:
+                    self.total_bytes -= old["size"]
+                self.entries[url] = {"etag": etag, "last_modified": last_modified, "data": data, "size": size}
+                self.total_bytes += size
+                self.evict()
+            self.schedule_save()
+        return data
+
+    def evict(self):
+        """超过条数或大小上限时淘汰最久未用的条目（调用方持有锁）"""
+        while self.entries and (len(self.entries) > self.MAX_ENTRIES or self.total_bytes > self.MAX_BYTES):
+            _, entry = self.entries.popitem(last=False)
+            self.total_bytes -= entry["size"]
+
+    def schedule_save(self):
+        with self.lock:
+            if self.save_timer is not None:
+                return
+            self.save_timer = threading.Timer(self.SAVE_DELAY, self.save)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def save(self):
+        """写入缓存文件（先写临时文件再替换，避免中途退出损坏缓存）"""
+        with self.lock:
+            if self.save_timer is not None:
+                self.save_timer.cancel()
+                self.save_timer = None
+            snapshot = json.dumps(self.entries, ensure_ascii=False)
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(snapshot)
+            os.replace(tmp_file, self.cache_file)
+        except OSError:
+            pass
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.entries = OrderedDict()
+            self.total_bytes = 0
+        self.save()
+
 
 class PythonIDEClient:
     def __init__(self, root):
@@ -25,12 +136,27 @@ class PythonIDEClient:
         self.current_project_path = None
         self.current_file_path = None
 
+        # 服务器数据本地缓存（ETag条件请求）
+        self.server_cache = ServerCache(os.path.join(str(Path.home()), ".ec_ide", "http_cache.json"))
+        self.remote_projects = {}  # 项目名 -> 项目ID
+
         # 文件排序设置
         self.sort_ascending = True  # 默认升序排列
+        self.tree_generation = 0  # 重新加载项目时递增，旧的分批插入任务随之作废
+        self.project_model = None  # 已展开目录的内存模型
+        self.ignore_rules = None  # 项目的 .gitignore/.ecignore 规则
+        self.tree_items = {}  # 路径 -> 文件树节点
+        self.project_watcher = None  # 第一次导入项目时创建
+
+        # 本地运行的程序
+        self.run_process = None
+        self.run_started = None
+        self.run_stopped = False
 
         # 控制台相关
-        self.console_process = None
         self.console_queue = queue.Queue()
+        self.console_env = None  # 控制台命令的环境变量，None表示继承当前环境
+        self.console_tabs = {}  # 标签页 -> {"frame", "text", "cwd", "session"}
 
         # 创建界面
         self.create_widgets()
@@ -38,6 +164,9 @@ class PythonIDEClient:
         # 启动控制台输出监控
         self.start_console_monitor()
 
+        # 服务器提供本地包索引时，pip从服务器安装
+        self.configure_package_index()
+
     def create_widgets(self):
         # 创建主框架
         main_frame = ttk.Frame(self.root)
@@ -121,6 +250,7 @@ class PythonIDEClient:
         hsb.pack(side=tk.BOTTOM, fill=tk.X)
 
         self.file_tree.bind("<Double-1>", self.on_file_select)
+        self.file_tree.bind("<<TreeviewOpen>>", self.on_tree_open)
 
         # 右侧区域 - 使用垂直分割
         right_paned = ttk.PanedWindow(main_paned, orient=tk.VERTICAL)
@@ -136,9 +266,14 @@ class PythonIDEClient:
 
         self.file_label = ttk.Label(editor_toolbar, text="未打开文件")
         self.file_label.pack(side=tk.LEFT)
+        self.run_status_label = ttk.Label(editor_toolbar, text="")
+        self.run_status_label.pack(side=tk.LEFT, padx=(10, 0))
 
         ttk.Button(editor_toolbar, text="保存", command=self.save_file).pack(side=tk.RIGHT, padx=(5, 0))
+        self.stop_button = ttk.Button(editor_toolbar, text="停止", command=self.stop_code, state=tk.DISABLED)
+        self.stop_button.pack(side=tk.RIGHT, padx=(5, 0))
         ttk.Button(editor_toolbar, text="运行", command=self.run_code).pack(side=tk.RIGHT, padx=(5, 0))
+        ttk.Button(editor_toolbar, text="远程运行", command=self.run_code_remote).pack(side=tk.RIGHT, padx=(5, 0))
         ttk.Button(editor_toolbar, text="提交到服务器", command=self.submit_code).pack(side=tk.RIGHT, padx=(5, 0))
 
         # 代码编辑器
@@ -155,6 +290,7 @@ class PythonIDEClient:
 
         self.output_text = scrolledtext.ScrolledText(output_frame, height=8, font=("Consolas", 10))
         self.output_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.output_text.tag_config("stderr", foreground="red")
 
         # 控制台页面
         console_frame = ttk.Frame(bottom_notebook)
@@ -168,11 +304,16 @@ class PythonIDEClient:
         ttk.Button(console_toolbar, text="列出已安装", command=self.list_packages).pack(side=tk.LEFT, padx=(5, 0))
         ttk.Button(console_toolbar, text="清空", command=self.clear_console).pack(side=tk.LEFT, padx=(5, 0))
         ttk.Button(console_toolbar, text="创建虚拟环境", command=self.create_venv).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Button(console_toolbar, text="关闭终端", command=self.close_console_tab).pack(side=tk.RIGHT)
+        ttk.Button(console_toolbar, text="新建终端", command=self.add_console_tab).pack(side=tk.RIGHT, padx=(0, 5))
+        ttk.Button(console_toolbar, text="中断 (Ctrl+C)", command=self.interrupt_console).pack(side=tk.RIGHT,
+                                                                                               padx=(0, 5))
 
-        # 控制台输出
-        self.console_text = scrolledtext.ScrolledText(console_frame, height=8, font=("Consolas", 10),
-                                                      background="black", foreground="green")
-        self.console_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        # 控制台输出，每个标签页一个shell会话
+        self.console_notebook = ttk.Notebook(console_frame)
+        self.console_notebook.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.console_notebook.bind("<<NotebookTabChanged>>", self.on_console_tab_changed)
+        self.add_console_tab()
 
         # 控制台输入
         console_input_frame = ttk.Frame(console_frame)
@@ -182,6 +323,7 @@ class PythonIDEClient:
         self.console_input = ttk.Entry(console_input_frame, font=("Consolas", 10))
         self.console_input.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 0))
         self.console_input.bind("<Return>", self.execute_console_command)
+        self.console_input.bind("<Control-c>", self.interrupt_console)
 
         ttk.Button(console_input_frame, text="执行", command=lambda: self.execute_console_command(None)).pack(
             side=tk.RIGHT, padx=(5, 0))
@@ -320,8 +462,8 @@ class PythonIDEClient:
 
         ttk.Button(project_toolbar, text="刷新项目列表", command=lambda: self.refresh_project_list(project_combo)).pack(
             side=tk.LEFT, padx=(5, 0))
-        ttk.Button(project_toolbar, text="拉取项目", command=lambda: self.pull_project(project_combo)).pack(
-            side=tk.LEFT, padx=(5, 0))
+        ttk.Button(project_toolbar, text="拉取项目",
+                   command=lambda: self.pull_project(project_combo, project_info_text)).pack(side=tk.LEFT, padx=(5, 0))
 
         # 项目详情区域
         project_info_frame = ttk.LabelFrame(project_frame, text="项目详情")
@@ -330,6 +472,8 @@ class PythonIDEClient:
         project_info_text = scrolledtext.ScrolledText(project_info_frame, height=15, font=("Consolas", 10))
         project_info_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         project_info_text.insert(tk.END, "选择项目后显示详情信息...")
+        project_combo.bind("<<ComboboxSelected>>",
+                           lambda e: self.show_project_detail(project_combo, project_info_text))
 
         # 初始化用户列表
         self.refresh_user_list(user_tree)
@@ -516,18 +660,82 @@ class PythonIDEClient:
                 messagebox.showerror("错误", f"连接服务器失败: {str(e)}")
 
     def refresh_project_list(self, project_combo):
-        """刷新项目列表（预留功能）"""
-        # 这里只是模拟数据，实际应该从服务器获取项目列表
-        projects = ["项目A", "项目B", "项目C"]
-        project_combo['values'] = projects
-        if projects:
-            project_combo.set(projects[0])
-
-    def pull_project(self, project_combo):
-        """拉取项目（预留功能）"""
+        """从服务器获取项目列表（带本地缓存）"""
+        token = self.token or self.admin_token
+        try:
+            headers = {"Authorization": f"Bearer {token}"}
+            data = self.server_cache.get_json(f"{self.server_url}/projects", headers=headers)
+
+            if data.get("success"):
+                self.remote_projects = {p["name"]: p["id"] for p in data.get("projects", [])}
+                projects = list(self.remote_projects)
+                project_combo['values'] = projects
+                if projects:
+                    project_combo.set(projects[0])
+            else:
+                messagebox.showerror("错误", data.get("message", "获取项目列表失败"))
+        except Exception as e:
+            messagebox.showerror("错误", f"连接服务器失败: {str(e)}")
+
+    def get_remote_project_files(self, project_name):
+        """获取服务器上某个项目的文件列表"""
+        project_id = self.remote_projects.get(project_name)
+        if project_id is None:
+            return []
+        headers = {"Authorization": f"Bearer {self.token or self.admin_token}"}
+        data = self.server_cache.get_json(f"{self.server_url}/project/{project_id}/files", headers=headers)
+        if not data.get("success"):
+            raise Exception(data.get("message", "获取文件列表失败"))
+        return data.get("files", [])
+
+    def show_project_detail(self, project_combo, info_text):
+        """显示项目详情"""
+        project_name = project_combo.get()
+        try:
+            files = self.get_remote_project_files(project_name)
+        except Exception as e:
+            messagebox.showerror("错误", f"连接服务器失败: {str(e)}")
+            return
+
+        info_text.delete(1.0, tk.END)
+        info_text.insert(tk.END, f"项目: {project_name}\n文件数: {len(files)}\n\n")
+        for file in files:
+            info_text.insert(tk.END, f"{file['filename']}    更新于 {file['updated_at']}\n")
+
+    def pull_project(self, project_combo, info_text):
+        """拉取项目到本地目录（未变化的文件直接使用本地缓存）"""
         selected_project = project_combo.get()
-        if selected_project:
-            messagebox.showinfo("提示", f"准备拉取项目: {selected_project}\n此功能待实现")
+        if not selected_project:
+            return
+
+        target_dir = filedialog.askdirectory(title="选择保存位置")
+        if not target_dir:
+            return
+
+        try:
+            headers = {"Authorization": f"Bearer {self.token or self.admin_token}"}
+            project_path = os.path.join(target_dir, selected_project)
+            files = self.get_remote_project_files(selected_project)
+            for file in files:
+                data = self.server_cache.get_json(f"{self.server_url}/file/{file['id']}", headers=headers)
+                if not data.get("success"):
+                    raise Exception(data.get("message", "获取文件失败"))
+
+                file_path = os.path.normpath(os.path.join(project_path, data["file"]["filename"]))
+                if not file_path.startswith(os.path.normpath(project_path) + os.sep):
+                    continue  # 跳过越出项目目录的路径
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    f.write(data["file"]["content"])
+
+            self.show_project_detail(project_combo, info_text)
+            self.current_project_path = project_path
+            self.project_label.config(text=f"项目: {selected_project}")
+            self.load_project_files(project_path)
+            self.open_project_console(project_path)
+            messagebox.showinfo("成功", f"已拉取 {len(files)} 个文件到 {project_path}")
+        except Exception as e:
+            messagebox.showerror("错误", f"拉取项目失败: {str(e)}")
 
     def show_register_dialog(self):
         """显示注册对话框"""
@@ -675,47 +883,147 @@ class PythonIDEClient:
         messagebox.showinfo("提示", "已退出管理员登录")
 
     def sort_ascending_order(self):
-        """设置升序排列并刷新文件树"""
+        """设置升序排列，在内存中重新排列文件树"""
         self.sort_ascending = True
-        if self.current_project_path:
-            self.load_project_files(self.current_project_path)
+        if self.project_model:
+            self.resort_tree()
             messagebox.showinfo("排序", "已设置为升序排列")
 
     def sort_descending_order(self):
-        """设置降序排列并刷新文件树"""
+        """设置降序排列，在内存中重新排列文件树"""
         self.sort_ascending = False
-        if self.current_project_path:
-            self.load_project_files(self.current_project_path)
+        if self.project_model:
+            self.resort_tree()
             messagebox.showinfo("排序", "已设置为降序排列")
 
+    def resort_tree(self):
+        self.project_model.ascending = self.sort_ascending
+        for path in self.project_model.dirs:
+            item = self.tree_items.get(path)
+            if item is not None:
+                self.sort_tree_children(item)
+
+    def sort_tree_children(self, item):
+        children = self.file_tree.get_children(item)
+        ordered = sorted(children, key=self.tree_item_name, reverse=not self.sort_ascending)
+        self.file_tree.set_children(item, *ordered)
+
+    def tree_item_name(self, item):
+        return os.path.basename(self.file_tree.item(item, "values")[0])
+
     def add_files_to_tree(self, folder_path, parent_item):
-        """添加文件和文件夹到树中，根据排序设置进行排序"""
-        try:
-            items = []
-            for item in os.listdir(folder_path):
-                if item.startswith('.'):  # 跳过隐藏文件
-                    continue
-                items.append(item)
+        """读取一层目录加入树中，根据排序设置进行排序；子目录先放占位节点，展开时再读取"""
+        entries = self.project_model.load(folder_path)
+        self.project_watcher.set_dirs(self.project_model.dirs)
+        self.insert_tree_entries(parent_item, entries, 0, self.tree_generation, self.sort_ascending)
+
+    def insert_tree_entries(self, parent_item, entries, start, generation, ascending):
+        """分批插入目录项，每批之后让出事件循环，大目录不会卡住界面"""
+        if generation != self.tree_generation or not self.file_tree.exists(parent_item):
+            return
 
-            # 根据排序设置进行排序
-            if self.sort_ascending:
-                items.sort()  # 升序排列
+        end = start + TREE_CHUNK_SIZE
+        for name, path, is_dir in entries[start:end]:
+            if path not in self.tree_items:  # 可能已经由文件监视加入
+                self.insert_tree_node(parent_item, "end", name, path, is_dir)
+
+        if end < len(entries):
+            self.root.after(1, self.insert_tree_entries, parent_item, entries, end, generation, ascending)
+        elif ascending != self.sort_ascending:
+            # 插入过程中切换了排序
+            self.sort_tree_children(parent_item)
+
+    def insert_tree_node(self, parent_item, index, name, path, is_dir):
+        if is_dir:
+            # 文件夹
+            item = self.file_tree.insert(parent_item, index, text=f"📁 {name}", values=[path])
+            self.file_tree.insert(item, "end", text="加载中...", values=[""], tags=("placeholder",))
+        else:
+            # 文件
+            icon = "🐍" if name.endswith('.py') else "📄"
+            item = self.file_tree.insert(parent_item, index, text=f"{icon} {name}", values=[path])
+        self.tree_items[path] = item
+        return item
+
+    def tree_insert_index(self, parent_item, name):
+        """按当前排序，name 在 parent_item 子节点中的位置"""
+        children = self.file_tree.get_children(parent_item)
+        for index, child in enumerate(children):
+            other = self.tree_item_name(child)
+            if (other > name) if self.sort_ascending else (other < name):
+                return index
+        return len(children)
+
+    def forget_tree_items(self, path):
+        for key in [key for key in self.tree_items if is_under(key, path)]:
+            del self.tree_items[key]
+
+    def on_fs_change(self, dirs):
+        """文件监视线程的回调，交给界面线程处理"""
+        self.root.after(0, self.apply_fs_changes, dirs)
+
+    def apply_fs_changes(self, dirs):
+        """重新读取变化的目录，把新增、删除和改名增量应用到文件树"""
+        if not self.project_model:
+            return
+        for change in self.project_model.refresh(dirs):
+            if change[0] == "added":
+                self.tree_add(change[1], change[2])
+            elif change[0] == "removed":
+                self.tree_remove(change[1])
             else:
-                items.sort(reverse=True)  # 降序排列
+                self.tree_move(change[1], change[2], change[3])
+        self.project_watcher.set_dirs(self.project_model.dirs)
 
-            for item in items:
-                item_path = os.path.join(folder_path, item)
+    def tree_add(self, path, is_dir):
+        parent_item = self.tree_items.get(os.path.dirname(path))
+        if parent_item is None or path in self.tree_items:
+            return
+        name = os.path.basename(path)
+        self.insert_tree_node(parent_item, self.tree_insert_index(parent_item, name), name, path, is_dir)
 
-                if os.path.isdir(item_path):
-                    # 文件夹
-                    folder_item = self.file_tree.insert(parent_item, "end", text=f"📁 {item}", values=[item_path])
-                    self.add_files_to_tree(item_path, folder_item)
-                else:
-                    # 文件
-                    icon = "🐍" if item.endswith('.py') else "📄"
-                    self.file_tree.insert(parent_item, "end", text=f"{icon} {item}", values=[item_path])
-        except PermissionError:
-            pass
+    def tree_remove(self, path):
+        item = self.tree_items.get(path)
+        if item is None:
+            return
+        self.forget_tree_items(path)
+        if self.file_tree.exists(item):
+            self.file_tree.delete(item)
+
+    def tree_move(self, old_path, new_path, is_dir):
+        item = self.tree_items.get(old_path)
+        parent_item = self.tree_items.get(os.path.dirname(new_path))
+        if item is None:
+            self.tree_add(new_path, is_dir)
+            return
+        if parent_item is None:
+            # 移到了没有展开的目录
+            self.tree_remove(old_path)
+            return
+
+        # 节点和已展开的子节点换成新路径，展开状态保留
+        for key in [key for key in self.tree_items if is_under(key, old_path)]:
+            child = self.tree_items.pop(key)
+            child_path = new_path + key[len(old_path):]
+            self.tree_items[child_path] = child
+            self.file_tree.item(child, values=[child_path])
+        name = os.path.basename(new_path)
+        icon = "📁" if is_dir else ("🐍" if name.endswith('.py') else "📄")
+        self.file_tree.item(item, text=f"{icon} {name}")
+        self.file_tree.detach(item)
+        self.file_tree.move(item, parent_item, self.tree_insert_index(parent_item, name))
+
+        if self.current_file_path and is_under(self.current_file_path, old_path):
+            self.current_file_path = new_path + self.current_file_path[len(old_path):]
+            self.file_label.config(text=f"当前文件: {os.path.basename(self.current_file_path)}")
+
+    def on_tree_open(self, event):
+        """第一次展开目录时读取目录内容"""
+        item = self.file_tree.focus()
+        children = self.file_tree.get_children(item)
+        if len(children) == 1 and "placeholder" in self.file_tree.item(children[0], "tags"):
+            self.file_tree.delete(children[0])
+            self.add_files_to_tree(self.file_tree.item(item, "values")[0], item)
 
     def start_console_monitor(self):
         """启动控制台输出监控线程"""
@@ -723,8 +1031,8 @@ class PythonIDEClient:
         def monitor():
             while True:
                 try:
-                    output = self.console_queue.get(timeout=0.1)
-                    self.root.after(0, self.update_console_output, output)
+                    text_widget, output = self.console_queue.get(timeout=0.1)
+                    self.root.after(0, self.update_console_output, text_widget, output)
                 except queue.Empty:
                     continue
                 except:
@@ -733,50 +1041,129 @@ class PythonIDEClient:
         monitor_thread = threading.Thread(target=monitor, daemon=True)
         monitor_thread.start()
 
-    def update_console_output(self, output):
-        """更新控制台输出"""
-        self.console_text.insert(tk.END, output)
-        self.console_text.see(tk.END)
+    def update_console_output(self, text_widget, output):
+        """更新控制台输出，text_widget为None时写入当前标签页"""
+        text_widget = text_widget or self.console_text
+        if not text_widget.winfo_exists():
+            return  # 标签页已关闭
+
+        parts = output.split("\r")
+        text_widget.insert(tk.END, parts[0])
+        for part in parts[1:]:
+            # 单独的\r回到行首，进度条覆盖当前行
+            text_widget.delete("end-1c linestart", "end-1c")
+            text_widget.insert(tk.END, part)
+
+        lines = int(text_widget.index("end-1c").split(".")[0])
+        if lines > MAX_OUTPUT_LINES:
+            text_widget.delete("1.0", f"{lines - MAX_OUTPUT_LINES + 1}.0")
+        text_widget.see(tk.END)
+
+    def add_console_tab(self, cwd=None):
+        """新建控制台标签页，shell在第一次执行命令时启动"""
+        cwd = cwd or self.current_project_path or os.getcwd()
+        frame = ttk.Frame(self.console_notebook)
+        text = scrolledtext.ScrolledText(frame, height=8, font=("Consolas", 10),
+                                         background="black", foreground="green")
+        text.pack(fill=tk.BOTH, expand=True)
+        tab = {"frame": frame, "text": text, "cwd": cwd, "session": None}
+        self.console_tabs[str(frame)] = tab
+        self.console_notebook.add(frame, text=os.path.basename(os.path.normpath(cwd)) or cwd)
+        self.select_console_tab(tab)
+        return tab
+
+    def select_console_tab(self, tab):
+        self.console_notebook.select(tab["frame"])
+        self.console_text = tab["text"]
+
+    def current_console_tab(self):
+        return self.console_tabs[self.console_notebook.select()]
+
+    def on_console_tab_changed(self, event):
+        tab = self.console_tabs.get(self.console_notebook.select())
+        if tab:
+            self.console_text = tab["text"]
+
+    def open_project_console(self, project_path):
+        """每个项目一个控制台会话，已经打开过时切换过去"""
+        for tab in self.console_tabs.values():
+            if tab["cwd"] == project_path:
+                self.select_console_tab(tab)
+                return
+        self.add_console_tab(project_path)
+
+    def close_console_tab(self):
+        tab = self.current_console_tab()
+        if tab["session"]:
+            tab["session"].close()
+        del self.console_tabs[str(tab["frame"])]
+        self.console_notebook.forget(tab["frame"])
+        tab["frame"].destroy()
+        if not self.console_tabs:
+            self.add_console_tab()
+
+    def console_session(self, tab):
+        """标签页的shell会话，没有启动或已经退出时启动一个新的"""
+        session = tab["session"]
+        if session and session.alive:
+            return session
+
+        text_widget = tab["text"]
+
+        def on_exit(returncode):
+            self.console_queue.put((text_widget, f"\n会话已结束，返回码: {returncode}（执行命令会启动新的会话）\n"))
+
+        # 服务器包索引的检测在后台进行，会话启动时才读取环境变量
+        env = dict(self.console_env or os.environ)
+        session = create_session(tab["cwd"], env, lambda output: self.console_queue.put((text_widget, output)),
+                                 on_exit)
+        session.start()
+        tab["session"] = session
+        return session
+
+    def interrupt_console(self, event=None):
+        """向当前会话的前台程序发送Ctrl+C"""
+        if event is not None and self.console_input.selection_present():
+            return None  # 有选中的文字时保留复制
+        session = self.current_console_tab()["session"]
+        if session and session.alive:
+            session.interrupt()
+        return "break"
+
+    def configure_package_index(self):
+        """在后台检测服务器的本地包索引（/simple/），可用时控制台中的pip命令都从它安装"""
+        index_url = os.environ.get("EC_PACKAGE_INDEX_URL") or self.server_url.rsplit("/api", 1)[0] + "/simple/"
+
+        def probe():
+            try:
+                response = requests.get(index_url, timeout=3)
+            except requests.RequestException:
+                return
+            if response.status_code != 200:
+                return
+            env = os.environ.copy()
+            env["PIP_INDEX_URL"] = index_url
+            # 局域网内的索引一般没有HTTPS证书
+            env["PIP_TRUSTED_HOST"] = urlparse(index_url).hostname or ""
+            self.console_env = env
+            self.console_queue.put((None, f"pip 将从服务器的包索引安装: {index_url}\n"))
+
+        threading.Thread(target=probe, daemon=True).start()
 
     def execute_console_command(self, event):
-        """执行控制台命令"""
-        command = self.console_input.get().strip()
-        if not command:
+        """把命令发送到当前标签页的shell会话，输出由读取线程实时送回"""
+        command = self.console_input.get()
+        if not command.strip() and event is None:
             return
 
         self.console_input.delete(0, tk.END)
 
-        # 显示命令
-        self.console_text.insert(tk.END, f"$ {command}\n")
-        self.console_text.see(tk.END)
-
-        # 在后台线程执行命令
-        def run_command():
-            try:
-                # 设置工作目录
-                cwd = self.current_project_path if self.current_project_path else os.getcwd()
-
-                # 执行命令
-                result = subprocess.run(
-                    command, shell=True, capture_output=True, text=True,
-                    cwd=cwd, timeout=30
-                )
-
-                # 输出结果
-                if result.stdout:
-                    self.console_queue.put(result.stdout)
-                if result.stderr:
-                    self.console_queue.put(f"错误: {result.stderr}")
-
-                self.console_queue.put(f"命令完成，返回码: {result.returncode}\n\n")
-
-            except subprocess.TimeoutExpired:
-                self.console_queue.put("命令执行超时\n\n")
-            except Exception as e:
-                self.console_queue.put(f"执行错误: {str(e)}\n\n")
-
-        thread = threading.Thread(target=run_command, daemon=True)
-        thread.start()
+        # 空行也发送，交互式程序可能在等待回车
+        try:
+            self.console_session(self.current_console_tab()).send_line(command)
+        except OSError as e:
+            self.console_text.insert(tk.END, f"执行错误: {str(e)}\n\n")
+            self.console_text.see(tk.END)
 
     def show_install_package_dialog(self):
         """显示安装包对话框"""
@@ -958,6 +1345,7 @@ class PythonIDEClient:
             self.current_project_path = folder_path
             self.project_label.config(text=f"项目: {os.path.basename(folder_path)}")
             self.load_project_files(folder_path)
+            self.open_project_console(folder_path)
 
             # 在控制台显示项目信息
             self.console_text.insert(tk.END, f"已导入项目: {folder_path}\n")
@@ -965,6 +1353,12 @@ class PythonIDEClient:
             self.console_text.see(tk.END)
 
     def load_project_files(self, folder_path):
+        self.tree_generation += 1
+        self.ignore_rules = IgnoreRules(folder_path)
+        self.project_model = ProjectModel(folder_path, self.sort_ascending, self.ignore_rules)
+        if self.project_watcher is None:
+            self.project_watcher = create_watcher(self.on_fs_change)
+
         # 清空文件树
         for item in self.file_tree.get_children():
             self.file_tree.delete(item)
@@ -972,8 +1366,9 @@ class PythonIDEClient:
         # 添加项目根目录
         project_name = os.path.basename(folder_path)
         root_item = self.file_tree.insert("", "end", text=project_name, values=[folder_path])
+        self.tree_items = {folder_path: root_item}
 
-        # 递归添加文件和文件夹
+        # 只添加第一层，子目录展开时再加载
         self.add_files_to_tree(folder_path, root_item)
 
         # 展开根目录
@@ -1015,7 +1410,8 @@ class PythonIDEClient:
                 with open(file_path, 'w', encoding='utf-8') as f:
                     f.write("# 新建的Python文件\n\n")
 
-                self.load_project_files(self.current_project_path)
+                # 不等文件监视，直接把新文件加入树中
+                self.apply_fs_changes([os.path.dirname(file_path)])
                 self.open_file(file_path)
             except Exception as e:
                 messagebox.showerror("错误", f"无法创建文件: {str(e)}")
@@ -1038,6 +1434,10 @@ class PythonIDEClient:
             messagebox.showwarning("警告", "没有打开的文件")
             return
 
+        if self.run_process and self.run_process.poll() is None:
+            messagebox.showwarning("警告", "程序正在运行，请先停止")
+            return
+
         # 先保存文件
         self.save_file()
 
@@ -1046,30 +1446,172 @@ class PythonIDEClient:
         self.output_text.insert(tk.END, f"运行文件: {self.current_file_path}\n")
         self.output_text.insert(tk.END, "=" * 50 + "\n")
 
+        # 子进程输出不缓冲，并显式指定编码为utf-8
+        env = os.environ.copy()
+        env["PYTHONIOENCODING"] = "utf-8"
+        env["PYTHONUNBUFFERED"] = "1"
+        if os.name == "nt":
+            options = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            options = {"start_new_session": True}  # 独立的进程组，停止时连同它启动的子进程一起结束
+
         try:
-            # 在文件所在目录运行Python脚本，并显式指定编码为utf-8
-            result = subprocess.run(
+            # 在文件所在目录运行Python脚本
+            process = subprocess.Popen(
                 [sys.executable, self.current_file_path],
-                capture_output=True,
-                text=True,
-                encoding='utf-8',  # 显式指定编码
-                cwd=os.path.dirname(self.current_file_path)
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=os.path.dirname(self.current_file_path),
+                env=env,
+                **options
             )
+        except OSError as e:
+            self.append_output(f"运行失败: {str(e)}\n")
+            return
 
-            if result.stdout:
-                self.output_text.insert(tk.END, "输出:\n")
-                self.output_text.insert(tk.END, result.stdout)
+        self.run_process = process
+        self.run_started = time.monotonic()
+        self.run_stopped = False
+        self.stop_button.config(state=tk.NORMAL)
+
+        # 有界队列：输出太快时读取线程等待界面，而不是无限占用内存
+        output_queue = queue.Queue(maxsize=1000)
+        readers = [threading.Thread(target=self.read_run_output, args=(stream, tag, output_queue), daemon=True)
+                   for stream, tag in ((process.stdout, "stdout"), (process.stderr, "stderr"))]
+        for reader in readers:
+            reader.start()
+
+        def wait():
+            returncode = process.wait()
+            for reader in readers:
+                reader.join(timeout=2)  # 程序启动的后台进程可能还占着管道
+            output_queue.put(("exit", returncode))
+
+        threading.Thread(target=wait, daemon=True).start()
+        self.root.after(RUN_POLL_MS, self.poll_run_output, process, output_queue)
+
+    def read_run_output(self, stream, tag, output_queue):
+        """在后台线程中读取程序输出，有多少读多少，不等待换行"""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with stream:
+            while True:
+                data = stream.read1(4096)
+                if not data:
+                    break
+                output_queue.put((tag, decoder.decode(data)))
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            output_queue.put((tag, tail))
+
+    def poll_run_output(self, process, output_queue, exited=False):
+        """把读到的输出写入输出区域，更新运行时间；程序结束后显示返回码"""
+        budget = RUN_POLL_MAX_CHARS
+        while budget > 0:
+            try:
+                tag, data = output_queue.get_nowait()
+            except queue.Empty:
+                break
+            if tag == "exit":
+                self.finish_run(process, data)
+                exited = True
+                continue
+            self.output_text.insert(tk.END, data, tag)
+            budget -= len(data)
+            lines = int(self.output_text.index("end-1c").split(".")[0])
+            if lines > MAX_OUTPUT_LINES:
+                self.output_text.delete("1.0", f"{lines - MAX_OUTPUT_LINES + 1}.0")
+        self.output_text.see(tk.END)
 
-            if result.stderr:
-                self.output_text.insert(tk.END, "\n错误:\n")
-                self.output_text.insert(tk.END, result.stderr)
+        if not exited:
+            self.run_status_label.config(text=f"运行中 {time.monotonic() - self.run_started:.1f} 秒")
+        if budget <= 0:
+            self.root.after(1, self.poll_run_output, process, output_queue, exited)  # 队列中还有输出
+        elif not exited or not output_queue.empty():
+            # 程序结束后，它启动的后台进程可能还在输出，继续读取，读取线程不会因队列满而阻塞
+            self.root.after(RUN_POLL_MS, self.poll_run_output, process, output_queue, exited)
+
+    def finish_run(self, process, returncode):
+        elapsed = time.monotonic() - self.run_started
+        status = f"\n程序退出，返回码: {returncode}，用时 {elapsed:.1f} 秒\n"
+        if self.run_stopped:
+            status += "（已被停止）\n"
+        self.append_output(status)
+        self.run_status_label.config(text=f"已结束，返回码 {returncode}")
+        self.stop_button.config(state=tk.DISABLED)
+        if self.run_process is process:
+            self.run_process = None
+
+    def stop_code(self):
+        """停止运行中的程序及其启动的子进程"""
+        process = self.run_process
+        if not process or process.poll() is not None:
+            return
+        self.run_stopped = True
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True)
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        # 忽略SIGTERM的程序2秒后强制结束
+        self.root.after(2000, self.kill_run_group, process)
 
-            self.output_text.insert(tk.END, f"\n程序退出，返回码: {result.returncode}\n")
+    def kill_run_group(self, process):
+        # 进程已退出并被回收后，它的进程号（也是进程组号）可能已分配给别的进程，不能再发信号
+        if process.poll() is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
 
-        except Exception as e:
-            self.output_text.insert(tk.END, f"运行失败: {str(e)}\n")
+    def run_code_remote(self):
+        """在服务器的沙箱中运行当前代码，输出实时显示"""
+        if not self.token:
+            messagebox.showwarning("警告", "请先登录")
+            return
 
-        # 滚动到底部
+        code = self.code_editor.get(1.0, tk.END)
+        if not code.strip():
+            messagebox.showwarning("警告", "没有可运行的代码")
+            return
+
+        # 清空输出
+        self.output_text.delete(1.0, tk.END)
+        self.output_text.insert(tk.END, f"远程运行: {self.current_file_path or '未保存的代码'}\n")
+        self.output_text.insert(tk.END, "=" * 50 + "\n")
+
+        def run():
+            headers = {"Authorization": f"Bearer {self.token}"}
+            try:
+                with requests.post(f"{self.server_url}/run", json={"code": code},
+                                   headers=headers, stream=True, timeout=(5, 60)) as response:
+                    if 'ndjson' not in response.headers.get('Content-Type', ''):
+                        message = response.json().get("message", "运行失败")
+                        self.root.after(0, self.append_output, f"运行失败: {message}\n")
+                        return
+
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        if 'data' in event:
+                            self.root.after(0, self.append_output, event['data'])
+                        else:
+                            status = f"\n程序退出，返回码: {event['exit_code']}，用时 {event['duration']} 秒\n"
+                            reasons = {'timeout': '运行超时', 'cpu_limit': 'CPU时间超限', 'output_limit': '输出过多'}
+                            if event.get('terminated'):
+                                status += f"（{reasons.get(event['terminated'], event['terminated'])}，已被终止）\n"
+                            self.root.after(0, self.append_output, status)
+            except Exception as e:
+                self.root.after(0, self.append_output, f"运行失败: {str(e)}\n")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def append_output(self, text):
+        self.output_text.insert(tk.END, text)
         self.output_text.see(tk.END)
 
     def submit_code(self):
@@ -1081,6 +1623,10 @@ class PythonIDEClient:
             messagebox.showwarning("警告", "请先打开项目和文件")
             return
 
+        if self.ignore_rules and self.ignore_rules.is_ignored(self.current_file_path, False):
+            messagebox.showwarning("警告", "该文件被 .gitignore/.ecignore 忽略，不能提交")
+            return
+
         # 先保存文件
         self.save_file()
 
@@ -0,0 +1,291 @@
+"""
+项目目录的内存模型和文件监视
+- 模型只保存展开过的目录，每个目录记录 名称 -> (是否目录, inode)；排序在内存中完成，不重新读盘
+- 监视器只报告"哪些目录变了"，模型重新读取这些目录并与快照比较，得到新增、删除和改名（同一inode）
+- Linux 使用 inotify（ctypes调用libc），其他平台或 inotify 不可用时定时比较目录的 scandir 快照
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+POLL_INTERVAL = 1.0  # 轮询间隔（秒）
+MAX_ALIASES = 256  # 记住最近多少次目录改名，用于把改名前的路径换成新路径
+DEBOUNCE = 0.1  # 事件停止这么久后再通知，编辑器保存时的一连串事件合并为一次
+MAX_DELAY = 1.0  # 事件持续不断时最多延迟这么久
+
+# <sys/inotify.h>
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def is_under(path, parent):
+    """path 是 parent 本身或在 parent 之下"""
+    return path == parent or path.startswith(parent + os.sep)
+
+
+class ProjectModel:
+    def __init__(self, root, ascending=True, ignore_rules=None):
+        self.root = root
+        self.ascending = ascending
+        self.ignore_rules = ignore_rules  # ignore_rules.IgnoreRules，被忽略的条目不进入模型
+        self.dirs = {}  # 已展开的目录 -> {名称: (是否目录, inode)}
+        # 改名前的目录 -> 新路径：模型改名后、监视器换成新路径之前，事件仍以旧路径报告
+        self.aliases = {}
+
+    def scan(self, path):
+        entries = {}
+        is_ignored = self.ignore_rules.matcher(path) if self.ignore_rules else None
+        # scandir返回的目录项带有文件类型，不需要对每一项再调用isdir
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.startswith('.'):  # 跳过隐藏文件
+                    continue
+                try:
+                    is_dir, inode = entry.is_dir(), entry.inode()
+                except OSError:
+                    is_dir, inode = False, 0
+                if is_ignored and is_ignored(entry.name, is_dir):
+                    continue
+                entries[entry.name] = (is_dir, inode)
+        return entries
+
+    def sort_names(self, names):
+        return sorted(names, reverse=not self.ascending)
+
+    def entries(self, path):
+        """目录的内容，按当前排序返回[(名称, 路径, 是否目录)]"""
+        children = self.dirs.get(path, {})
+        return [(name, os.path.join(path, name), children[name][0]) for name in self.sort_names(children)]
+
+    def resolve(self, path):
+        """把改名前的路径换成模型中的当前路径；同一路径后来又被展开时以模型为准"""
+        for _ in range(len(self.aliases) + 1):
+            if path in self.dirs:
+                return path
+            for old, new in reversed(list(self.aliases.items())):
+                if is_under(path, old):
+                    path = new + path[len(old):]
+                    break
+            else:
+                return path
+        return path
+
+    def load(self, path):
+        """读取一层目录并开始跟踪它"""
+        try:
+            self.dirs[path] = self.scan(path)
+        except OSError:
+            self.dirs[path] = {}
+        return self.entries(path)
+
+    def drop_dir(self, path):
+        for key in [key for key in self.dirs if is_under(key, path)]:
+            del self.dirs[key]
+        for old in [old for old, new in self.aliases.items() if is_under(new, path)]:
+            del self.aliases[old]
+
+    def move_dir(self, old, new):
+        for key in [key for key in self.dirs if is_under(key, old)]:
+            self.dirs[new + key[len(old):]] = self.dirs.pop(key)
+        # 新路径又有了目录，指向它下面的旧别名不再有效
+        for key in [key for key in self.aliases if is_under(key, new)]:
+            del self.aliases[key]
+        self.aliases.pop(old, None)
+        self.aliases[old] = new
+        while len(self.aliases) > MAX_ALIASES:
+            del self.aliases[next(iter(self.aliases))]
+
+    def refresh(self, paths):
+        """
+        重新读取发生变化的目录，返回变化列表：
+        ('added', 路径, 是否目录)、('removed', 路径, 是否目录)、('moved', 原路径, 新路径, 是否目录)
+        """
+        removed, added = [], []
+        for path in dict.fromkeys(self.resolve(path) for path in paths):
+            old = self.dirs.get(path)
+            if old is None:
+                continue  # 没有展开过，或已随上级目录删除/改名
+            try:
+                new = self.scan(path)
+            except OSError:
+                continue  # 目录本身已删除，由上级目录的变化处理
+            for name, (is_dir, inode) in old.items():
+                if name not in new or new[name][0] != is_dir:
+                    removed.append((os.path.join(path, name), is_dir, inode))
+            for name, (is_dir, inode) in new.items():
+                if name not in old or old[name][0] != is_dir:
+                    added.append((os.path.join(path, name), is_dir, inode))
+            self.dirs[path] = new
+
+        # 同一个inode从一处消失、在另一处出现，视为改名或移动
+        added_by_inode = {(inode, is_dir): path for path, is_dir, inode in added if inode}
+        changes = []
+        moved_to = set()
+        for path, is_dir, inode in removed:
+            new_path = added_by_inode.pop((inode, is_dir), None) if inode else None
+            if new_path:
+                changes.append(('moved', path, new_path, is_dir))
+                moved_to.add(new_path)
+                if is_dir and os.path.dirname(new_path) in self.dirs:
+                    self.move_dir(path, new_path)
+                elif is_dir:
+                    self.drop_dir(path)  # 移到了没有展开的目录，展开时重新读取
+            else:
+                changes.append(('removed', path, is_dir))
+                if is_dir:
+                    self.drop_dir(path)
+        for path, is_dir, inode in added:
+            if path not in moved_to:
+                changes.append(('added', path, is_dir))
+        return changes
+
+
+class InotifyWatcher:
+    """每个已展开的目录一个inotify监视，事件在后台线程中读取"""
+
+    def __init__(self, callback):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        self.callback = callback
+        self.lock = threading.Lock()
+        self.paths = {}  # 路径 -> wd
+        self.wds = {}  # wd -> 路径
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def set_dirs(self, dirs):
+        """监视的目录与模型中已展开的目录保持一致"""
+        dirs = set(dirs)
+        with self.lock:
+            for path in dirs - set(self.paths):
+                wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+                if wd < 0:
+                    continue  # 目录已不存在，或超过了 fs.inotify.max_user_watches
+                # 监视跟随inode，目录改名后重新添加会得到同一个wd
+                old = self.wds.get(wd)
+                if old is not None:
+                    self.paths.pop(old, None)
+                self.paths[path] = wd
+                self.wds[wd] = path
+            for path in set(self.paths) - dirs:
+                wd = self.paths.pop(path)
+                if self.wds.get(wd) == path:
+                    del self.wds[wd]
+                    self._rm_watch(self.fd, wd)
+
+    def changed_dirs(self, data):
+        dirs = set()
+        offset = 0
+        with self.lock:
+            while offset + _EVENT.size <= len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    dirs.update(self.paths)  # 事件丢失，所有目录都重新读取
+                    continue
+                path = self.wds.get(wd)
+                if mask & IN_IGNORED:
+                    # 目录已删除或监视已移除
+                    if path is not None and self.paths.get(path) == wd:
+                        del self.paths[path]
+                    self.wds.pop(wd, None)
+                    continue
+                if path is None:
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    dirs.add(os.path.dirname(path))
+                else:
+                    dirs.add(path)
+        return dirs
+
+    def run(self):
+        pending = set()
+        first = None
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(0, min(DEBOUNCE, first + MAX_DELAY - time.monotonic()))
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+            if ready:
+                pending |= self.changed_dirs(os.read(self.fd, 64 * 1024))
+                if pending and first is None:
+                    first = time.monotonic()
+                if not pending or time.monotonic() - first < MAX_DELAY:
+                    continue
+            if pending:
+                self.callback(sorted(pending))
+            pending = set()
+            first = None
+
+
+class PollingWatcher:
+    """定时比较已展开目录的 scandir 快照（名称和类型）"""
+
+    def __init__(self, callback, interval=POLL_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.snapshots = {}  # 路径 -> 快照，None表示还没有取过
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def set_dirs(self, dirs):
+        with self.lock:
+            # 新目录第一次轮询时报告一次变化：模型读取目录和这里取快照之间的修改不会漏掉
+            self.snapshots = {path: self.snapshots.get(path) for path in dirs}
+
+    @staticmethod
+    def snapshot(path):
+        try:
+            with os.scandir(path) as it:
+                return frozenset((entry.name, entry.is_dir()) for entry in it)
+        except OSError:
+            return frozenset()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                paths = list(self.snapshots)
+            current = {path: self.snapshot(path) for path in paths}
+            changed = []
+            with self.lock:
+                for path, snapshot in current.items():
+                    if path in self.snapshots and self.snapshots[path] != snapshot:
+                        self.snapshots[path] = snapshot
+                        changed.append(path)
+            if changed:
+                self.callback(sorted(changed))
+
+
+def create_watcher(callback):
+    """callback(目录列表)在后台线程中调用"""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(callback)
+        except (OSError, AttributeError):
+            pass  # 没有inotify，或超过了 fs.inotify.max_user_instances
+    return PollingWatcher(callback)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+静态资源构建脚本
+- project/static 下的CSS/JS生成带内容指纹的文件名，并写入manifest.json
+- 同时生成.gz和.br预压缩文件，服务端直接返回压缩文件
+- src/BK/admin.html 只做预压缩（入口页面不改名）
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+PROJECT_STATIC_DIR = os.path.join(ROOT_DIR, 'project', 'static')
+DIST_DIR = os.path.join(PROJECT_STATIC_DIR, 'dist')
+ADMIN_HTML = os.path.join(ROOT_DIR, 'src', 'BK', 'admin.html')
+
+ASSET_EXTENSIONS = ('.css', '.js')
+
+
+def precompress(path):
+    """为文件生成.gz和.br（brotli可用时）"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    # mtime=0 保证相同内容每次构建结果一致
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def fingerprint(path):
+    """内容哈希的前10位"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:10]
+
+
+def build_project_static():
+    """构建project/static下的资源"""
+    if os.path.exists(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+
+    manifest = {}
+    for dirpath, dirnames, filenames in os.walk(PROJECT_STATIC_DIR):
+        # 跳过输出目录和上传目录
+        dirnames[:] = [d for d in dirnames
+                       if os.path.join(dirpath, d) not in (DIST_DIR, os.path.join(PROJECT_STATIC_DIR, 'uploads'))]
+        for filename in filenames:
+            if not filename.endswith(ASSET_EXTENSIONS):
+                continue
+
+            source = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(source, PROJECT_STATIC_DIR).replace(os.sep, '/')
+            name, ext = os.path.splitext(rel_path)
+            hashed_path = f"{name}.{fingerprint(source)}{ext}"
+
+            target = os.path.join(DIST_DIR, hashed_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+            precompress(target)
+            manifest[rel_path] = hashed_path
+            print(f"✓ {rel_path} -> dist/{hashed_path}")
+
+    with open(os.path.join(DIST_DIR, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"✓ 已生成 {len(manifest)} 个资源的manifest.json")
+
+
+def build_admin_html():
+    """预压缩后台管理页面"""
+    if os.path.exists(ADMIN_HTML):
+        precompress(ADMIN_HTML)
+        print("✓ admin.html 预压缩完成")
+
+
+def main():
+    """主函数"""
+    print("静态资源构建工具")
+    print("=" * 30)
+    if brotli is None:
+        print("提示: 未安装brotli，只生成.gz文件")
+
+    build_project_static()
+    build_admin_html()
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
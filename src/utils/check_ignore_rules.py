@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+忽略规则检查（src/FE/ignore_rules.py）
+- 在临时目录中建立带 .gitignore/.ecignore 的项目，检查各条路径是否按 gitignore 语义忽略
+- 检查遍历时不进入被忽略的目录
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src', 'FE'))
+
+import ignore_rules  # noqa: E402
+
+GITIGNORE = """
+# 注释
+*.log
+!keep.log
+/build_out/
+docs/*.tmp
+data/**/raw
+assets/
+\\#literal
+trailing.txt   
+"""
+SUB_GITIGNORE = """
+!important.log
+local/
+"""
+ECIGNORE = """
+big_media/
+*.csv
+"""
+
+FILES = [
+    'main.py', 'app.log', 'keep.log', 'build_out/x.py', 'src/build_out/x.py',
+    'docs/a.tmp', 'docs/sub/b.tmp', 'data/x/y/raw', 'data/raw', 'assets/img.png',
+    '#literal', 'trailing.txt', 'sub/important.log', 'sub/other.log', 'sub/local/a.py',
+    'local/a.py', 'big_media/v.mp4', 'table.csv', 'venv/lib/site.py', 'pkg/__pycache__/m.cpython-311.pyc',
+    'pkg/m.py', 'pkg/m.pyc',
+]
+
+# (相对路径, 是否忽略)
+EXPECTED = [
+    ('main.py', False),
+    ('app.log', True),
+    ('keep.log', False),            # ! 取消忽略
+    ('build_out/x.py', True),       # 以/开头只匹配根目录
+    ('src/build_out/x.py', False),
+    ('docs/a.tmp', True),           # 中间有/，相对于规则所在目录
+    ('docs/sub/b.tmp', False),      # * 不匹配/
+    ('data/x/y/raw', True),         # ** 匹配多级目录
+    ('data/raw', True),
+    ('assets/img.png', True),       # 目录被忽略，其中的文件也被忽略
+    ('#literal', True),
+    ('trailing.txt', True),         # 结尾的空格不算
+    ('sub/important.log', False),   # 子目录的 .gitignore 优先
+    ('sub/other.log', True),
+    ('sub/local/a.py', True),
+    ('local/a.py', False),          # 子目录的规则只对子目录生效
+    ('big_media/v.mp4', True),      # .ecignore
+    ('table.csv', True),
+    ('venv/lib/site.py', True),     # 默认规则
+    ('pkg/__pycache__/m.cpython-311.pyc', True),
+    ('pkg/m.py', False),
+    ('pkg/m.pyc', True),
+]
+
+
+def main():
+    """主函数"""
+    print("忽略规则检查")
+    print("=" * 30)
+
+    root = tempfile.mkdtemp(prefix='ignore_')
+    try:
+        for rel in FILES:
+            path = os.path.join(root, *rel.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+        for rel, content in (('.gitignore', GITIGNORE), ('sub/.gitignore', SUB_GITIGNORE), ('.ecignore', ECIGNORE)):
+            with open(os.path.join(root, *rel.split('/')), 'w', encoding='utf-8') as f:
+                f.write(content)
+
+        rules = ignore_rules.IgnoreRules(root)
+        ok = True
+        for rel, expected in EXPECTED:
+            ignored = rules.is_ignored(os.path.join(root, *rel.split('/')))
+            passed = ignored == expected
+            ok = ok and passed
+            print(f"{'✓' if passed else '✗'} {rel}: {'忽略' if ignored else '保留'}")
+
+        walked = sorted(os.path.relpath(path, root).replace(os.sep, '/') for path in rules.walk())
+        expected_walk = sorted(['.gitignore', '.ecignore', 'sub/.gitignore'] +
+                               [rel for rel, ignored in EXPECTED if not ignored])
+        passed = walked == expected_walk
+        ok = ok and passed
+        print(f"{'✓' if passed else '✗'} 遍历结果: {walked}")
+
+        # 规则文件修改后重新编译
+        with open(os.path.join(root, '.ecignore'), 'a', encoding='utf-8') as f:
+            f.write('main.py\n')
+        os.utime(os.path.join(root, '.ecignore'), ns=(0, 1))
+        passed = rules.is_ignored(os.path.join(root, 'main.py'))
+        ok = ok and passed
+        print(f"{'✓' if passed else '✗'} 规则文件修改后生效")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print("✓ 全部通过" if ok else "✗ 检查失败")
+    return ok
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+客户端文件监视检查（src/FE/project_watcher.py）
+- 在临时目录中新建、删除、改名文件和目录，检查监视器报告了变化的目录，模型得到正确的增量
+- inotify（仅Linux）和轮询两种监视器都检查
+"""
+
+import os
+import queue
+import shutil
+import sys
+import tempfile
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src', 'FE'))
+
+import project_watcher  # noqa: E402
+
+TIMEOUT = 5
+
+
+def wait_changes(model, events):
+    """等待监视器报告，返回模型计算出的变化（去掉inode等细节后排序）"""
+    changes = []
+    try:
+        dirs = events.get(timeout=TIMEOUT)
+        changes += model.refresh(dirs)
+        # 同一批修改可能分成两次通知
+        while True:
+            changes += model.refresh(events.get(timeout=project_watcher.DEBOUNCE * 5))
+    except queue.Empty:
+        pass
+    return sorted(changes)
+
+
+def check(name, watcher_class):
+    print(name)
+    root = tempfile.mkdtemp(prefix='watcher_')
+    try:
+        os.makedirs(os.path.join(root, 'pkg'))
+        open(os.path.join(root, 'a.py'), 'w').close()
+        open(os.path.join(root, 'pkg', 'b.py'), 'w').close()
+
+        events = queue.Queue()
+        model = project_watcher.ProjectModel(root)
+        watcher = watcher_class(events.put)
+        model.load(root)
+        model.load(os.path.join(root, 'pkg'))
+        watcher.set_dirs(model.dirs)
+        if isinstance(watcher, project_watcher.PollingWatcher):
+            wait_changes(model, events)  # 新目录第一次轮询报告一次，没有实际变化
+
+        path = lambda *parts: os.path.join(root, *parts)  # noqa: E731
+        steps = [
+            ('新建文件', lambda: open(path('c.py'), 'w').close(), [('added', path('c.py'), False)]),
+            ('删除文件', lambda: os.remove(path('a.py')), [('removed', path('a.py'), False)]),
+            ('文件改名', lambda: os.rename(path('c.py'), path('d.py')),
+             [('moved', path('c.py'), path('d.py'), False)]),
+            ('移到子目录', lambda: os.rename(path('d.py'), path('pkg', 'd.py')),
+             [('moved', path('d.py'), path('pkg', 'd.py'), False)]),
+            ('目录改名', lambda: os.rename(path('pkg'), path('lib')), [('moved', path('pkg'), path('lib'), True)]),
+            ('改名后的目录中新建', lambda: open(path('lib', 'e.py'), 'w').close(),
+             [('added', path('lib', 'e.py'), False)]),
+            ('删除目录', lambda: shutil.rmtree(path('lib')), [('removed', path('lib'), True)]),
+        ]
+        ok = True
+        for description, action, expected in steps:
+            action()
+            changes = wait_changes(model, events)
+            watcher.set_dirs(model.dirs)
+            passed = changes == sorted(expected)
+            ok = ok and passed
+            print(f"{'✓' if passed else '✗'} {description}: {changes}")
+
+        if isinstance(watcher, project_watcher.InotifyWatcher):
+            # 监视器换成新路径之前，改名后目录中的事件仍以旧路径报告，模型要换成新路径
+            os.makedirs(path('m'))
+            wait_changes(model, events)
+            model.load(path('m'))
+            watcher.set_dirs(model.dirs)
+            os.rename(path('m'), path('n'))
+            wait_changes(model, events)
+            open(path('n', 'f.py'), 'w').close()
+            changes = wait_changes(model, events)
+            watcher.set_dirs(model.dirs)
+            passed = changes == [('added', path('n', 'f.py'), False)]
+            ok = ok and passed
+            print(f"{'✓' if passed else '✗'} 改名后监视器更新前的事件: {changes}")
+            shutil.rmtree(path('n'))
+            wait_changes(model, events)
+            watcher.set_dirs(model.dirs)
+
+        model.ascending = False
+        open(path('x.py'), 'w').close()
+        open(path('y.py'), 'w').close()
+        model.load(root)
+        passed = [entry[0] for entry in model.entries(root)] == ['y.py', 'x.py']
+        ok = ok and passed
+        print(f"{'✓' if passed else '✗'} 降序排列")
+        return ok
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    """主函数"""
+    print("客户端文件监视检查")
+    print("=" * 30)
+
+    ok = True
+    if sys.platform.startswith('linux'):
+        ok = check('inotify', project_watcher.InotifyWatcher) and ok
+    ok = check('轮询', lambda callback: project_watcher.PollingWatcher(callback, interval=0.2)) and ok
+
+    print("✓ 全部通过" if ok else "✗ 检查失败")
+    return ok
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+数据库迁移和查询计划检查
+- 按旧版本的表结构建库并写入重复数据，执行迁移后检查重复数据已合并、唯一索引生效、重复执行迁移不报错
+- 用 EXPLAIN QUERY PLAN 检查提交和列表接口的热点查询使用了索引，而不是全表扫描或临时排序
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src', 'BK'))
+
+import migrations  # noqa: E402
+
+# background.py 加入唯一索引之前的表结构
+LEGACY_BK_SCHEMA = [
+    '''CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE,
+       password_hash VARCHAR(120) NOT NULL, is_admin BOOLEAN, created_at DATETIME)''',
+    '''CREATE TABLE project (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL,
+       user_id INTEGER NOT NULL REFERENCES user (id), created_at DATETIME)''',
+    '''CREATE TABLE code_file (id INTEGER PRIMARY KEY, filename VARCHAR(255) NOT NULL, content TEXT NOT NULL,
+       project_id INTEGER NOT NULL REFERENCES project (id), user_id INTEGER NOT NULL REFERENCES user (id),
+       created_at DATETIME, updated_at DATETIME)''',
+    '''CREATE TABLE storage_usage (user_id INTEGER PRIMARY KEY REFERENCES user (id),
+       bytes_used INTEGER NOT NULL)''',
+]
+
+# (说明, SQL, 参数, 计划中必须出现的索引)
+BK_QUERIES = [
+    ('提交时查找项目', 'SELECT * FROM project WHERE name = ? AND user_id = ?', ('p', 1), 'uq_project_user_name'),
+    ('提交时查找文件', 'SELECT * FROM code_file WHERE filename = ? AND project_id = ?', ('a.py', 1),
+     'uq_code_file_project_filename'),
+    ('用户的项目列表', 'SELECT * FROM project WHERE user_id = ?', (1,), 'uq_project_user_name'),
+    ('用户的文件（配额统计、删除用户）', 'SELECT id FROM code_file WHERE user_id = ? LIMIT 500', (1,),
+     'ix_code_file_user_id'),
+    ('已删除的用户', 'SELECT id FROM user WHERE deleted_at <= ?', ('2024-01-01',), 'ix_user_deleted_at'),
+]
+
+SERVER_QUERIES = [
+    ('用户列表按创建时间排序', 'SELECT id, username FROM users ORDER BY created_at DESC', (),
+     'idx_users_created_at'),
+    ('项目列表按创建时间排序', '''SELECT p.id, p.name, u.username FROM projects p JOIN users u ON p.owner_id = u.id
+        WHERE p.deleted_at IS NULL ORDER BY p.created_at DESC''', (), 'idx_projects_deleted_created'),
+    ('清理线程查找过期项目', 'SELECT id FROM projects WHERE deleted_at <= ?', ('2024-01-01',),
+     'idx_projects_deleted_created'),
+    ('清理线程分批删除文件', 'SELECT id FROM files WHERE project_id = ? LIMIT 500', (1,), 'idx_files_project_id'),
+]
+
+
+def query_plan(conn, query, params):
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, params)]
+
+
+def check_plans(conn, queries):
+    ok = True
+    for description, query, params, index in queries:
+        plan = query_plan(conn, query, params)
+        uses_index = any(index in step for step in plan)
+        # 主表不能全表扫描，也不能为ORDER BY建临时B树
+        bad_steps = [step for step in plan if 'TEMP B-TREE' in step or
+                     (step.startswith('SCAN') and 'INDEX' not in step)]
+        passed = uses_index and not bad_steps
+        ok = ok and passed
+        print(f"{'✓' if passed else '✗'} {description}: {' | '.join(plan)}")
+    return ok
+
+
+def check_bk(path):
+    print("background.py 数据库")
+    conn = sqlite3.connect(path)
+    for statement in LEGACY_BK_SCHEMA:
+        conn.execute(statement)
+    conn.execute("INSERT INTO user (id, username, password_hash) VALUES (1, 'u1', 'x')")
+    # 并发提交留下的重复项目和重复文件
+    conn.executemany('INSERT INTO project (id, name, user_id) VALUES (?, ?, 1)', [(1, 'p'), (2, 'p'), (3, 'q')])
+    conn.executemany('INSERT INTO code_file (id, filename, content, project_id, user_id, updated_at) '
+                     'VALUES (?, ?, ?, ?, 1, ?)', [
+                         (1, 'a.py', 'old', 1, '2024-01-01 10:00:00'),
+                         (2, 'a.py', 'newest', 2, '2024-01-02 10:00:00'),
+                         (3, 'b.py', 'b', 2, '2024-01-01 10:00:00'),
+                         (4, 'a.py', 'other', 3, '2024-01-01 10:00:00'),
+                     ])
+    conn.execute('INSERT INTO storage_usage (user_id, bytes_used) VALUES (1, 100)')
+    conn.commit()
+
+    applied = migrations.migrate(conn, migrations.BK_MIGRATIONS)
+    again = migrations.migrate(conn, migrations.BK_MIGRATIONS)
+    latest = len(migrations.BK_MIGRATIONS)
+    ok = applied == list(range(1, latest + 1)) and again == [] and migrations.current_version(conn) == latest
+    print(f"{'✓' if ok else '✗'} 迁移版本: {applied}，重复执行: {again}")
+
+    projects = conn.execute('SELECT id, name FROM project ORDER BY id').fetchall()
+    files = conn.execute('SELECT project_id, filename, content FROM code_file ORDER BY project_id, filename').fetchall()
+    usage = conn.execute('SELECT bytes_used FROM storage_usage WHERE user_id = 1').fetchone()[0]
+    merged = (projects == [(1, 'p'), (3, 'q')]
+              and files == [(1, 'a.py', 'newest'), (1, 'b.py', 'b'), (3, 'a.py', 'other')]
+              and usage == len('newest') + len('b') + len('other'))
+    print(f"{'✓' if merged else '✗'} 重复项目和文件已合并，存储用量已重新计算")
+    ok = ok and merged
+
+    try:
+        conn.execute("INSERT INTO project (name, user_id) VALUES ('p', 1)")
+        unique = False
+    except sqlite3.IntegrityError:
+        unique = True
+    print(f"{'✓' if unique else '✗'} 重复项目被唯一索引拒绝")
+    ok = ok and unique
+
+    # 有一定数据量后查询优化器的选择才有意义
+    conn.executemany('INSERT INTO project (name, user_id) VALUES (?, ?)',
+                     [(f'p{i}', i % 50 + 2) for i in range(2000)])
+    conn.executemany('INSERT INTO code_file (filename, content, project_id, user_id) VALUES (?, ?, ?, ?)',
+                     [(f'f{i}.py', 'x', i % 2000 + 4, i % 50 + 2) for i in range(5000)])
+    conn.execute('ANALYZE')
+    ok = check_plans(conn, BK_QUERIES) and ok
+    conn.close()
+    return ok
+
+
+def check_server(path):
+    print("server.py 数据库")
+    import server
+    server.app.config['DATABASE'] = path
+    server.init_db()
+    server.init_db()  # 第二次启动不重复执行迁移
+
+    conn = sqlite3.connect(path)
+    version = migrations.current_version(conn)
+    ok = version == len(migrations.SERVER_MIGRATIONS)
+    print(f"{'✓' if ok else '✗'} 迁移版本: {version}")
+
+    conn.executemany('INSERT INTO users (username, password) VALUES (?, ?)', [(f'u{i}', 'x') for i in range(500)])
+    conn.executemany('INSERT INTO projects (name, owner_id) VALUES (?, ?)', [(f'p{i}', i % 500 + 1) for i in range(2000)])
+    conn.executemany('INSERT INTO files (project_id, filename) VALUES (?, ?)', [(i % 2000 + 1, f'f{i}') for i in range(5000)])
+    conn.commit()
+    conn.execute('ANALYZE')
+    ok = check_plans(conn, SERVER_QUERIES) and ok
+    conn.close()
+    return ok
+
+
+def main():
+    """主函数"""
+    print("数据库迁移和查询计划检查")
+    print("=" * 30)
+
+    work_dir = tempfile.mkdtemp(prefix='query_plans_')
+    ok = check_bk(os.path.join(work_dir, 'python_ide.db'))
+    ok = check_server(os.path.join(work_dir, 'ide_system.db')) and ok
+
+    print("✓ 全部通过" if ok else "✗ 检查失败")
+    return ok
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+submit_code 并发提交测试（src/BK/background.py）
+- 多个提交者同时向相同的几个项目/文件提交，检查没有产生重复的项目或文件
+- 每个文件的版本号等于对它的成功提交次数（没有丢失的更新），存储用量与实际内容一致
+- 默认在临时目录中使用独立的数据库运行，不影响正式数据
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+BK_DIR = os.path.join(ROOT_DIR, 'src', 'BK')
+
+USERS = ('stress1', 'stress2')
+PROJECTS = ('作业1', '作业2')
+FILES = ('main.py', 'utils.py', 'test.py')
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='submit_code 并发提交测试')
+    parser.add_argument('--submitters', type=int, default=100, help='并发提交者数量')
+    parser.add_argument('--count', type=int, default=20, help='每个提交者的提交次数')
+    args = parser.parse_args()
+
+    print("submit_code 并发提交测试")
+    print("=" * 30)
+
+    # 临时目录中运行（后端启动时会在当前目录写入模板文件）
+    work_dir = tempfile.mkdtemp(prefix='submit_code_stress_')
+    os.chdir(work_dir)
+    os.makedirs('templates')
+    os.environ['EC_DATABASE_URI'] = 'sqlite:///' + os.path.join(work_dir, 'python_ide.db')
+    os.environ['EC_SHARD_COUNT'] = '0'
+    os.environ['EC_RUN_POOL_SIZE'] = '1'
+    sys.path.insert(0, BK_DIR)
+    import background
+
+    background.app.config['RATE_LIMITS'] = {}
+    client = background.app.test_client()
+    tokens = {}
+    for username in USERS:
+        client.post('/api/register', json={'username': username, 'password': 'password'})
+        tokens[username] = client.post('/api/login', json={'username': username, 'password': 'password'}).json['token']
+
+    results = Counter()
+    expected = Counter()
+    lock = threading.Lock()
+
+    def submit(submitter):
+        # 所有提交者轮流写同一组文件，最大程度制造冲突
+        test_client = background.app.test_client()
+        for i in range(args.count):
+            key = (USERS[(submitter + i) % len(USERS)], PROJECTS[i % len(PROJECTS)], FILES[(submitter + i) % len(FILES)])
+            response = test_client.post('/api/submit_code', headers={'Authorization': tokens[key[0]]}, json={
+                'project_name': key[1],
+                'file_path': key[2],
+                'code_content': f'# {submitter} {i}\n' + 'x = 1\n' * (i % 7)
+            })
+            with lock:
+                results[response.status_code] += 1
+                if response.status_code == 200:
+                    expected[key] += 1
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.submitters) as pool:
+        list(pool.map(submit, range(args.submitters)))
+    elapsed = time.time() - started
+
+    total = args.submitters * args.count
+    print(f"提交 {total} 次，耗时 {elapsed:.1f} 秒，状态码: {dict(results)}")
+    ok = results[200] == total
+
+    CodeFile, Project, StorageUsage, User = (background.CodeFile, background.Project,
+                                             background.StorageUsage, background.User)
+    with background.app.app_context():
+        session = background.db.session
+        user_names = dict(session.query(User.id, User.username))
+        projects = session.query(Project.user_id, Project.name).all()
+        duplicate_projects = [key for key, n in Counter(projects).items() if n > 1]
+        files = session.query(CodeFile.user_id, Project.name, CodeFile.filename, CodeFile.revision,
+                              CodeFile.content).join(Project, Project.id == CodeFile.project_id).all()
+        duplicate_files = [key for key, n in Counter((f[0], f[1], f[2]) for f in files).items() if n > 1]
+        revisions = {(user_names[f[0]], f[1], f[2]): f[3] for f in files}
+        lost = {key: (revisions.get(key), n) for key, n in expected.items() if revisions.get(key) != n}
+
+        actual_bytes = Counter()
+        for f in files:
+            actual_bytes[f[0]] += len(f[4].encode('utf-8'))
+        usage = {u.user_id: u.bytes_used for u in session.query(StorageUsage)}
+        wrong_usage = {user_id: (usage.get(user_id), n) for user_id, n in actual_bytes.items() if usage.get(user_id) != n}
+
+    print(f"项目数: {len(projects)}，文件数: {len(files)}")
+    for name, problem in (('重复的项目', duplicate_projects), ('重复的文件', duplicate_files),
+                          ('版本号与提交次数不一致', lost), ('存储用量不一致', wrong_usage)):
+        if problem:
+            print(f"✗ {name}: {problem}")
+            ok = False
+
+    print("✓ 没有重复记录，没有丢失的更新" if ok else "✗ 测试失败")
+    return ok
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+提交接口并发压力测试（project/app.py）
+- 默认在临时目录中启动多个worker进程，每个进程多线程并发提交，所有worker共享同一个数据库
+- 指定 --url 时对已部署的服务（例如 gunicorn -w 4 app:app）发起HTTP请求
+- 最后检查所有返回的提交ID互不重复，且数据库中的记录数与成功提交数一致
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+PROJECT_DIR = os.path.join(ROOT_DIR, 'project')
+
+USERNAME = 'user1'
+PASSWORD = 'password1'
+
+
+def submit_in_process(worker, count, threads):
+    """在本进程内加载应用，多线程并发提交，返回成功的提交ID列表"""
+    sys.path.insert(0, PROJECT_DIR)
+    import app as project_app
+
+    local = threading.local()
+
+    def submit(i):
+        # 每个线程登录一次，之后复用会话
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = project_app.app.test_client()
+            client.post('/login', data={'username': USERNAME, 'password': PASSWORD})
+        response = client.post('/api/submit', data={
+            'project_name': f'stress-{worker}',
+            'file': (io.BytesIO(f'print({worker}, {i})\n'.encode('utf-8')), f'w{worker}_{i}.py')
+        })
+        data = response.get_json()
+        return data['submission']['id'] if data and data.get('success') else None
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return [sid for sid in pool.map(submit, range(count)) if sid is not None]
+
+
+def submit_over_http(url, worker, count, threads):
+    """对已部署的服务并发提交"""
+    import requests
+
+    local = threading.local()
+
+    def submit(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = requests.Session()
+            client.post(f'{url}/login', data={'username': USERNAME, 'password': PASSWORD})
+        response = client.post(f'{url}/api/submit', data={'project_name': f'stress-{worker}'}, files={
+            'file': (f'w{worker}_{i}.py', f'print({worker}, {i})\n'.encode('utf-8'))
+        })
+        data = response.json()
+        return data['submission']['id'] if data.get('success') else None
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return [sid for sid in pool.map(submit, range(count)) if sid is not None]
+
+
+def run_worker(args):
+    url, worker, count, threads = args
+    if url:
+        return submit_over_http(url, worker, count, threads)
+    return submit_in_process(worker, count, threads)
+
+
+def count_records(db_path):
+    import sqlite3
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM submissions').fetchone()[0]
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='提交接口并发压力测试')
+    parser.add_argument('--workers', type=int, default=4, help='worker进程数')
+    parser.add_argument('--threads', type=int, default=16, help='每个worker的并发线程数')
+    parser.add_argument('--count', type=int, default=500, help='每个worker的提交次数')
+    parser.add_argument('--url', help='已部署服务的地址，例如 http://localhost:5000')
+    args = parser.parse_args()
+
+    print("提交接口并发压力测试")
+    print("=" * 30)
+
+    work_dir = None
+    if not args.url:
+        # 临时目录中运行，不影响正式数据；子进程继承这些环境变量
+        work_dir = tempfile.mkdtemp(prefix='submit_stress_')
+        os.chdir(work_dir)
+        os.environ['SUBMISSION_DB'] = os.path.join(work_dir, 'submissions.db')
+        os.makedirs(os.path.join(work_dir, 'static', 'uploads'))
+
+    started = time.time()
+    tasks = [(args.url, worker, args.count, args.threads) for worker in range(args.workers)]
+    with multiprocessing.Pool(args.workers) as pool:
+        results = pool.map(run_worker, tasks)
+    elapsed = time.time() - started
+
+    ids = [sid for result in results for sid in result]
+    total = args.workers * args.count
+    print(f"成功提交: {len(ids)}/{total}，耗时 {elapsed:.1f} 秒（{len(ids) / elapsed:.0f} 次/秒）")
+
+    ok = len(ids) == total and len(set(ids)) == len(ids)
+    if len(set(ids)) != len(ids):
+        print(f"✗ 发现 {len(ids) - len(set(ids))} 个重复的提交ID")
+    if work_dir:
+        records = count_records(os.environ['SUBMISSION_DB'])
+        print(f"数据库记录数: {records}")
+        ok = ok and records == len(ids)
+
+    print("✓ 所有提交ID唯一" if ok else "✗ 测试失败")
+    return ok
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)